@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django import forms
 from django.contrib import messages
+from django.db import transaction
 from django.utils.html import format_html
 from .models import AIPrompt, AIPromptVersion
+from .services.prompt_registry import PromptTemplateError, compile_template, invalidate
 
 class AIPromptForm(forms.ModelForm):
     class Meta:
@@ -26,6 +28,11 @@ class AIPromptForm(forms.ModelForm):
         for var in required_vars:
             if var not in prompt_text:
                 raise forms.ValidationError(f"Промт должен содержать переменную {var}")
+
+        try:
+            compile_template(prompt_text)
+        except PromptTemplateError as e:
+            raise forms.ValidationError(str(e))
         
         return prompt_text
 
@@ -117,12 +124,16 @@ class AIPromptAdmin(admin.ModelAdmin):
     def activate_prompts(self, request, queryset):
         """Активировать выбранные промты"""
         updated = queryset.update(is_active=True)
+        # update() не отправляет сигналы моделей — реестр промтов сбрасываем явно
+        transaction.on_commit(invalidate)
         self.message_user(request, f'{updated} промтов активировано')
     activate_prompts.short_description = "Активировать выбранные промты"
     
     def deactivate_prompts(self, request, queryset):
         """Деактивировать выбранные промты"""
         updated = queryset.update(is_active=False)
+        # update() не отправляет сигналы моделей — реестр промтов сбрасываем явно
+        transaction.on_commit(invalidate)
         self.message_user(request, f'{updated} промтов деактивировано')
     deactivate_prompts.short_description = "Деактивировать выбранные промты"
 
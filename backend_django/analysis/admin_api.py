@@ -7,6 +7,7 @@ from django.utils import timezone
 from datetime import timedelta
 
 from .models import AIPrompt, AIPromptVersion, AnalysisSession
+from .services import latency, nlp_models, result_cache
 from .serializers import AIPromptSerializer, AIPromptVersionSerializer, UserSerializer
 from users.models import User
 from files.models import MedicalFile
@@ -142,5 +143,15 @@ class AdminDashboardView(APIView):
                 'today_analyses': AnalysisSession.objects.filter(
                     start_time__date=timezone.now().date()
                 ).count(),
+                'result_cache': result_cache.get_stats(),
+                'latency': latency.get_stats(),
             }
-        })
\ No newline at end of file
+        })
+
+
+class NlpModelsDiagnosticsView(APIView):
+    """Загруженные NLP-модели, время загрузки и память веб-процесса и воркеров."""
+    permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return Response(nlp_models.get_stats())
\ No newline at end of file
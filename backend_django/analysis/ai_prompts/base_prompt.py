@@ -1,6 +1,6 @@
 BASE_PROMPT_TEMPLATE = """ТЫ — ВРАЧ-ЛАБОРАНТ. Проанализируй ЭТИ ЛАБОРАТОРНЫЕ ДАННЫЕ:
 
-{text_data[:1200]}
+{text_data}
 
 ОПРЕДЕЛИ:
 1. Есть ли отклонения от нормы?
@@ -0,0 +1,286 @@
+import math
+import mimetypes
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from django.conf import settings
+from django.db import connection
+
+from analysis.services import latency
+from analysis.validators import FileValidator
+
+ENDPOINTS = {
+    'analysis': '/api/analysis/upload/',
+    'files': '/api/files/upload/',
+}
+SESSION_STATUS_PATH = '/api/analysis/session/{session_id}/'
+FILE_RESULT_PATH = '/api/analysis/file/{file_id}/'
+TERMINAL_STATUSES = ('completed', 'failed')
+POLL_INTERVAL = 0.2
+
+# MIME-типы, которые mimetypes знает не везде
+EXTRA_MIME_TYPES = {
+    '.dcm': 'application/dicom',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+
+
+def collect_corpus(path):
+    """Файлы корпуса с расширениями, которые принимает загрузка, в стабильном порядке."""
+    allowed = {
+        f'.{ext}' for exts in FileValidator.ALLOWED_EXTENSIONS.values() for ext in exts
+    }
+    files = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            if os.path.splitext(name)[1].lower() in allowed:
+                files.append(os.path.join(root, name))
+    return sorted(files)
+
+
+def mime_type_for(path):
+    ext = os.path.splitext(path)[1].lower()
+    return EXTRA_MIME_TYPES.get(ext) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def percentile(sorted_values, q):
+    """Перцентиль методом ближайшего ранга."""
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(q * len(sorted_values)) - 1)
+    return round(sorted_values[index], 3)
+
+
+def summarize(values):
+    values = sorted(values)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'avg': round(sum(values) / len(values), 3),
+        'p50': percentile(values, 0.5),
+        'p95': percentile(values, 0.95),
+        'p99': percentile(values, 0.99),
+        'max': round(values[-1], 3),
+    }
+
+
+class InProcessTransport:
+    """
+    Запросы через django.test.Client в этом процессе: весь стек Django без сети.
+    Считает SQL-запросы каждого запроса; при CELERY_TASK_ALWAYS_EAGER анализ
+    выполняется внутри запроса загрузки, и его этапы видны по сырым замерам.
+    """
+
+    def __init__(self, token):
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+        hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host not in ('*', '')]
+        self.host = hosts[0] if hosts else 'localhost'
+        self._local = threading.local()
+
+    def _client(self):
+        from django.test import Client
+
+        if not hasattr(self._local, 'client'):
+            self._local.client = Client(HTTP_HOST=self.host)
+        return self._local.client
+
+    def upload(self, path, file_path, mime_type):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        with open(file_path, 'rb') as f:
+            upload = SimpleUploadedFile(os.path.basename(file_path), f.read(), content_type=mime_type)
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            response = self._client().post(
+                path, {'file': upload}, secure=settings.SECURE_SSL_REDIRECT, **self.headers
+            )
+        return response.status_code, _json(response), queries
+
+    def get(self, path):
+        response = self._client().get(path, secure=settings.SECURE_SSL_REDIRECT, **self.headers)
+        return response.status_code, _json(response)
+
+
+class HttpTransport:
+    """Запросы к запущенному серверу по HTTP; SQL-запросы со стороны клиента не видны."""
+
+    def __init__(self, base_url, token, timeout=300):
+        self.client = httpx.Client(
+            base_url=base_url.rstrip('/'),
+            headers={'Authorization': f'Bearer {token}'},
+            timeout=timeout,
+            verify=False,
+            limits=httpx.Limits(max_connections=None),
+        )
+
+    def upload(self, path, file_path, mime_type):
+        with open(file_path, 'rb') as f:
+            response = self.client.post(path, files={'file': (os.path.basename(file_path), f, mime_type)})
+        return response.status_code, _json(response), None
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, _json(response)
+
+
+def _json(response):
+    try:
+        return response.json()
+    except ValueError:
+        return {}
+
+
+def login(base_url, email, password):
+    """JWT для HTTP-режима через /api/auth/login/."""
+    response = httpx.post(
+        f"{base_url.rstrip('/')}/api/auth/login/", json={'email': email, 'password': password}, verify=False
+    )
+    response.raise_for_status()
+    return response.json()['data']['tokens']['access']
+
+
+class LoadRun:
+    """
+    Прогон корпуса файлов через загрузку: requests запросов по кругу по корпусу,
+    concurrency одновременно. Для /api/analysis/upload/ дожидается завершения
+    сессии (wait) и запоминает коды найденных состояний каждого файла корпуса —
+    по ним сравниваются прогоны с записанными ответами GigaChat.
+    """
+
+    def __init__(self, transport, files, requests=None, concurrency=8, endpoint='analysis', wait=True,
+                 wait_timeout=300, corpus_root=None):
+        self.transport = transport
+        self.files = files
+        self.requests = requests or len(files)
+        self.concurrency = concurrency
+        self.endpoint = endpoint
+        self.wait = wait
+        self.wait_timeout = wait_timeout
+        self.corpus_root = corpus_root
+        self.samples = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.outcomes = Counter()
+        self.results = {}
+        self._lock = threading.Lock()
+
+    def _endpoint_for(self, index):
+        if self.endpoint == 'mixed':
+            return 'analysis' if index % 2 == 0 else 'files'
+        return self.endpoint
+
+    def _record(self, name, seconds):
+        with self._lock:
+            self.samples[name].append(seconds)
+
+    def _one(self, index):
+        file_path = self.files[index % len(self.files)]
+        endpoint = self._endpoint_for(index)
+        started = time.monotonic()
+        try:
+            status_code, data, queries = self.transport.upload(ENDPOINTS[endpoint], file_path, mime_type_for(file_path))
+        except Exception as e:
+            with self._lock:
+                self.statuses[endpoint][type(e).__name__] += 1
+            return
+        uploaded = time.monotonic()
+        with self._lock:
+            self.statuses[endpoint][status_code] += 1
+            if queries is not None:
+                self.queries[endpoint].append(queries)
+        self._record(f'upload:{endpoint}', uploaded - started)
+
+        session_id = data.get('session_id')
+        if endpoint != 'analysis' or not session_id or not self.wait:
+            return
+        outcome = self._wait_for_session(session_id)
+        with self._lock:
+            self.outcomes[outcome] += 1
+        if outcome in TERMINAL_STATUSES:
+            self._record('end_to_end', time.monotonic() - started)
+        if outcome == 'completed':
+            self._remember_result(file_path, data.get('id'))
+
+    def _wait_for_session(self, session_id):
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            _, data = self.transport.get(SESSION_STATUS_PATH.format(session_id=session_id))
+            status = data.get('status')
+            if status in TERMINAL_STATUSES:
+                return status
+            if time.monotonic() >= deadline:
+                return 'timeout'
+            time.sleep(POLL_INTERVAL)
+
+    def _remember_result(self, file_path, file_id):
+        name = os.path.relpath(file_path, self.corpus_root) if self.corpus_root else file_path
+        if name in self.results or not file_id:
+            return
+        _, data = self.transport.get(FILE_RESULT_PATH.format(file_id=file_id))
+        codes = sorted(str(condition.get('code')) for condition in data.get('detected_conditions', []))
+        with self._lock:
+            self.results.setdefault(name, codes)
+
+    def _listen(self, stage, seconds):
+        self._record(f'stage:{stage}', seconds)
+
+    def run(self):
+        stats_before = latency.get_stats()
+        started = time.monotonic()
+        with latency.listening(self._listen), ThreadPoolExecutor(self.concurrency) as executor:
+            list(executor.map(self._one, range(self.requests)))
+        duration = time.monotonic() - started
+        # Воркеры переносят замеры в общий кеш с задержкой до интервала сброса
+        time.sleep(settings.ANALYSIS_LATENCY_FLUSH_INTERVAL)
+        return self.report(duration, latency.diff_stats(stats_before, latency.get_stats()))
+
+    def report(self, duration, shared_stages):
+        endpoints = {}
+        for endpoint in sorted(self.statuses):
+            samples = self.samples.get(f'upload:{endpoint}', [])
+            queries = self.queries.get(endpoint) or []
+            endpoints[endpoint] = {
+                **summarize(samples),
+                'statuses': {str(code): count for code, count in self.statuses[endpoint].items()},
+                'queries_avg': round(sum(queries) / len(queries), 1) if queries else None,
+                'queries_max': max(queries) if queries else None,
+            }
+
+        # Сырые замеры есть для этапов, выполненных в этом процессе; остальные — по общим гистограммам
+        stages = {}
+        for stage in latency.STAGES:
+            samples = self.samples.get(f'stage:{stage}')
+            if samples:
+                stages[stage] = {**summarize(samples), 'source': 'process'}
+            elif stage in shared_stages:
+                shared = shared_stages[stage]
+                stages[stage] = {
+                    'count': shared['count'], 'avg': shared['avg'],
+                    'p50': shared['p50'], 'p95': shared['p95'], 'p99': shared['p99'],
+                    'source': 'buckets',
+                }
+
+        completed = self.outcomes.get('completed', 0)
+        return {
+            'duration': round(duration, 2),
+            'requests': self.requests,
+            'concurrency': self.concurrency,
+            'throughput_rps': round(self.requests / duration, 2) if duration else None,
+            'completed_per_min': round(completed / duration * 60, 1) if duration else None,
+            'endpoints': endpoints,
+            'end_to_end': summarize(self.samples.get('end_to_end', [])),
+            'outcomes': dict(self.outcomes),
+            'stages': stages,
+            'results': dict(sorted(self.results.items())),
+        }
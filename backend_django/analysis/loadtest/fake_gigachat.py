@@ -0,0 +1,309 @@
+import hashlib
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+AUTH_PATH_SUFFIX = '/oauth'
+# Заголовки OAuth-запроса, которые в режиме записи передаются настоящему GigaChat
+AUTH_FORWARD_HEADERS = ('Authorization', 'RqUID', 'Content-Type', 'Accept')
+COMPLETIONS_PATH_SUFFIX = '/chat/completions'
+STATS_PATH = '/stats'
+
+# z-оценка 95-го перцентиля нормального распределения
+Z_95 = 1.645
+
+# Заготовки состояний; набор для запроса выбирается по его хешу, поэтому ответ стабилен
+CANNED_CONDITIONS = [
+    {'condition_name': 'Железодефицитная анемия', 'code': 'D50.9', 'confidence': 0.82, 'severity': 'medium'},
+    {'condition_name': 'Гиперхолестеринемия', 'code': 'E78.0', 'confidence': 0.74, 'severity': 'low'},
+    {'condition_name': 'Сахарный диабет 2 типа', 'code': 'E11.9', 'confidence': 0.61, 'severity': 'high'},
+    {'condition_name': 'Гипотиреоз', 'code': 'E03.9', 'confidence': 0.55, 'severity': 'medium'},
+    {'condition_name': 'Хроническая болезнь почек', 'code': 'N18.9', 'confidence': 0.47, 'severity': 'high'},
+]
+
+
+class LatencyModel:
+    """
+    Распределение задержки ответа: fixed:2, uniform:1,5 или lognormal:3,12
+    (медиана и 95-й перцентиль в секундах — типичный «длинный хвост» LLM).
+    """
+
+    def __init__(self, spec='lognormal:3,12'):
+        self.spec = spec
+        kind, _, args = spec.partition(':')
+        values = [float(value) for value in args.split(',') if value]
+        if kind == 'fixed' and len(values) == 1:
+            self._sample = lambda rng: values[0]
+        elif kind == 'uniform' and len(values) == 2:
+            self._sample = lambda rng: rng.uniform(values[0], values[1])
+        elif kind == 'lognormal' and len(values) == 2 and 0 < values[0] <= values[1]:
+            mu, sigma = math.log(values[0]), math.log(values[1] / values[0]) / Z_95
+            self._sample = lambda rng: rng.lognormvariate(mu, sigma)
+        else:
+            raise ValueError(f'Неизвестное распределение задержки: {spec}')
+
+    def sample(self, rng):
+        return max(0.0, self._sample(rng))
+
+
+def request_key(payload):
+    """Ключ записанного ответа: модель и сообщения запроса."""
+    data = {'model': payload.get('model'), 'messages': payload.get('messages')}
+    return hashlib.sha256(json.dumps(data, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ResponseStore:
+    """Записанные ответы в JSONL: {"key", "content", "elapsed"} на строку."""
+
+    def __init__(self, path):
+        self.path = path
+        self.responses = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.responses[record['key']] = record
+        except FileNotFoundError:
+            pass
+
+    def get(self, key):
+        return self.responses.get(key)
+
+    def put(self, key, content, elapsed):
+        record = {'key': key, 'content': content, 'elapsed': round(elapsed, 3)}
+        with self._lock:
+            self.responses[key] = record
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+class FakeGigaChatConfig:
+    def __init__(self, latency='lognormal:3,12', error_rate=0.0, rate_limit_rate=0.0, retry_after=1,
+                 max_inflight=None, token_ttl=30 * 60, replay=None, replay_latency=False, strict=False,
+                 record=None, upstream_api=None, upstream_auth=None, seed=None):
+        self.latency = LatencyModel(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.max_inflight = max_inflight
+        self.token_ttl = token_ttl
+        self.replay = ResponseStore(replay) if replay else None
+        self.replay_latency = replay_latency
+        self.strict = strict
+        self.record = ResponseStore(record) if record else None
+        self.upstream_api = upstream_api
+        self.upstream_auth = upstream_auth
+        self.rng = random.Random(seed)
+        if self.record and not (upstream_api and upstream_auth):
+            raise ValueError('Для записи нужны адреса настоящего GigaChat (upstream_api и upstream_auth)')
+
+
+class FakeGigaChatServer(ThreadingHTTPServer):
+    """
+    Локальная замена GigaChat для нагрузочных прогонов: OAuth и /chat/completions
+    с настраиваемой задержкой, долей ошибок и 429. Ответы — встроенные заготовки,
+    записанные ранее ответы (replay) или ответы настоящего GigaChat, которые
+    сервер проксирует и записывает (record). GET /stats — счётчики сервера.
+    """
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, config):
+        super().__init__(address, FakeGigaChatHandler)
+        self.config = config
+        self.stats = {
+            'auth': 0, 'completions': 0, 'streamed': 0, 'errors': 0, 'rate_limited': 0,
+            'replayed': 0, 'recorded': 0, 'canned': 0, 'inflight': 0, 'peak_inflight': 0,
+        }
+        self._lock = threading.Lock()
+        self.upstream = httpx.Client(verify=False, timeout=120) if config.record else None
+
+    def count(self, name, delta=1):
+        with self._lock:
+            self.stats[name] += delta
+            if name == 'inflight':
+                self.stats['peak_inflight'] = max(self.stats['peak_inflight'], self.stats['inflight'])
+            return self.stats[name]
+
+    def draw(self, method, *args):
+        # random.Random общий для потоков сервера: вызовы под локом
+        with self._lock:
+            return getattr(self.config.rng, method)(*args)
+
+    def sample_latency(self):
+        with self._lock:
+            return self.config.latency.sample(self.config.rng)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+class FakeGigaChatHandler(BaseHTTPRequestHandler):
+    # Keep-alive: клиент держит пул соединений, как с настоящим API
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(f"fake-gigachat {self.address_string()} {format % args}")
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def do_GET(self):
+        if self.path == STATS_PATH:
+            return self._send_json(200, dict(self.server.stats))
+        self._send_json(404, {'message': 'Not found'})
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path.endswith(AUTH_PATH_SUFFIX):
+            return self._auth(body)
+        if self.path.endswith(COMPLETIONS_PATH_SUFFIX):
+            return self._completions(body)
+        self._send_json(404, {'message': 'Not found'})
+
+    def _auth(self, body):
+        server = self.server
+        server.count('auth')
+        if server.upstream:
+            response = server.upstream.post(
+                server.config.upstream_auth,
+                content=body,
+                headers={name: self.headers[name] for name in AUTH_FORWARD_HEADERS if self.headers.get(name)}
+            )
+            return self._send_json(response.status_code, response.json())
+        expires_at = int((time.time() + server.config.token_ttl) * 1000)
+        self._send_json(200, {'access_token': f'fake-{uuid.uuid4()}', 'expires_at': expires_at})
+
+    def _completions(self, body):
+        server, config = self.server, self.server.config
+        server.count('completions')
+        inflight = server.count('inflight')
+        try:
+            if config.max_inflight and inflight > config.max_inflight or server.draw('random') < config.rate_limit_rate:
+                server.count('rate_limited')
+                return self._send_json(
+                    429, {'message': 'Too many requests'}, headers={'Retry-After': str(config.retry_after)}
+                )
+            if server.draw('random') < config.error_rate:
+                server.count('errors')
+                time.sleep(server.draw('uniform', 0, 1))
+                return self._send_json(server.draw('choice', [500, 502, 503]), {'message': 'Internal error'})
+
+            payload = json.loads(body or b'{}')
+            key = request_key(payload)
+            content, latency = self._content_for(payload, key)
+            if content is None:
+                return self._send_json(500, {'message': f'Нет записанного ответа для {key[:12]}'})
+
+            if payload.get('stream'):
+                server.count('streamed')
+                self._stream(content, latency)
+            else:
+                time.sleep(latency)
+                self._send_json(200, {
+                    'choices': [{'message': {'role': 'assistant', 'content': content}, 'index': 0,
+                                 'finish_reason': 'stop'}],
+                    'model': payload.get('model'),
+                    'object': 'chat.completion',
+                })
+        finally:
+            server.count('inflight', -1)
+
+    def _content_for(self, payload, key):
+        server, config = self.server, self.server.config
+        if config.replay:
+            record = config.replay.get(key)
+            if record:
+                server.count('replayed')
+                latency = record['elapsed'] if config.replay_latency else server.sample_latency()
+                return record['content'], latency
+            if config.strict:
+                return None, 0
+
+        if server.upstream:
+            started = time.monotonic()
+            response = server.upstream.post(
+                f"{config.upstream_api.rstrip('/')}/chat/completions",
+                json={**payload, 'stream': False},
+                headers={'Authorization': self.headers.get('Authorization', '')}
+            )
+            elapsed = time.monotonic() - started
+            content = response.json().get('choices', [{}])[0].get('message', {}).get('content', '')
+            if response.status_code == 200:
+                config.record.put(key, content, elapsed)
+                server.count('recorded')
+            # Задержка уже прошла на стороне настоящего API
+            return content, 0
+
+        server.count('canned')
+        return canned_content(key), server.sample_latency()
+
+    def _stream(self, content, latency):
+        """Отдаёт ответ в формате SSE, как GigaChat при stream=true: первый фрагмент — через 10% задержки."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)] or ['']
+        first_delay = latency * 0.1
+        step = (latency - first_delay) / len(pieces)
+        time.sleep(first_delay)
+        for piece in pieces:
+            event = {'choices': [{'delta': {'content': piece}, 'index': 0}], 'object': 'chat.completion'}
+            self._write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n")
+            time.sleep(step)
+        self._write_chunk('data: [DONE]\n\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+
+def canned_content(key):
+    """Правдоподобный ответ модели в формате базового промта, стабильный для одного запроса."""
+    seed = int(key[:8], 16)
+    count = 1 + seed % 3
+    start = seed % len(CANNED_CONDITIONS)
+    conditions = [CANNED_CONDITIONS[(start + i) % len(CANNED_CONDITIONS)] for i in range(count)]
+    result = {
+        'summary': f"Выявлено состояний: {count}. " + ', '.join(c['condition_name'] for c in conditions) + '.',
+        'detected_conditions': conditions,
+        'recommendations': 'Консультация терапевта, контроль анализов через 3 месяца.',
+        'confidence': max(c['confidence'] for c in conditions),
+    }
+    return json.dumps(result, ensure_ascii=False)
+
+
+def start_server(config, host='127.0.0.1', port=8090):
+    """Запускает сервер в фоновом потоке; возвращает его (server.url, server.shutdown())."""
+    server = FakeGigaChatServer((host, port), config)
+    threading.Thread(target=server.serve_forever, name='fake-gigachat', daemon=True).start()
+    logger.info(f"🧪 Заглушка GigaChat запущена на {server.url}")
+    return server
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from analysis.services.lab_measurements import backfill_measurements
+
+
+class Command(BaseCommand):
+    help = 'Заполняет ряды лабораторных показателей (LabMeasurement) по сохранённым результатам анализа'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Результатов анализа в одной пачке')
+        parser.add_argument('--user', action='append', dest='users', help='Только для этого пользователя (UUID)')
+        parser.add_argument(
+            '--reparse', action='store_true',
+            help='Разобрать сохранённый текст файлов заново, даже если в результате уже есть lab_values'
+        )
+
+    def handle(self, *args, **options):
+        saved = backfill_measurements(
+            batch_size=options['batch_size'],
+            user_ids=options['users'],
+            reparse=options['reparse'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Показателей сохранено: {saved}'))
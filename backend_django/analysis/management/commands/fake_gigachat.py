@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from analysis.loadtest.fake_gigachat import FakeGigaChatConfig, FakeGigaChatServer
+
+
+class Command(BaseCommand):
+    help = (
+        'Локальная замена GigaChat (OAuth и /chat/completions) для нагрузочных прогонов. '
+        'Воркеры направляются на неё через GIGACHAT_AUTH_URL=http://<host>:<port>/api/v2/oauth '
+        'и GIGACHAT_API_URL=http://<host>:<port>/api/v1'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8090)
+        parser.add_argument(
+            '--latency', default='lognormal:3,12',
+            help='Задержка ответа: fixed:2, uniform:1,5 или lognormal:<медиана>,<p95> (сек)'
+        )
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 5xx')
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Доля ответов 429')
+        parser.add_argument('--retry-after', type=int, default=1, help='Retry-After в ответах 429 (сек)')
+        parser.add_argument('--max-inflight', type=int, help='Сверх этого числа одновременных запросов — 429')
+        parser.add_argument('--replay', help='JSONL с записанными ответами: отдавать их вместо заготовок')
+        parser.add_argument('--replay-latency', action='store_true', help='Отвечать с записанной задержкой')
+        parser.add_argument('--strict', action='store_true', help='Ошибка 500, если записанного ответа нет')
+        parser.add_argument('--record', help='JSONL, куда записывать ответы настоящего GigaChat (режим прокси)')
+        parser.add_argument('--upstream-api', help='Адрес API настоящего GigaChat для записи')
+        parser.add_argument('--upstream-auth', help='Адрес OAuth настоящего GigaChat для записи')
+        parser.add_argument('--seed', type=int, help='Зерно генератора задержек и ошибок')
+
+    def handle(self, *args, **options):
+        try:
+            config = FakeGigaChatConfig(
+                latency=options['latency'],
+                error_rate=options['error_rate'],
+                rate_limit_rate=options['rate_limit_rate'],
+                retry_after=options['retry_after'],
+                max_inflight=options['max_inflight'],
+                replay=options['replay'],
+                replay_latency=options['replay_latency'],
+                strict=options['strict'],
+                record=options['record'],
+                upstream_api=options['upstream_api'],
+                upstream_auth=options['upstream_auth'],
+                seed=options['seed'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        server = FakeGigaChatServer((options['host'], options['port']), config)
+        self.stdout.write(self.style.SUCCESS(f'Заглушка GigaChat слушает {server.url}'))
+        self.stdout.write(f'GIGACHAT_AUTH_URL={server.url}/api/v2/oauth GIGACHAT_API_URL={server.url}/api/v1')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f'Счётчики: {server.stats}')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from analysis.services import result_cache
+
+
+class Command(BaseCommand):
+    help = 'Исключает сохранённые результаты анализа из повторного использования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prompt-version', help='Сбросить только результаты этой версии промта')
+        parser.add_argument('--model', help='Сбросить только результаты этой модели')
+
+    def handle(self, *args, **options):
+        updated = result_cache.invalidate(
+            prompt_version=options['prompt_version'],
+            model_name=options['model']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Сброшено результатов: {updated}'))
+        stats = result_cache.get_stats()
+        self.stdout.write(f"Попаданий: {stats['hits']}, промахов: {stats['misses']}, hit rate: {stats['hit_rate']}")
@@ -0,0 +1,166 @@
+import json
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from backend.celery import app as celery_app
+from analysis.loadtest import driver
+from analysis.loadtest.fake_gigachat import FakeGigaChatConfig, start_server
+from analysis.services.gigachat_async import TOKEN_CACHE_KEY
+
+LOADTEST_EMAIL = 'loadtest@example.com'
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон корпуса PDF, DOCX и изображений через /api/analysis/upload/ и /api/files/upload/: '
+        'пропускная способность, p50/p95/p99 по этапам и число SQL-запросов. '
+        'Запускайте на стенде с отдельными БД и кешем: прогон создаёт файлы и сессии анализа'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', help='Каталог с файлами корпуса')
+        parser.add_argument('--requests', type=int, help='Число загрузок (по умолчанию — размер корпуса)')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--endpoint', choices=['analysis', 'files', 'mixed'], default='analysis')
+        parser.add_argument(
+            '--base-url',
+            help='Адрес запущенного сервера (http://host:8000); без него запросы идут через тестовый клиент в этом процессе'
+        )
+        parser.add_argument('--email', default=LOADTEST_EMAIL, help='Пользователь, от имени которого идёт загрузка')
+        parser.add_argument('--password', help='Пароль пользователя для --base-url')
+        parser.add_argument('--fake', action='store_true', help='Поднять заглушку GigaChat в этом процессе')
+        parser.add_argument('--latency', default='lognormal:3,12', help='Задержка заглушки (см. fake_gigachat)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 5xx заглушки')
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Доля ответов 429 заглушки')
+        parser.add_argument('--replay', help='JSONL записанных ответов для заглушки')
+        parser.add_argument('--seed', type=int, help='Зерно генератора заглушки')
+        parser.add_argument(
+            '--no-result-cache', action='store_true',
+            help='Не переиспользовать готовые результаты, чтобы каждый анализ доходил до GigaChat'
+        )
+        parser.add_argument('--no-wait', action='store_true', help='Не ждать завершения сессий анализа')
+        parser.add_argument('--wait-timeout', type=int, default=300)
+        parser.add_argument('--json', help='Сохранить отчёт в JSON (для сравнения прогонов)')
+        parser.add_argument(
+            '--compare',
+            help='Отчёт прошлого прогона: ошибка, если коды состояний по файлам корпуса отличаются'
+        )
+
+    def handle(self, *args, **options):
+        files = driver.collect_corpus(options['corpus'])
+        if not files:
+            raise CommandError(f"В {options['corpus']} нет файлов поддерживаемых форматов")
+        if options['base_url'] and options['fake']:
+            raise CommandError('--fake работает только без --base-url: сервер сам решает, куда ходить за GigaChat')
+
+        if options['base_url']:
+            if not options['password']:
+                raise CommandError('Для --base-url нужен --password')
+            token = driver.login(options['base_url'], options['email'], options['password'])
+            transport = driver.HttpTransport(options['base_url'], token)
+        else:
+            transport = driver.InProcessTransport(self._local_token(options['email']))
+
+        overrides, server = {}, None
+        if options['fake']:
+            server = start_server(FakeGigaChatConfig(
+                latency=options['latency'],
+                error_rate=options['error_rate'],
+                rate_limit_rate=options['rate_limit_rate'],
+                replay=options['replay'],
+                seed=options['seed'],
+            ), port=0)
+            overrides.update(
+                GIGACHAT_AUTH_URL=f'{server.url}/api/v2/oauth',
+                GIGACHAT_API_URL=f'{server.url}/api/v1',
+            )
+        if options['no_result_cache']:
+            overrides['ANALYSIS_RESULT_CACHE'] = False
+
+        run = driver.LoadRun(
+            transport,
+            files,
+            requests=options['requests'],
+            concurrency=options['concurrency'],
+            endpoint=options['endpoint'],
+            wait=not options['no_wait'],
+            wait_timeout=options['wait_timeout'],
+            corpus_root=options['corpus'],
+        )
+        self.stdout.write(f"Корпус: {len(files)} файлов, загрузок: {run.requests}, одновременно: {run.concurrency}")
+        # В этом процессе анализ выполняется внутри запроса загрузки, без брокера и воркеров
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = eager or not options['base_url']
+        try:
+            with override_settings(**overrides):
+                report = run.run()
+        finally:
+            celery_app.conf.task_always_eager = eager
+            if server:
+                server.shutdown()
+                # Токен заглушки не должен достаться воркерам, которые ходят в настоящий GigaChat
+                cache.delete(TOKEN_CACHE_KEY)
+        if server:
+            report['fake_gigachat'] = dict(server.stats)
+
+        self._write_report(report)
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Отчёт сохранён: {options['json']}")
+        if options['compare']:
+            self._compare(report, options['compare'])
+
+    def _compare(self, report, baseline_path):
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f).get('results', {})
+        changed = {
+            name: (baseline.get(name), report['results'].get(name))
+            for name in sorted(set(baseline) | set(report['results']))
+            if baseline.get(name) != report['results'].get(name)
+        }
+        if not changed:
+            self.stdout.write(self.style.SUCCESS(f'Результаты совпадают с {baseline_path}'))
+            return
+        for name, (before, after) in changed.items():
+            self.stdout.write(self.style.ERROR(f'  {name}: {before} → {after}'))
+        raise CommandError(f'Результаты отличаются от {baseline_path}: файлов {len(changed)}')
+
+    def _local_token(self, email):
+        from rest_framework_simplejwt.tokens import RefreshToken
+        from users.models import User
+
+        user = User.objects.filter(email=email).first()
+        if user is None:
+            user = User.objects.create_user(email=email, full_name='Нагрузочный тест')
+        return str(RefreshToken.for_user(user).access_token)
+
+    def _timings(self, stats):
+        if not stats.get('count'):
+            return 'нет замеров'
+        return (
+            f"n={stats['count']} p50={stats['p50']} p95={stats['p95']} p99={stats['p99']} "
+            f"avg={stats['avg']}"
+        )
+
+    def _write_report(self, report):
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово за {report['duration']} сек: {report['throughput_rps']} загрузок/сек, "
+            f"{report['completed_per_min']} завершённых анализов/мин"
+        ))
+        self.stdout.write('Загрузка (сек):')
+        for endpoint, stats in report['endpoints'].items():
+            queries = ''
+            if stats['queries_avg'] is not None:
+                queries = f" SQL avg={stats['queries_avg']} max={stats['queries_max']}"
+            self.stdout.write(f"  {endpoint:<10} {self._timings(stats)}{queries} статусы={stats['statuses']}")
+        self.stdout.write(f"Анализ от загрузки до завершения (сек): {self._timings(report['end_to_end'])}")
+        self.stdout.write(f"Исходы сессий: {report['outcomes']}")
+        self.stdout.write('Этапы (сек):')
+        for stage, stats in report['stages'].items():
+            source = ' (по корзинам гистограммы)' if stats['source'] == 'buckets' else ''
+            self.stdout.write(f"  {stage:<20} {self._timings(stats)}{source}")
+        if 'fake_gigachat' in report:
+            self.stdout.write(f"Заглушка GigaChat: {report['fake_gigachat']}")
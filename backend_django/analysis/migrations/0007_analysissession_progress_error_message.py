@@ -0,0 +1,25 @@
+# Generated by Django 4.2.13 on 2026-10-18 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analysis", "0006_alter_detectedcondition_condition_code"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="analysissession",
+            name="error_message",
+            field=models.TextField(blank=True, default="", verbose_name="Ошибка"),
+        ),
+        migrations.AddField(
+            model_name="analysissession",
+            name="progress",
+            field=models.PositiveSmallIntegerField(
+                default=0, verbose_name="Прогресс (%)"
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.13 on 2026-10-18 18:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analysis", "0007_analysissession_progress_error_message"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="analysisresult",
+            name="content_hash",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="analysisresult",
+            name="is_cacheable",
+            field=models.BooleanField(
+                default=False, verbose_name="Может быть переиспользован"
+            ),
+        ),
+        migrations.AddField(
+            model_name="analysisresult",
+            name="model_name",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+        migrations.AddField(
+            model_name="analysisresult",
+            name="prompt_version",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+        migrations.AddField(
+            model_name="analysisresult",
+            name="reused_from",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="reuses",
+                to="analysis.analysisresult",
+            ),
+        ),
+        migrations.AddField(
+            model_name="analysisresult",
+            name="text_hash",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name="analysisresult",
+            index=models.Index(
+                fields=["content_hash", "prompt_version", "model_name"],
+                name="result_content_key_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="analysisresult",
+            index=models.Index(
+                fields=["text_hash", "prompt_version", "model_name"],
+                name="result_text_key_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.13 on 2026-10-18 18:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0003_medicalfile_content_hash"),
+        ("analysis", "0008_analysisresult_cache_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExtractedText",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("text", models.TextField(blank=True)),
+                ("text_hash", models.CharField(db_index=True, max_length=64)),
+                (
+                    "extractor",
+                    models.CharField(max_length=50, verbose_name="Экстрактор"),
+                ),
+                (
+                    "extractor_version",
+                    models.CharField(max_length=20, verbose_name="Версия экстрактора"),
+                ),
+                (
+                    "duration",
+                    models.FloatField(
+                        default=0.0, verbose_name="Время извлечения (сек)"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "file",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="extracted_text",
+                        to="files.medicalfile",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Извлечённый текст",
+                "verbose_name_plural": "Извлечённые тексты",
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.13 on 2026-10-18 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analysis", "0009_extractedtext"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="extractedtext",
+            name="details",
+            field=models.JSONField(
+                blank=True, default=dict, verbose_name="Метрики экстрактора"
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.13 on 2026-10-18 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analysis", "0011_analysisbatch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="analysissession",
+            name="prompt_version",
+            field=models.CharField(
+                blank=True, default="", max_length=100, verbose_name="Версия промта"
+            ),
+        ),
+    ]
@@ -0,0 +1,147 @@
+import math
+
+from django.db import migrations
+
+# Копия правил analysis.services.response_parser на момент миграции: дальнейшие
+# изменения парсера не должны менять то, что делает уже применённая миграция
+RESULT_SCHEMA_VERSION = 1
+BATCH_SIZE = 500
+
+SEVERITIES = ("low", "medium", "high")
+SEVERITY_ALIASES = {
+    "mild": "low", "minor": "low", "низкая": "low", "лёгкая": "low", "легкая": "low",
+    "moderate": "medium", "средняя": "medium", "умеренная": "medium",
+    "severe": "high", "critical": "high", "высокая": "high", "тяжёлая": "high", "тяжелая": "high",
+}
+PIPELINE_FIELDS = ("error", "chunks", "failed_chunks", "source")
+
+
+def _pick(data, *keys):
+    return next((data[key] for key in keys if data.get(key) not in (None, "", [])), None)
+
+
+def _string(value, default, max_length):
+    if isinstance(value, (list, tuple)):
+        value = ", ".join(str(item) for item in value if item not in (None, ""))
+    elif value is None or isinstance(value, dict):
+        return default
+    value = str(value).strip()
+    return value[:max_length] if value else default
+
+
+def _text(value, default, max_length):
+    if isinstance(value, (list, tuple)):
+        value = "\n".join(str(item).strip() for item in value if item not in (None, ""))
+    return _string(value, default, max_length)
+
+
+def _probability(value):
+    if isinstance(value, bool) or value is None:
+        return 0.0
+    if isinstance(value, str):
+        value = value.strip().rstrip("%").replace(",", ".")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    if math.isnan(value) or value < 0:
+        return 0.0
+    if 1 < value <= 100:
+        value /= 100
+    return min(value, 1.0)
+
+
+def _condition(data):
+    if not isinstance(data, dict):
+        return None
+    name = _string(_pick(data, "condition_name", "name", "condition", "diagnosis"), None, 255)
+    if name is None:
+        return None
+    severity = str(_pick(data, "severity") or "").strip().lower()
+    severity = SEVERITY_ALIASES.get(severity, severity)
+    condition = {
+        "condition_name": name,
+        "code": _string(_pick(data, "code", "icd10", "icd_code", "mkb"), "UNKNOWN", 50),
+        "confidence": _probability(_pick(data, "confidence")),
+        "severity": severity if severity in SEVERITIES else "medium",
+    }
+    description = _pick(data, "description")
+    if description is not None:
+        condition["description"] = _string(description, "", 500)
+    return condition
+
+
+def _normalize(data):
+    conditions = _pick(data, "detected_conditions", "conditions", "diagnoses")
+    if isinstance(conditions, dict):
+        conditions = [conditions]
+    if not isinstance(conditions, (list, tuple)):
+        conditions = []
+    result = {
+        "summary": _string(_pick(data, "summary"), "Анализ выполнен", 2000),
+        "detected_conditions": [c for c in map(_condition, conditions) if c is not None],
+        "recommendations": _text(_pick(data, "recommendations"), "Рекомендуется консультация врача", 4000),
+        "confidence": _probability(_pick(data, "confidence")),
+    }
+    for field in PIPELINE_FIELDS:
+        if field in data:
+            result[field] = data[field]
+    result["schema_version"] = RESULT_SCHEMA_VERSION
+    return result
+
+
+def _normalize_batch(AnalysisResult, DetectedCondition, batch):
+    # Старые результаты без состояний в JSON показывались по строкам DetectedCondition
+    without_conditions = [
+        result.id for result, data in batch
+        if not (data.get("detected_conditions") or data.get("conditions"))
+    ]
+    stored = {}
+    for condition in DetectedCondition.objects.filter(result_id__in=without_conditions).order_by("id"):
+        stored.setdefault(condition.result_id, []).append({
+            "condition_name": condition.condition_name,
+            "code": condition.condition_code,
+            "confidence": condition.confidence,
+            "severity": condition.severity,
+        })
+    for result, data in batch:
+        if result.id in stored:
+            data["detected_conditions"] = stored[result.id]
+        result.result_json = _normalize(data)
+    AnalysisResult.objects.bulk_update([result for result, _ in batch], ["result_json"])
+
+
+def normalize_results(apps, schema_editor):
+    """Приводит сохранённые result_json к схеме, чтобы чтение не разбирало их заново."""
+    AnalysisResult = apps.get_model("analysis", "AnalysisResult")
+    DetectedCondition = apps.get_model("analysis", "DetectedCondition")
+
+    batch = []
+    results = AnalysisResult.objects.only("id", "result_json", "recommendations", "confidence")
+    for result in results.iterator(chunk_size=BATCH_SIZE):
+        data = result.result_json if isinstance(result.result_json, dict) else {}
+        if data.get("schema_version") == RESULT_SCHEMA_VERSION:
+            continue
+        # Чтение раньше брало недостающие поля из колонок результата
+        data = {
+            "recommendations": result.recommendations,
+            "confidence": result.confidence,
+            **{key: value for key, value in data.items() if value not in (None, "")},
+        }
+        batch.append((result, data))
+        if len(batch) >= BATCH_SIZE:
+            _normalize_batch(AnalysisResult, DetectedCondition, batch)
+            batch = []
+    if batch:
+        _normalize_batch(AnalysisResult, DetectedCondition, batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analysis", "0012_analysissession_prompt_version"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_results, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.13 on 2026-10-18 19:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("analysis", "0013_normalize_result_json"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LabMeasurement",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "analyte",
+                    models.CharField(max_length=20, verbose_name="Код показателя"),
+                ),
+                ("value", models.FloatField(verbose_name="Значение")),
+                (
+                    "unit",
+                    models.CharField(
+                        blank=True, default="", max_length=20, verbose_name="Единица"
+                    ),
+                ),
+                ("reference_low", models.FloatField(blank=True, null=True)),
+                ("reference_high", models.FloatField(blank=True, null=True)),
+                (
+                    "flag",
+                    models.CharField(
+                        choices=[
+                            ("normal", "В норме"),
+                            ("low", "Ниже нормы"),
+                            ("high", "Выше нормы"),
+                            ("borderline", "Пограничное"),
+                        ],
+                        default="normal",
+                        max_length=20,
+                    ),
+                ),
+                ("measured_at", models.DateTimeField(verbose_name="Дата анализа")),
+                (
+                    "session",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lab_measurements",
+                        to="analysis.analysissession",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lab_measurements",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Лабораторный показатель",
+                "verbose_name_plural": "Лабораторные показатели",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "analyte", "measured_at"], name="lab_series_idx"
+                    )
+                ],
+                "unique_together": {("session", "analyte")},
+            },
+        ),
+    ]
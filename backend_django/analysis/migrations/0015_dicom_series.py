@@ -0,0 +1,109 @@
+# Generated by Django 4.2.13 on 2026-10-18 19:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0003_medicalfile_content_hash"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("analysis", "0014_labmeasurement"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DicomSeries",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "study_uid",
+                    models.CharField(
+                        db_index=True, max_length=64, verbose_name="Study Instance UID"
+                    ),
+                ),
+                (
+                    "series_uid",
+                    models.CharField(max_length=64, verbose_name="Series Instance UID"),
+                ),
+                ("modality", models.CharField(blank=True, default="", max_length=16)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "leader",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="led_dicom_series",
+                        to="files.medicalfile",
+                        verbose_name="Анализируемый файл серии",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="dicom_series",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Серия DICOM",
+                "verbose_name_plural": "Серии DICOM",
+                "unique_together": {("user", "series_uid")},
+            },
+        ),
+        migrations.CreateModel(
+            name="DicomInstance",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "sop_uid",
+                    models.CharField(
+                        db_index=True, max_length=64, verbose_name="SOP Instance UID"
+                    ),
+                ),
+                ("instance_number", models.IntegerField(blank=True, null=True)),
+                (
+                    "file",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="dicom_instance",
+                        to="files.medicalfile",
+                    ),
+                ),
+                (
+                    "series",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="instances",
+                        to="analysis.dicomseries",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Снимок DICOM",
+                "verbose_name_plural": "Снимки DICOM",
+            },
+        ),
+    ]
@@ -3,6 +3,19 @@ import uuid
 from users.models import User
 from files.models import MedicalFile
 
+class AnalysisBatch(models.Model):
+    """Группа файлов, загруженных одним запросом и анализируемых вместе."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='analysis_batches')
+    file_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Batch {self.id} ({self.file_count} файлов)"
+
 class AnalysisSession(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Ожидает'),
@@ -13,14 +26,44 @@ class AnalysisSession(models.Model):
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     file = models.ForeignKey(MedicalFile, on_delete=models.CASCADE, related_name='analysis_sessions')
+    batch = models.ForeignKey(
+        AnalysisBatch,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='sessions'
+    )
     model_ml_version = models.CharField(max_length=100)
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name='Прогресс (%)')
+    error_message = models.TextField(blank=True, default='', verbose_name='Ошибка')
+    prompt_version = models.CharField(max_length=100, blank=True, default='', verbose_name='Версия промта')
     
     def __str__(self):
         return f"Session {self.id} - {self.status}"
 
+class ExtractedText(models.Model):
+    """Текст, один раз извлечённый из файла; переиспользуется повторными анализами."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file = models.OneToOneField(MedicalFile, on_delete=models.CASCADE, related_name='extracted_text')
+    text = models.TextField(blank=True)
+    text_hash = models.CharField(max_length=64, db_index=True)
+    extractor = models.CharField(max_length=50, verbose_name='Экстрактор')
+    extractor_version = models.CharField(max_length=20, verbose_name='Версия экстрактора')
+    duration = models.FloatField(default=0.0, verbose_name='Время извлечения (сек)')
+    details = models.JSONField(default=dict, blank=True, verbose_name='Метрики экстрактора')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Извлечённый текст'
+        verbose_name_plural = 'Извлечённые тексты'
+
+    def __str__(self):
+        return f"{self.extractor} v{self.extractor_version} - {self.file_id}"
+
 class AnalysisResult(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     session = models.OneToOneField(AnalysisSession, on_delete=models.CASCADE, related_name='result')
@@ -29,6 +72,27 @@ class AnalysisResult(models.Model):
     recommendations = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     processing_time = models.FloatField(default=0.0, verbose_name='Время обработки (сек)')
+
+    # Ключ кеша результатов: один и тот же файл/текст с тем же промтом и моделью
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    text_hash = models.CharField(max_length=64, blank=True, default='')
+    prompt_version = models.CharField(max_length=100, blank=True, default='')
+    model_name = models.CharField(max_length=100, blank=True, default='')
+    is_cacheable = models.BooleanField(default=False, verbose_name='Может быть переиспользован')
+    reused_from = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reuses'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_hash', 'prompt_version', 'model_name'], name='result_content_key_idx'),
+            models.Index(fields=['text_hash', 'prompt_version', 'model_name'], name='result_text_key_idx'),
+        ]
+
     def __str__(self):
         return f"Result {self.id} - {self.confidence:.2f}"
 
@@ -49,6 +113,77 @@ class DetectedCondition(models.Model):
     def __str__(self):
         return f"{self.condition_name} ({self.confidence:.2%})"
 
+class LabMeasurement(models.Model):
+    """Значение лабораторного показателя из анализа: ряд пациента строится одним запросом по индексу."""
+    FLAG_CHOICES = [
+        ('normal', 'В норме'),
+        ('low', 'Ниже нормы'),
+        ('high', 'Выше нормы'),
+        ('borderline', 'Пограничное'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='lab_measurements')
+    session = models.ForeignKey(AnalysisSession, on_delete=models.CASCADE, related_name='lab_measurements')
+    analyte = models.CharField(max_length=20, verbose_name='Код показателя')
+    value = models.FloatField(verbose_name='Значение')
+    unit = models.CharField(max_length=20, blank=True, default='', verbose_name='Единица')
+    reference_low = models.FloatField(null=True, blank=True)
+    reference_high = models.FloatField(null=True, blank=True)
+    flag = models.CharField(max_length=20, choices=FLAG_CHOICES, default='normal')
+    measured_at = models.DateTimeField(verbose_name='Дата анализа')
+
+    class Meta:
+        verbose_name = 'Лабораторный показатель'
+        verbose_name_plural = 'Лабораторные показатели'
+        unique_together = ('session', 'analyte')
+        indexes = [
+            models.Index(fields=['user', 'analyte', 'measured_at'], name='lab_series_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.analyte} {self.value} {self.unit}"
+
+class DicomSeries(models.Model):
+    """Серия DICOM пациента: анализируется один раз по файлу-представителю (leader)."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='dicom_series')
+    study_uid = models.CharField(max_length=64, db_index=True, verbose_name='Study Instance UID')
+    series_uid = models.CharField(max_length=64, verbose_name='Series Instance UID')
+    modality = models.CharField(max_length=16, blank=True, default='')
+    leader = models.ForeignKey(
+        MedicalFile,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='led_dicom_series',
+        verbose_name='Анализируемый файл серии'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Серия DICOM'
+        verbose_name_plural = 'Серии DICOM'
+        unique_together = ('user', 'series_uid')
+
+    def __str__(self):
+        return f"{self.modality} {self.series_uid}"
+
+class DicomInstance(models.Model):
+    """Файл-снимок серии DICOM с его идентификаторами из заголовка."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file = models.OneToOneField(MedicalFile, on_delete=models.CASCADE, related_name='dicom_instance')
+    series = models.ForeignKey(DicomSeries, on_delete=models.CASCADE, related_name='instances')
+    sop_uid = models.CharField(max_length=64, db_index=True, verbose_name='SOP Instance UID')
+    instance_number = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Снимок DICOM'
+        verbose_name_plural = 'Снимки DICOM'
+
+    def __str__(self):
+        return f"{self.sop_uid} ({self.instance_number})"
+
 class AIPrompt(models.Model):
     FILE_TYPE_CHOICES = [
         ('all', 'Все типы'),
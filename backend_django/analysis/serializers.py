@@ -46,8 +46,8 @@ class AnalysisSessionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = AnalysisSession
-        fields = ['id', 'filename', 'model_ml_version', 'start_time', 'end_time', 'status', 'result']
-        read_only_fields = ['id', 'start_time', 'end_time', 'status']
+        fields = ['id', 'filename', 'model_ml_version', 'prompt_version', 'start_time', 'end_time', 'status', 'result']
+        read_only_fields = ['id', 'prompt_version', 'start_time', 'end_time', 'status']
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
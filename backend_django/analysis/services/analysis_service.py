@@ -0,0 +1,269 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from analysis.models import AnalysisSession, AnalysisResult, DetectedCondition
+from diseases.services import update_disease_history
+from . import (
+    chunked_analysis, dicom_series, lab_measurements, lab_rules, latency, prompt_registry, response_parser,
+    result_cache, semantic_cache, text_store
+)
+from .partial_results import PartialResultPublisher
+from .gigachat_service import get_gigachat_service
+from .resilience import GigaChatUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Этапы конвейера и соответствующий им прогресс (в процентах)
+PROGRESS_QUEUED = 5
+PROGRESS_EXTRACTING = 20
+PROGRESS_ANALYZING = 50
+PROGRESS_SAVING = 90
+PROGRESS_DONE = 100
+
+
+def set_progress(session, progress, **fields):
+    """Обновляет прогресс сессии одним UPDATE, не трогая остальные поля."""
+    session.progress = progress
+    for name, value in fields.items():
+        setattr(session, name, value)
+    AnalysisSession.objects.filter(pk=session.pk).update(progress=progress, **fields)
+
+
+def run_analysis(session):
+    """Полный цикл анализа файла сессии: извлечение текста, запрос к GigaChat, сохранение."""
+    medical_file = session.file
+    series = None
+    try:
+        logger.info(f"Начинаем анализ файла: {medical_file.filename}")
+        gigachat = get_gigachat_service()
+        prompt = prompt_registry.get_prompt(
+            prompt_registry.file_type_for(medical_file.mime_type, medical_file.filename)
+        )
+        set_progress(session, PROGRESS_EXTRACTING, status='in_progress', prompt_version=prompt.version)
+        cache_key = {'prompt_version': prompt.version, 'model_name': gigachat.model}
+
+        cached = settings.ANALYSIS_RESULT_CACHE and result_cache.find_by_content(medical_file.content_hash, **cache_key)
+        if cached:
+            logger.info(f"♻️ Файл уже анализировался, переиспользуем результат {cached.id}")
+            result_cache.record_hit()
+            return _save_result(
+                session, _reused_result(cached, medical_file.user), cached.text_hash, cache_key, reused_from=cached
+            )
+
+        extraction_ok = False
+        dicom_uids = None
+        try:
+            with latency.timed('extraction'):
+                extracted = text_store.get_extracted_text(medical_file)
+            extracted_text = extracted.text
+            dicom_uids = extracted.details.get('dicom')
+            if not extracted_text or len(extracted_text.strip()) < 50:
+                logger.warning("⚠️ Мало текста извлечено")
+                extracted_text = f"Файл: {medical_file.filename}\nТип: {medical_file.mime_type}\nТекст не извлечён"
+            else:
+                extraction_ok = True
+        except Exception as e:
+            logger.error(f"❌ Ошибка извлечения текста: {e}")
+            extracted_text = f"Ошибка извлечения: {str(e)[:200]}"
+
+        text_digest = result_cache.text_hash(extracted_text)
+        user = medical_file.user
+        if dicom_uids and dicom_uids.get('series_uid'):
+            # Снимки одной серии анализируются один раз — по файлу-представителю
+            series = dicom_series.index_instance(medical_file, dicom_uids)
+            with transaction.atomic():
+                role, leader_result = dicom_series.claim(series, medical_file)
+                if role == dicom_series.WAIT:
+                    set_progress(session, PROGRESS_QUEUED, status='pending')
+            if role == dicom_series.WAIT:
+                logger.info(f"🩻 Снимок ждёт анализа серии по файлу {series.leader_id}")
+                return {'success': True, 'session_id': str(session.id), 'waiting_for': str(series.leader_id)}
+            if role == dicom_series.REUSE:
+                logger.info(f"♻️ Серия DICOM уже проанализирована, переиспользуем результат {leader_result.id}")
+                return _save_result(session, leader_result.result_json, text_digest, cache_key, reused_from=leader_result)
+        if extraction_ok and settings.ANALYSIS_LAB_RULES:
+            # Типовой бланк анализов без пограничных значений проверяется по референсам без GigaChat
+            with latency.timed('lab_rules'):
+                lab_result = lab_rules.analyze_lab_text(extracted_text, sex=user.sex, age=user.age)
+            if lab_result is not None:
+                set_progress(
+                    session, PROGRESS_ANALYZING,
+                    model_ml_version=lab_rules.MODEL_NAME, prompt_version=lab_rules.RULES_VERSION
+                )
+                rules_key = {'prompt_version': lab_rules.RULES_VERSION, 'model_name': lab_rules.MODEL_NAME}
+                return _save_result(session, lab_result, text_digest, rules_key, series=series)
+
+        if extraction_ok and settings.ANALYSIS_RESULT_CACHE:
+            cached = result_cache.find_by_text(text_digest, **cache_key)
+            if cached:
+                logger.info(f"♻️ Текст уже анализировался, переиспользуем результат {cached.id}")
+                result_cache.record_hit()
+                return _save_result(
+                    session, _with_lab_values(cached.result_json, extracted_text, user), text_digest, cache_key,
+                    reused_from=cached, series=series
+                )
+
+        similar = None
+        if extraction_ok and settings.ANALYSIS_RESULT_CACHE and settings.ANALYSIS_SEMANTIC_CACHE:
+            with latency.timed('semantic_cache'):
+                similar = semantic_cache.probe(extracted_text, user.pk, **cache_key)
+            if similar and similar.reusable:
+                logger.info(f"♻️ Похожий документ уже анализировался ({similar.score:.3f}), переиспользуем {similar.result.id}")
+                result_cache.record_hit()
+                return _save_result(
+                    session, _with_lab_values(similar.result.result_json, extracted_text, user), text_digest,
+                    cache_key, reused_from=similar.result, series=series
+                )
+        result_cache.record_miss()
+
+        llm_text = extracted_text
+        if similar and similar.result:
+            logger.info(f"🧠 Похожий документ ({similar.score:.3f}): прошлое заключение передаётся как контекст")
+            llm_text = semantic_cache.with_context(extracted_text, similar.result)
+
+        set_progress(session, PROGRESS_ANALYZING)
+        publisher = PartialResultPublisher(session.id)
+        with latency.timed('llm'):
+            analysis_result = chunked_analysis.analyze_text(
+                gigachat,
+                llm_text,
+                medical_file.mime_type,
+                medical_file.filename,
+                prompt=prompt,
+                timeout=20,
+                on_partial=publisher
+            )
+        publisher.flush()
+
+        if extraction_ok:
+            # Значения из таблиц бланка сохраняются в ряды пациента, даже если заключение дал GigaChat
+            analysis_result = _with_lab_values(analysis_result, extracted_text, user)
+
+        cacheable = extraction_ok and not analysis_result.get('error')
+        saved = _save_result(session, analysis_result, text_digest, cache_key, cacheable=cacheable, series=series)
+        if cacheable:
+            semantic_cache.remember(similar, user.pk, saved['result_id'])
+        return saved
+
+    except GigaChatUnavailable as e:
+        # Результата нет, но и ошибки анализа нет: сессию повторит задача
+        logger.warning(f"⏸️ GigaChat недоступен, сессия {session.id} вернётся в очередь: {e}")
+        set_progress(session, PROGRESS_QUEUED, status='pending')
+        raise
+    except Exception as e:
+        logger.error(f"💥 Ошибка анализа сессии {session.id}: {e}", exc_info=True)
+        set_progress(
+            session, 0,
+            status='failed',
+            end_time=timezone.now(),
+            error_message=str(e)[:500]
+        )
+        if series is not None:
+            dicom_series.hand_over(series, medical_file)
+        return {'success': False, 'error': str(e), 'session_id': str(session.id)}
+
+
+def _with_lab_values(analysis_result, text, user):
+    """
+    Результат с показателями бланка, отмеченными по нормам этого пациента (пол, возраст).
+    Переиспользуемый результат мог быть получен для другого пациента: его lab_values
+    и lab_date отбрасываются и считаются заново.
+    """
+    analysis_result = {
+        key: value for key, value in analysis_result.items() if key not in ('lab_values', 'lab_date')
+    }
+    lab_values = lab_rules.extract_lab_values(text, sex=user.sex, age=user.age)
+    if lab_values:
+        analysis_result.update(lab_values=lab_values, lab_date=lab_rules.document_date(text))
+    return analysis_result
+
+
+def _reused_result(cached, user):
+    """
+    Результат по тому же содержимому для этого пациента без повторного извлечения текста:
+    показатели пересчитываются по тексту, уже сохранённому для исходного файла, а без него —
+    по значениям lab_values. Если пересчитать не удалось, остаётся сохранённый результат.
+    """
+    result_json = cached.result_json
+    if 'lab_values' not in result_json:
+        return result_json
+    try:
+        stored_text = text_store.find_text(cached.text_hash)
+        if stored_text is not None:
+            return _with_lab_values(result_json, stored_text, user)
+        lab_values = lab_rules.recheck_lab_values(result_json['lab_values'], sex=user.sex, age=user.age)
+        return {**result_json, 'lab_values': lab_values}
+    except Exception as e:
+        logger.warning(f"⚠️ Показатели результата {cached.id} не пересчитаны: {e}")
+        return result_json
+
+
+def _save_result(session, analysis_result, text_digest, cache_key, cacheable=False, reused_from=None, series=None):
+    medical_file = session.file
+    logger.info("🟢 Начинаем сохранение результата в БД")
+    set_progress(session, PROGRESS_SAVING)
+
+    # Результат сохраняется уже приведённым к схеме: чтение отдаёт result_json как есть
+    analysis_result = response_parser.normalize_result(analysis_result)
+    raw_conditions = analysis_result['detected_conditions']
+    logger.info(f"📋 Найдено условий: {len(raw_conditions)}")
+
+    overall_confidence = analysis_result['confidence']
+    if not overall_confidence and raw_conditions:
+        overall_confidence = max(c['confidence'] for c in raw_conditions)
+
+    conditions = [
+        DetectedCondition(
+            condition_code=cond['code'],
+            condition_name=cond['condition_name'],
+            confidence=cond['confidence'],
+            severity=cond['severity'],
+            # Результаты, сохранённые до появления default, могут содержать description=None
+            description=cond.get('description') or ''
+        )
+        for cond in raw_conditions
+        if cond['confidence'] > 0.1
+    ]
+
+    # Результат, состояния, история заболеваний и статус сессии фиксируются вместе
+    with latency.timed('save'), transaction.atomic():
+        result_obj = AnalysisResult.objects.create(
+            session=session,
+            confidence=overall_confidence,
+            result_json=analysis_result,
+            recommendations=analysis_result['recommendations'],
+            processing_time=(timezone.now() - session.start_time).total_seconds(),
+            content_hash=medical_file.content_hash,
+            text_hash=text_digest,
+            is_cacheable=cacheable,
+            reused_from=reused_from,
+            **cache_key
+        )
+        for condition in conditions:
+            condition.result = result_obj
+        DetectedCondition.objects.bulk_create(conditions)
+        lab_measurements.record_measurements(session, medical_file.user_id, analysis_result)
+
+        update_disease_history(medical_file.user, raw_conditions, session=session)
+
+        set_progress(session, PROGRESS_DONE, status='completed', end_time=timezone.now())
+
+    logger.info(f"✅ AnalysisResult сохранён: {result_obj.id}, состояний: {len(conditions)}")
+    logger.info(f"✅ Сессия завершена: end_time={session.end_time}")
+
+    if series is not None:
+        # Снимки серии, ждавшие представителя, получают тот же результат без повторного анализа
+        for waiting in dicom_series.waiting_sessions(series, medical_file):
+            _save_result(waiting, analysis_result, text_digest, cache_key, reused_from=result_obj)
+
+    return {
+        'success': True,
+        'session_id': str(session.id),
+        'result_id': str(result_obj.id),
+        'conditions_count': len(conditions),
+        'reused': reused_from is not None
+    }
+
@@ -0,0 +1,172 @@
+import time
+import logging
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.dateparse import parse_date
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'charts'
+METHODS = ('lttb', 'minmax')
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: threshold точек, сохраняющих форму ряда.
+    Первая и последняя точки остаются, из каждой корзины берётся точка, образующая
+    наибольший треугольник с выбранной точкой предыдущей корзины и средним следующей.
+    Возвращает индексы выбранных точек.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Границы корзин между первой и последней точкой
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean() if next_end > end else x[-1]
+        next_y = y[end:next_end].mean() if next_end > end else y[-1]
+        # Удвоенная площадь треугольника для всех точек корзины разом
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax(x, y, threshold):
+    """
+    Минимум и максимум каждой из threshold / 2 равных по времени корзин — пики
+    и провалы не теряются. Корзины и экстремумы находятся одной сортировкой.
+    Возвращает индексы выбранных точек в порядке времени.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+
+    buckets = max(1, threshold // 2)
+    span = x[-1] - x[0]
+    if span <= 0:
+        bucket_ids = np.arange(n) * buckets // n
+    else:
+        bucket_ids = np.minimum(((x - x[0]) / span * buckets).astype(int), buckets - 1)
+    order = np.lexsort((y, bucket_ids))
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket_ids[order])) + 1))
+    ends = np.concatenate((starts[1:], [n])) - 1
+    return np.unique(np.concatenate((order[starts], order[ends], [0, n - 1])))
+
+
+DOWNSAMPLERS = {'lttb': lttb, 'minmax': minmax}
+
+
+def downsample(timestamps, values, points, method='lttb'):
+    """Индексы точек ряда после прореживания до points точек выбранным методом."""
+    x = np.asarray(timestamps, dtype=float)
+    y = np.asarray(values, dtype=float)
+    return DOWNSAMPLERS[method](x, y, points)
+
+
+def _version_key(user_id):
+    return f'{KEY_PREFIX}:version:{user_id}'
+
+
+def _version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Начальная версия от времени: после вытеснения ключа старые графики не оживут
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(user_id):
+    """Сбрасывает все закешированные графики пользователя (любые ряды и периоды)."""
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def cache_key(user_id, series, since, until, points, method):
+    return (
+        f'{KEY_PREFIX}:{user_id}:{_version(user_id)}:{series}:'
+        f'{since or ""}:{until or ""}:{points}:{method}'
+    )
+
+
+def build_chart(user_id, series, rows, since=None, until=None, points=None, method='lttb'):
+    """
+    Прореженный ряд для графика из rows — списка (момент, значение) по времени.
+    rows может быть функцией без аргументов: тогда она вызывается только при
+    промахе кеша. Результат кешируется по пользователю, ряду, периоду и бюджету точек.
+    """
+    points = points or settings.CHART_DEFAULT_POINTS
+    key = cache_key(user_id, series, since, until, points, method)
+    chart = cache.get(key)
+    if chart is not None:
+        return chart
+
+    rows = list(rows() if callable(rows) else rows)
+    if rows:
+        moments, values = zip(*rows)
+        selected = downsample([moment_timestamp(m) for m in moments], values, points, method)
+        data = [[moments[i].isoformat(), values[i]] for i in selected]
+    else:
+        data = []
+    chart = {
+        'series': series,
+        'method': method,
+        'total': len(rows),
+        'returned': len(data),
+        'points': data,
+    }
+    cache.set(key, chart, timeout=settings.CHART_CACHE_TTL)
+    return chart
+
+
+def moment_timestamp(moment):
+    """Секунды для оси времени: момент — от эпохи, дата — от её порядкового номера."""
+    if isinstance(moment, datetime):
+        return moment.timestamp()
+    return moment.toordinal() * SECONDS_PER_DAY
+
+
+def parse_chart_params(params):
+    """
+    Общие параметры графиков: points, method, since и until (ГГГГ-ММ-ДД).
+    Неверное значение — ValueError с текстом для ответа 400.
+    """
+    try:
+        points = int(params.get('points') or settings.CHART_DEFAULT_POINTS)
+    except ValueError:
+        raise ValueError(f"Неверное число точек: {params.get('points')}")
+    method = params.get('method') or 'lttb'
+    if method not in METHODS:
+        raise ValueError(f"Неизвестный метод прореживания: {method}")
+
+    bounds = {}
+    for name in ('since', 'until'):
+        value = params.get(name)
+        if not value:
+            continue
+        bounds[name] = parse_date(value)
+        if bounds[name] is None:
+            raise ValueError(f'Неверная дата {name}: {value}')
+    return {
+        'points': min(max(points, settings.CHART_MIN_POINTS), settings.CHART_MAX_POINTS),
+        'method': method,
+        **bounds,
+    }
@@ -0,0 +1,189 @@
+import math
+import re
+import time
+import logging
+
+from django.conf import settings
+
+from diseases.services import normalize_code
+from .prompt_registry import PROMPT_TEXT_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# Токенизатор GigaChat локально недоступен: токены оцениваются по словам.
+# Кириллица в BPE-словаре занимает в среднем 3–4 символа на токен
+CHARS_PER_TOKEN = 3.5
+TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+
+TABLE_CELL_SEPARATOR = ' | '
+# Строка-заголовок раздела: «ОБЩИЙ АНАЛИЗ КРОВИ», «Заключение:», «2. Биохимия»
+HEADING_RE = re.compile(r'^(?:\d+[.)]\s+\S.*|[^a-zа-яё]*[A-ZА-ЯЁ][^a-zа-яё]{3,}|.{3,80}:)$')
+
+SEVERITY_RANK = {'low': 0, 'medium': 1, 'high': 2}
+
+
+def estimate_tokens(text):
+    """Оценка числа токенов: слово — не меньше одного токена, знак препинания — токен."""
+    return sum(max(1, math.ceil(len(token) / CHARS_PER_TOKEN)) for token in TOKEN_RE.findall(text))
+
+
+def _is_table_row(line):
+    return TABLE_CELL_SEPARATOR in line
+
+
+def _split_blocks(text):
+    """
+    Делит текст на смысловые блоки: таблица (подряд идущие строки « | »)
+    остаётся одним блоком, заголовок и пустая строка начинают новый.
+    """
+    blocks, current, in_table = [], [], False
+    for line in text.splitlines():
+        stripped = line.strip()
+        table_row = _is_table_row(stripped)
+        boundary = not stripped or table_row != in_table or (HEADING_RE.match(stripped) and not table_row)
+        if boundary and current:
+            blocks.append(current)
+            current = []
+        if stripped:
+            current.append(stripped)
+        in_table = table_row
+    if current:
+        blocks.append(current)
+
+    # Одиночный заголовок не отрывается от раздела, который он открывает
+    merged = []
+    for block in blocks:
+        if merged and len(merged[-1]) == 1 and HEADING_RE.match(merged[-1][0]):
+            merged[-1] = merged[-1] + block
+        else:
+            merged.append(block)
+    return merged
+
+
+def _split_long_line(line, max_tokens):
+    words, piece = line.split(' '), []
+    for word in words:
+        if piece and estimate_tokens(' '.join(piece + [word])) > max_tokens:
+            yield ' '.join(piece)
+            piece = []
+        piece.append(word[:PROMPT_TEXT_LIMIT])
+    if piece:
+        yield ' '.join(piece)
+
+
+def _split_block(block, max_tokens):
+    """Режет блок больше бюджета по строкам; у частей таблицы повторяется её шапка."""
+    header = next((line for line in block if _is_table_row(line)), None)
+    pieces, current = [], []
+    for line in block:
+        for part in (_split_long_line(line, max_tokens) if estimate_tokens(line) > max_tokens else [line]):
+            if current and estimate_tokens('\n'.join(current + [part])) > max_tokens:
+                pieces.append(current)
+                current = [header] if header and part != header else []
+            current.append(part)
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_chunks(text, max_tokens=None):
+    """
+    Делит извлечённый текст на части не больше max_tokens токенов
+    (и не длиннее PROMPT_TEXT_LIMIT символов) по границам разделов и таблиц.
+    """
+    max_tokens = max_tokens or settings.ANALYSIS_CHUNK_TOKENS
+    # Запас по символам: оценка токенов может ошибаться на плотном тексте
+    max_tokens = min(max_tokens, int(PROMPT_TEXT_LIMIT / CHARS_PER_TOKEN))
+
+    chunks, current, current_tokens = [], [], 0
+    for block in _split_blocks(text):
+        block_tokens = estimate_tokens('\n'.join(block))
+        parts = [block] if block_tokens <= max_tokens else _split_block(block, max_tokens)
+        for part in parts:
+            part_text = '\n'.join(part)
+            part_tokens = estimate_tokens(part_text)
+            if current and current_tokens + part_tokens > max_tokens:
+                chunks.append('\n'.join(current))
+                current, current_tokens = [], 0
+            current.append(part_text)
+            current_tokens += part_tokens
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+def merge_results(results):
+    """
+    Сводит ответы по частям: состояния объединяются по коду МКБ-10
+    (или названию) с наибольшей уверенностью и тяжестью, резюме и рекомендации
+    склеиваются без повторов.
+    """
+    succeeded = [result for result in results if not result.get('error')]
+    if not succeeded:
+        return results[0]
+
+    conditions = {}
+    for result in succeeded:
+        for condition in result.get('detected_conditions', []):
+            key = normalize_code(condition.get('code'), condition.get('condition_name'))
+            known = conditions.get(key)
+            if known is None:
+                conditions[key] = dict(condition)
+                continue
+            severity = max(known.get('severity'), condition.get('severity'), key=lambda s: SEVERITY_RANK.get(s, 1))
+            if float(condition.get('confidence', 0.0)) > float(known.get('confidence', 0.0)):
+                known.update(condition)
+            known['severity'] = severity
+
+    def unique_texts(field):
+        texts = []
+        for result in succeeded:
+            text = str(result.get(field) or '').strip()
+            if text and text not in texts:
+                texts.append(text)
+        return texts
+
+    merged = {
+        'summary': ' '.join(unique_texts('summary')) or 'Анализ выполнен',
+        'detected_conditions': sorted(
+            conditions.values(), key=lambda c: float(c.get('confidence', 0.0)), reverse=True
+        ),
+        'recommendations': '\n'.join(unique_texts('recommendations')) or 'Рекомендуется консультация врача',
+        'confidence': max(float(result.get('confidence', 0.0)) for result in succeeded),
+        'chunks': len(results),
+    }
+    failed = len(results) - len(succeeded)
+    if failed:
+        # Неполный анализ не должен попасть в кеш результатов
+        merged['failed_chunks'] = failed
+        merged['error'] = f'Не проанализировано частей документа: {failed} из {len(results)}'
+    return merged
+
+
+def analyze_text(gigachat, text, file_type, file_name, prompt, timeout, on_partial=None):
+    """
+    Анализирует документ целиком: короткий — одним запросом, длинный — частями
+    параллельно (не больше ANALYSIS_CHUNK_WORKERS запросов одновременно)
+    с последующим слиянием результатов. on_partial(partial, part=0)
+    получает частичные результаты каждой части по мере ответа модели.
+    """
+    chunks = split_into_chunks(text)
+    if len(chunks) > settings.ANALYSIS_MAX_CHUNKS:
+        logger.warning(f"⚠️ Документ разбит на {len(chunks)} частей, анализируем первые {settings.ANALYSIS_MAX_CHUNKS}")
+        chunks = chunks[:settings.ANALYSIS_MAX_CHUNKS]
+    if len(chunks) <= 1:
+        return gigachat.analyze_medical_data(
+            text, file_type, file_name, timeout=timeout, prompt=prompt, on_partial=on_partial
+        )
+
+    started = time.monotonic()
+    results = gigachat.analyze_many(
+        chunks, file_type, file_name,
+        timeout=timeout,
+        prompt=prompt,
+        concurrency=settings.ANALYSIS_CHUNK_WORKERS,
+        on_partial=on_partial
+    )
+    merged = merge_results(results)
+    logger.info(f"🧩 Документ проанализирован частями: {len(chunks)} за {time.monotonic() - started:.1f} сек")
+    return merged
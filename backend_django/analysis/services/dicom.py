@@ -0,0 +1,221 @@
+import logging
+from collections.abc import Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PIXEL_DATA_TAG = 0x7FE00010
+
+MODALITIES = {
+    'CT': 'Компьютерная томография',
+    'MR': 'Магнитно-резонансная томография',
+    'CR': 'Рентгенография',
+    'DX': 'Цифровая рентгенография',
+    'US': 'Ультразвуковое исследование',
+    'MG': 'Маммография',
+    'PT': 'Позитронно-эмиссионная томография',
+    'NM': 'Радионуклидное исследование',
+    'XA': 'Ангиография',
+    'ECG': 'Электрокардиография',
+    'SR': 'Структурированный отчёт',
+    'DOC': 'Документ',
+}
+
+# Поля заголовка, которые попадают в текст для анализа; имя пациента и идентификаторы — нет
+HEADER_FIELDS = (
+    ('StudyDescription', 'Исследование'),
+    ('SeriesDescription', 'Серия'),
+    ('RequestedProcedureDescription', 'Назначенная процедура'),
+    ('ProtocolName', 'Протокол'),
+    ('BodyPartExamined', 'Область исследования'),
+    ('StudyDate', 'Дата исследования'),
+    ('PatientSex', 'Пол'),
+    ('PatientAge', 'Возраст'),
+    ('ReasonForStudy', 'Причина исследования'),
+    ('AdditionalPatientHistory', 'Анамнез'),
+    ('ImageComments', 'Комментарий'),
+    ('InstitutionName', 'Учреждение'),
+)
+
+# Типы элементов структурированного отчёта без текстового смысла
+SR_SKIPPED_VALUE_TYPES = {'PNAME', 'UIDREF', 'IMAGE', 'COMPOSITE', 'WAVEFORM', 'SCOORD', 'SCOORD3D', 'TCOORD'}
+SR_DATE_KEYWORDS = {'DATE': 'Date', 'TIME': 'Time', 'DATETIME': 'DateTime'}
+DATE_KEYWORDS = {'StudyDate', 'Date'}
+
+
+class NoPixelData(ValueError):
+    """В файле нет изображения: структурированный отчёт, документ и т.п."""
+
+
+def read_header(path):
+    """Заголовок DICOM без пиксельных данных: файл читается только до (7FE0,0010)."""
+    import pydicom
+    return pydicom.dcmread(path, stop_before_pixels=True)
+
+
+def _value(ds, keyword):
+    value = ds.get(keyword)
+    if value is None or value == '':
+        return ''
+    if isinstance(value, Sequence) and not isinstance(value, (str, bytes)):
+        return ', '.join(str(item) for item in value)
+    value = str(value).strip()
+    if keyword in DATE_KEYWORDS and len(value) == 8 and value.isdigit():
+        # ГГГГММДД -> ДД.ММ.ГГГГ
+        return f"{value[6:]}.{value[4:6]}.{value[:4]}"
+    return value
+
+
+def _code_meaning(ds, keyword):
+    sequence = ds.get(keyword)
+    return str(sequence[0].get('CodeMeaning', '')).strip() if sequence else ''
+
+
+def _content_item(item):
+    """Значение элемента структурированного отчёта в виде текста ('' — пропустить)."""
+    value_type = item.get('ValueType', '')
+    if value_type in SR_SKIPPED_VALUE_TYPES:
+        return ''
+    if value_type == 'TEXT':
+        return _value(item, 'TextValue')
+    if value_type == 'CODE':
+        return _code_meaning(item, 'ConceptCodeSequence')
+    if value_type == 'NUM':
+        measured = item.get('MeasuredValueSequence')
+        if not measured:
+            return ''
+        units = measured[0].get('MeasurementUnitsCodeSequence')
+        unit = str(units[0].get('CodeValue', '')) if units else ''
+        return f"{measured[0].get('NumericValue', '')} {unit}".strip()
+    if value_type in SR_DATE_KEYWORDS:
+        return _value(item, SR_DATE_KEYWORDS[value_type])
+    return ''
+
+
+def content_lines(sequence, depth=0):
+    """Строки дерева структурированного отчёта (ContentSequence): «Название: значение» с отступом."""
+    lines = []
+    for item in sequence or []:
+        name = _code_meaning(item, 'ConceptNameCodeSequence')
+        value = _content_item(item)
+        indent = '  ' * depth
+        if item.get('ValueType') == 'CONTAINER':
+            if name:
+                lines.append(f"{indent}{name}:")
+        elif value:
+            lines.append(f"{indent}{name}: {value}" if name else f"{indent}{value}")
+        lines.extend(content_lines(item.get('ContentSequence'), depth + 1))
+    return lines
+
+
+def header_text(ds):
+    """Текст для анализа: модальность, описание исследования и серии, содержимое отчёта."""
+    modality = _value(ds, 'Modality')
+    lines = [f"Модальность: {MODALITIES.get(modality, modality)} ({modality})"] if modality else []
+    for keyword, label in HEADER_FIELDS:
+        value = _value(ds, keyword)
+        if value:
+            lines.append(f"{label}: {value}")
+    title = _code_meaning(ds, 'ConceptNameCodeSequence')
+    report = content_lines(ds.get('ContentSequence'))
+    if report:
+        lines.append('')
+        lines.append(title or 'Отчёт')
+        lines.extend(report)
+    return '\n'.join(lines)
+
+
+def series_uids(ds):
+    """Идентификаторы для группировки файлов одного исследования и серии."""
+    number = ds.get('InstanceNumber')
+    return {
+        'study_uid': _value(ds, 'StudyInstanceUID'),
+        'series_uid': _value(ds, 'SeriesInstanceUID'),
+        'sop_uid': _value(ds, 'SOPInstanceUID'),
+        'instance_number': int(number) if number not in (None, '') else None,
+        'modality': _value(ds, 'Modality'),
+    }
+
+
+def extract(path):
+    """Текст и идентификаторы DICOM-файла по заголовку; пиксельные данные не читаются."""
+    ds = read_header(path)
+    return header_text(ds), {'dicom': series_uids(ds)}
+
+
+def pixel_data(path):
+    """
+    Пиксели для превью. Несжатые данные отображаются в память (np.memmap): с диска
+    читаются только страницы кадров, к которым обращаются. Сжатые и deflate-синтаксисы
+    передачи декодируются pydicom целиком. Форма — (кадры, строки, столбцы[, каналы]).
+    """
+    import pydicom
+
+    # Значения больше defer_size не читаются: у элемента пикселей остаётся только смещение в файле
+    ds = pydicom.dcmread(path, defer_size=1024)
+    syntax = ds.file_meta.TransferSyntaxUID
+    # keep_deferred (pydicom 3): элемент возвращается со смещением, без чтения значения из файла
+    element = ds.get_item(PIXEL_DATA_TAG, keep_deferred=True)
+    if element is None:
+        raise NoPixelData('В файле нет пиксельных данных')
+    bits = int(ds.get('BitsAllocated', 0))
+
+    value_tell = getattr(element, 'value_tell', None)
+    # У deflate-файла is_compressed ложно, но value_tell — смещение в распакованном потоке, а не в файле
+    if syntax.is_compressed or syntax.is_deflated or bits not in (8, 16, 32) or value_tell is None:
+        frames = ds.pixel_array
+        return frames if int(ds.get('NumberOfFrames') or 1) > 1 else frames[np.newaxis]
+
+    byte_order = '<' if syntax.is_little_endian else '>'
+    kind = 'i' if int(ds.get('PixelRepresentation', 0)) else 'u'
+    frames = int(ds.get('NumberOfFrames') or 1)
+    samples = int(ds.get('SamplesPerPixel', 1))
+    rows, columns = int(ds.Rows), int(ds.Columns)
+    planar = samples > 1 and int(ds.get('PlanarConfiguration', 0))
+    if samples == 1:
+        shape = (frames, rows, columns)
+    elif planar:
+        shape = (frames, samples, rows, columns)
+    else:
+        shape = (frames, rows, columns, samples)
+    array = np.memmap(path, dtype=np.dtype(f'{byte_order}{kind}{bits // 8}'), mode='r', offset=value_tell, shape=shape)
+    # Каналы по плоскостям переставляются видом на те же данные, без копирования
+    return np.moveaxis(array, 1, -1) if planar else array
+
+
+def _first(value):
+    # Окно может быть задано несколькими значениями (MultiValue): берётся первое, заданное по умолчанию
+    if isinstance(value, Sequence) and not isinstance(value, (str, bytes)):
+        value = value[0] if len(value) else None
+    return float(value) if value not in (None, '') else None
+
+
+def display_frame(path, max_side=None):
+    """
+    Средний кадр в 8 бит для превью. Из отображённого в память массива читается только
+    этот кадр (с шагом, если он намного больше max_side). Монохромные снимки проходят
+    модальное преобразование (RescaleSlope/Intercept) и окно из заголовка, а без окна —
+    по 0.5–99.5 перцентилям; MONOCHROME1 инвертируется.
+    """
+    ds = read_header(path)
+    frames = pixel_data(path)
+    frame = frames[len(frames) // 2]
+    if max_side:
+        step = max(1, max(frame.shape[:2]) // (2 * max_side))
+        frame = frame[::step, ::step]
+
+    if frame.ndim == 3:
+        # Цветные снимки (УЗИ, фото) уже в отображаемом диапазоне
+        return np.clip(frame, 0, 255).astype(np.uint8)
+
+    frame = frame.astype(np.float32) * float(ds.get('RescaleSlope') or 1) + float(ds.get('RescaleIntercept') or 0)
+    center, width = _first(ds.get('WindowCenter')), _first(ds.get('WindowWidth'))
+    if center is not None and width:
+        low, high = center - width / 2, center + width / 2
+    else:
+        low, high = np.percentile(frame, (0.5, 99.5))
+    scaled = np.clip((frame - low) / max(high - low, 1e-6), 0, 1)
+    if ds.get('PhotometricInterpretation') == 'MONOCHROME1':
+        scaled = 1 - scaled
+    return (scaled * 255).astype(np.uint8)
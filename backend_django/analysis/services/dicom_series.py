@@ -0,0 +1,115 @@
+import logging
+
+from django.db import transaction
+
+from analysis.models import AnalysisResult, AnalysisSession, DicomInstance, DicomSeries
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('pending', 'in_progress')
+
+# Роли файла в серии при анализе
+LEAD = 'lead'
+REUSE = 'reuse'
+WAIT = 'wait'
+
+
+def index_instance(medical_file, uids):
+    """Запоминает UID исследования, серии и снимка файла; первый файл серии становится её представителем."""
+    series, _ = DicomSeries.objects.get_or_create(
+        user_id=medical_file.user_id,
+        series_uid=uids['series_uid'],
+        defaults={
+            'study_uid': uids['study_uid'],
+            'modality': uids.get('modality') or '',
+            'leader': medical_file,
+        },
+    )
+    DicomInstance.objects.update_or_create(
+        file=medical_file,
+        defaults={
+            'series': series,
+            'sop_uid': uids['sop_uid'],
+            'instance_number': uids.get('instance_number'),
+        },
+    )
+    return series
+
+
+def _leader_result(series):
+    return AnalysisResult.objects.filter(
+        session__file_id=series.leader_id, session__status='completed'
+    ).order_by('-created_at').first()
+
+
+def claim(series, medical_file):
+    """
+    Роль файла в анализе серии под блокировкой строки серии:
+    LEAD — файл анализируется сам (представитель, или прежний представитель без результата
+    и без активной сессии); REUSE — у представителя уже есть результат (возвращается вторым);
+    WAIT — представитель ещё анализируется. Вызывать внутри transaction.atomic().
+    """
+    series = DicomSeries.objects.select_for_update().get(pk=series.pk)
+    if series.leader_id in (None, medical_file.pk):
+        if series.leader_id is None:
+            series.leader = medical_file
+            series.save(update_fields=['leader'])
+        return LEAD, None
+
+    result = _leader_result(series)
+    if result is not None:
+        return REUSE, result
+    if AnalysisSession.objects.filter(file_id=series.leader_id, status__in=ACTIVE_STATUSES).exists():
+        return WAIT, None
+
+    logger.info(f"🩻 Представитель серии {series.series_uid} не проанализирован, серию анализирует {medical_file.id}")
+    series.leader = medical_file
+    series.save(update_fields=['leader'])
+    return LEAD, None
+
+
+def waiting_sessions(series, leader_file):
+    """
+    Ожидающие сессии остальных снимков серии. Блокировка строки серии гарантирует,
+    что снимок, начавший ждать до сохранения результата представителя, сюда попадёт.
+    """
+    with transaction.atomic():
+        DicomSeries.objects.select_for_update().filter(pk=series.pk).first()
+        return list(
+            AnalysisSession.objects.select_related('file')
+            .filter(file__dicom_instance__series=series, status='pending')
+            .exclude(file=leader_file)
+        )
+
+
+def hand_over(series, medical_file):
+    """
+    Представитель не смог проанализировать серию: анализ передаётся самому раннему
+    ожидающему снимку, его сессия снова ставится в очередь. Возвращает эту сессию или None.
+    """
+    from analysis.tasks import analyze_file_task
+
+    with transaction.atomic():
+        series = DicomSeries.objects.select_for_update().get(pk=series.pk)
+        if series.leader_id != medical_file.pk:
+            return None
+        follower = (
+            AnalysisSession.objects.filter(file__dicom_instance__series=series, status='pending')
+            .exclude(file=medical_file)
+            .order_by('start_time')
+            .first()
+        )
+        series.leader_id = follower.file_id if follower else None
+        series.save(update_fields=['leader'])
+        if follower is not None:
+            session_id = str(follower.id)
+            transaction.on_commit(lambda: analyze_file_task.delay(session_id))
+    return follower
+
+
+def hand_over_file(medical_file):
+    """hand_over для файла, серия которого неизвестна вызывающему: ищется по его снимку."""
+    instance = DicomInstance.objects.filter(file=medical_file).select_related('series').first()
+    if instance is None:
+        return None
+    return hand_over(instance.series, medical_file)
@@ -0,0 +1,345 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+import logging
+import threading
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from . import latency, prompt_registry, response_parser
+from .partial_results import PartialJSONParser
+from .resilience import RETRYABLE_STATUSES, GigaChatGuard, GigaChatUnavailable
+
+logger = logging.getLogger(__name__)
+
+TOKEN_CACHE_KEY = 'gigachat:access_token'
+TOKEN_LOCK_KEY = 'gigachat:access_token:lock'
+TOKEN_LIFETIME = 25 * 60
+# Токен обновляется заранее, чтобы запрос не ушёл с истекающим токеном
+TOKEN_REFRESH_MARGIN = 120
+TOKEN_LOCK_TIMEOUT = 30
+TOKEN_WAIT_INTERVAL = 0.2
+
+# Строка потока GigaChat: «data: {...}», последняя — «data: [DONE]»
+STREAM_DATA_PREFIX = 'data:'
+STREAM_DONE = '[DONE]'
+
+_loop = None
+_loop_pid = None
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+
+
+def get_loop():
+    """Общий для процесса цикл событий в фоновом потоке (пересоздаётся после fork)."""
+    global _loop, _loop_pid
+    pid = os.getpid()
+    if _loop is None or _loop_pid != pid:
+        with _lock:
+            if _loop is None or _loop_pid != pid:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='gigachat-loop', daemon=True).start()
+                _loop, _loop_pid = loop, pid
+    return _loop
+
+
+def run_sync(coro):
+    """Выполняет корутину в общем цикле событий и ждёт результат из синхронного кода."""
+    loop = get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError('run_sync нельзя вызывать из цикла событий GigaChat: используйте await')
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def resolve_prompt(file_type, file_name=None):
+    return prompt_registry.get_prompt(prompt_registry.file_type_for(file_type, file_name))
+
+
+def get_async_client():
+    """Общий для процесса асинхронный клиент GigaChat с одним пулом соединений."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                _client = AsyncGigaChatClient()
+                _client_pid = pid
+    return _client
+
+
+class AsyncGigaChatClient:
+    """
+    Асинхронный клиент GigaChat: один пул соединений и один цикл событий на процесс,
+    поэтому сотни одновременных запросов не требуют сотни потоков.
+    """
+
+    def __init__(self, transport=None):
+        self.auth_url = settings.GIGACHAT_AUTH_URL
+        self.api_url = settings.GIGACHAT_API_URL
+        self.authorization_key = settings.GIGACHAT_AUTHORIZATION_KEY
+        self.model = settings.GIGACHAT_MODEL
+        self.access_token = None
+        self.token_expiry = None
+        self._token_lock = asyncio.Lock()
+        self.http = self._build_http_client(transport)
+        self.guard = GigaChatGuard()
+
+    @staticmethod
+    def _build_http_client(transport=None):
+        pool_size = settings.GIGACHAT_POOL_SIZE
+        return httpx.AsyncClient(
+            verify=False,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(30, connect=5),
+            transport=transport,
+        )
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    async def _get_access_token(self):
+        logger.info("🔄 Запрашиваем новый токен GigaChat...")
+        if not self.authorization_key:
+            raise ValueError("GIGACHAT_AUTHORIZATION_KEY не установлен")
+
+        headers = {
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Accept': 'application/json',
+            'RqUID': str(uuid.uuid4()),
+            'Authorization': f'Basic {self.authorization_key}'
+        }
+
+        try:
+            try:
+                with latency.timed('gigachat_token'):
+                    response = await self.http.post(
+                        self.auth_url,
+                        headers=headers,
+                        data={'scope': 'GIGACHAT_API_PERS'},
+                        timeout=30
+                    )
+            except httpx.TransportError as e:
+                raise await self.guard.fail(f'авторизация, {type(e).__name__}')
+
+            if response.status_code in RETRYABLE_STATUSES:
+                raise await self.guard.fail(f'авторизация, HTTP {response.status_code}')
+            if response.status_code != 200:
+                # Неверный ключ не исправится повтором и не говорит о перегрузке GigaChat
+                raise Exception(f"GigaChat auth error: {response.status_code}")
+
+            data = response.json()
+            # expires_at приходит в миллисекундах; если его нет — считаем 25 минут
+            expires_at = data.get('expires_at')
+            expires_at = expires_at / 1000 if expires_at else time.time() + TOKEN_LIFETIME
+            self._remember_token(data.get('access_token'), expires_at)
+            await asyncio.to_thread(
+                cache.set,
+                TOKEN_CACHE_KEY,
+                {'access_token': self.access_token, 'expires_at': expires_at},
+                max(int(expires_at - time.time()), 1)
+            )
+            logger.info(f"✅ Токен получен")
+            return self.access_token
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения токена: {e}", exc_info=True)
+            raise
+
+    def _remember_token(self, token, expires_at):
+        self.access_token = token
+        self.token_expiry = expires_at
+
+    def _token_is_fresh(self, expires_at, margin=TOKEN_REFRESH_MARGIN):
+        return bool(expires_at) and expires_at - margin > time.time()
+
+    async def _load_cached_token(self, margin=TOKEN_REFRESH_MARGIN):
+        cached = await asyncio.to_thread(cache.get, TOKEN_CACHE_KEY)
+        if cached and self._token_is_fresh(cached.get('expires_at'), margin):
+            self._remember_token(cached['access_token'], cached['expires_at'])
+            return self.access_token
+        return None
+
+    async def ensure_valid_token(self):
+        """
+        Возвращает действующий токен. Токен хранится в общем кеше Django,
+        обновляет его только один вызывающий: внутри процесса — под asyncio-локом,
+        между процессами — под атомарным cache.add. Пока токен процесса свеж, кеш
+        не опрашивается; обращения к нему идут в отдельном потоке, не занимая цикл событий.
+        """
+        if self.access_token and self._token_is_fresh(self.token_expiry):
+            return self.access_token
+
+        async with self._token_lock:
+            if self.access_token and self._token_is_fresh(self.token_expiry):
+                return self.access_token
+            token = await self._load_cached_token()
+            if token:
+                return token
+
+            if await asyncio.to_thread(cache.add, TOKEN_LOCK_KEY, os.getpid(), TOKEN_LOCK_TIMEOUT):
+                try:
+                    return await self._get_access_token()
+                finally:
+                    await asyncio.to_thread(cache.delete, TOKEN_LOCK_KEY)
+
+            # Токен обновляет другой процесс: пока старый ещё жив — пользуемся им
+            token = await self._load_cached_token(margin=0)
+            if token:
+                return token
+
+            deadline = time.time() + TOKEN_LOCK_TIMEOUT
+            while time.time() < deadline:
+                await asyncio.sleep(TOKEN_WAIT_INTERVAL)
+                token = await self._load_cached_token(margin=0)
+                if token:
+                    return token
+            return await self._get_access_token()
+
+    async def analyze_medical_data(self, text_data, file_type="text", file_name=None, timeout=30, prompt=None,
+                                   on_partial=None):
+        """
+        Анализ текста. Если передан on_partial, ответ запрашивается потоком и
+        on_partial(partial) вызывается в цикле событий при каждом изменении уже
+        разобранной части ({'summary', 'detected_conditions'}); итоговый
+        результат разбирается так же, как ответ без потока.
+        """
+        logger.info(f"🔍 Начинаем анализ через GigaChat, таймаут: {timeout} сек")
+        try:
+            token = await self.ensure_valid_token()
+            if not token:
+                raise await self.guard.fail('авторизация, ответ без токена')
+
+            if prompt is None:
+                # Реестр может обратиться к БД, а ORM из цикла событий вызывать нельзя
+                prompt = await sync_to_async(resolve_prompt)(file_type, file_name)
+            prompt_text = prompt.render(text_data, file_type, file_name)
+
+            headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {token}'}
+            payload = {
+                "model": self.model,
+                "messages": [{"role": "user", "content": prompt_text}],
+                "temperature": 0.1,
+                "max_tokens": 1000
+            }
+
+            stream = on_partial is not None and settings.GIGACHAT_STREAMING
+            if stream:
+                payload["stream"] = True
+            request = self.http.build_request(
+                "POST",
+                f"{self.api_url}/chat/completions",
+                headers=headers,
+                json=payload,
+                timeout=httpx.Timeout(timeout, connect=5)
+            )
+
+            start_time = time.time()
+
+            read = None
+            if stream:
+                # Поток читается под слотом предела guard: слот занят, пока GigaChat генерирует ответ
+                read = lambda response: asyncio.wait_for(self._read_stream(response, on_partial), timeout)
+            send = lambda: self.http.send(request, stream=stream)
+            response, content = await self.guard.call(send, read=read)
+            if response.status_code == 401:
+                # Токен отозван раньше срока — сбрасываем его у всех воркеров и повторяем с новым
+                await response.aclose()
+                self._remember_token(None, None)
+                await asyncio.to_thread(cache.delete, TOKEN_CACHE_KEY)
+                request.headers['Authorization'] = f'Bearer {await self.ensure_valid_token()}'
+                response, content = await self.guard.call(send, read=read)
+            try:
+                if response.status_code == 401:
+                    # Новый токен тоже отклонён: ответа нет, сессия вернётся в очередь
+                    raise await self.guard.fail('HTTP 401 после обновления токена')
+
+                if response.status_code != 200:
+                    # 400, 413, 422 и т.п. повторятся с тем же документом: это неудачный анализ,
+                    # а не недоступность GigaChat — без очереди и без размыкателя
+                    logger.error(f"❌ GigaChat отклонил запрос: HTTP {response.status_code}")
+                    return self._get_fallback_response(f"Ошибка API: {response.status_code}")
+
+                if not stream:
+                    result = response.json()
+                    content = result.get('choices', [{}])[0].get('message', {}).get('content', '{}')
+            finally:
+                await response.aclose()
+
+            elapsed_time = time.time() - start_time
+            logger.info(f"📥 GigaChat ответил за {elapsed_time:.1f} секунд")
+            logger.info(f"📄 Сырой ответ GigaChat: {content[:200]}...")
+            analysis_result = response_parser.parse_response(content)
+            logger.info(f"✅ Анализ готов. Состояний: {len(analysis_result['detected_conditions'])}")
+            return analysis_result
+
+        except GigaChatUnavailable:
+            # Перегрузку нельзя выдавать за результат: сессия вернётся в очередь
+            raise
+        except Exception as e:
+            logger.error(f"❌ Ошибка: {e}")
+            return self._get_fallback_response(str(e))
+
+    async def _read_stream(self, response, on_partial):
+        """Собирает ответ из SSE-потока GigaChat, передавая разобранную часть в on_partial."""
+        parser = PartialJSONParser()
+        async for line in response.aiter_lines():
+            if not line.startswith(STREAM_DATA_PREFIX):
+                continue
+            data = line[len(STREAM_DATA_PREFIX):].strip()
+            if data == STREAM_DONE:
+                break
+            try:
+                delta = json.loads(data)['choices'][0].get('delta', {}).get('content') or ''
+            except (ValueError, KeyError, IndexError, TypeError):
+                logger.warning(f"⚠️ Непонятная строка потока GigaChat: {data[:100]}")
+                continue
+            if delta and not parser.buffer:
+                logger.info("📡 GigaChat начал отвечать")
+            if parser.feed(delta):
+                on_partial(parser.snapshot())
+        return parser.buffer or '{}'
+
+    async def analyze_many(self, texts, file_type="text", file_name=None, timeout=30, prompt=None, concurrency=None,
+                           on_partial=None):
+        """
+        Анализирует несколько текстов одновременно (не больше concurrency сразу).
+        Результаты возвращаются в порядке текстов; если GigaChat недоступен,
+        бросается GigaChatUnavailable после завершения остальных запросов.
+        on_partial(partial, part=индекс текста) получает частичные результаты.
+        """
+        semaphore = asyncio.Semaphore(concurrency or len(texts) or 1)
+
+        async def analyze(index, text):
+            part_callback = None
+            if on_partial is not None:
+                part_callback = lambda partial: on_partial(partial, part=index)
+            async with semaphore:
+                return await self.analyze_medical_data(
+                    text, file_type, file_name, timeout=timeout, prompt=prompt, on_partial=part_callback
+                )
+
+        results = await asyncio.gather(*(analyze(i, text) for i, text in enumerate(texts)), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+    def _get_fallback_response(self, reason):
+        return response_parser.normalize_result({
+            "summary": f"Анализ не выполнен: {reason}",
+            "detected_conditions": [],
+            "recommendations": "Попробуйте загрузить файл снова",
+            "confidence": 0.0,
+            "error": reason
+        })
@@ -0,0 +1,208 @@
+import logging
+from datetime import datetime, time
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from analysis.models import AnalysisResult, LabMeasurement
+from . import charts, lab_rules
+
+logger = logging.getLogger(__name__)
+
+UPSERT_FIELDS = ['user', 'value', 'unit', 'reference_low', 'reference_high', 'flag', 'measured_at']
+OUT_OF_RANGE_FLAGS = ('low', 'high')
+SECONDS_PER_DAY = 24 * 60 * 60
+DAYS_PER_YEAR = 365.25
+
+
+def _measured_at(lab_date, fallback):
+    """Дата из шапки бланка (полночь по локальному времени), иначе время анализа."""
+    day = parse_date(lab_date) if lab_date else None
+    if day is None:
+        return fallback
+    return timezone.make_aware(datetime.combine(day, time()))
+
+
+def build_measurements(user_id, session_id, lab_values, measured_at):
+    """Строки LabMeasurement из lab_values результата; повтор показателя в одном анализе отбрасывается."""
+    measurements = {}
+    for item in lab_values or []:
+        if item.get('value') is None or item.get('analyte') in measurements:
+            continue
+        measurements[item['analyte']] = LabMeasurement(
+            user_id=user_id,
+            session_id=session_id,
+            analyte=item['analyte'],
+            value=item['value'],
+            unit=item.get('unit') or '',
+            reference_low=item.get('reference_low'),
+            reference_high=item.get('reference_high'),
+            flag=item.get('flag') or 'normal',
+            measured_at=measured_at,
+        )
+    return list(measurements.values())
+
+
+def upsert_measurements(measurements):
+    """Один INSERT ... ON CONFLICT (session, analyte) DO UPDATE: повторная запись анализа не дублирует ряд."""
+    if not measurements:
+        return 0
+    LabMeasurement.objects.bulk_create(
+        measurements,
+        update_conflicts=True,
+        unique_fields=['session', 'analyte'],
+        update_fields=UPSERT_FIELDS,
+    )
+    # bulk_create не шлёт сигналов: графики пользователей сбрасываются здесь
+    for user_id in {measurement.user_id for measurement in measurements}:
+        transaction.on_commit(lambda user_id=user_id: charts.invalidate(user_id))
+    return len(measurements)
+
+
+def record_measurements(session, user_id, analysis_result):
+    """Сохраняет показатели результата анализа (lab_values) в ряды пациента."""
+    measured_at = _measured_at(analysis_result.get('lab_date'), session.start_time)
+    return upsert_measurements(
+        build_measurements(user_id, session.pk, analysis_result.get('lab_values'), measured_at)
+    )
+
+
+def backfill_measurements(batch_size=500, user_ids=None, reparse=False):
+    """
+    Заполняет LabMeasurement по сохранённым результатам пачками по batch_size.
+    Показатели берутся из lab_values результата, а для старых результатов без них
+    (или при reparse) — разбором сохранённого текста файла. Возвращает число строк.
+    """
+    results = AnalysisResult.objects.select_related(
+        'session__file__user', 'session__file__extracted_text'
+    ).order_by('created_at')
+    if user_ids:
+        results = results.filter(session__file__user_id__in=user_ids)
+
+    saved, batch = 0, []
+    for result in results.iterator(chunk_size=batch_size):
+        session = result.session
+        user = session.file.user
+        data = result.result_json or {}
+        lab_values, lab_date = data.get('lab_values'), data.get('lab_date')
+        if lab_values is None or reparse:
+            extracted = getattr(session.file, 'extracted_text', None)
+            if extracted is None or not extracted.text:
+                continue
+            lab_values = lab_rules.extract_lab_values(extracted.text, sex=user.sex, age=user.age)
+            lab_date = lab_rules.document_date(extracted.text)
+        batch.extend(build_measurements(
+            user.pk, session.pk, lab_values, _measured_at(lab_date, session.start_time)
+        ))
+        if len(batch) >= batch_size:
+            saved += upsert_measurements(batch)
+            batch = []
+    saved += upsert_measurements(batch)
+    logger.info(f"🧪 Показателей в рядах пациентов сохранено: {saved}")
+    return saved
+
+
+def _streaks(out, starts):
+    """
+    Длина серии подряд идущих значений вне нормы, заканчивающейся в каждой точке.
+    Серия обрывается значением в норме и началом ряда другого показателя.
+    """
+    index = np.arange(len(out))
+    group_start = np.zeros(len(out), dtype=bool)
+    group_start[starts] = True
+    breaks = np.where(~out, index, np.where(group_start, index - 1, -1))
+    return index - np.maximum.accumulate(breaks)
+
+
+def compute_trends(analytes, timestamps, values, flags):
+    """
+    Динамика рядов, отсортированных по показателю и времени, без циклов по точкам:
+    границы рядов находятся по смене кода, суммы для наклона МНК и серии отклонений
+    считаются np.add/maximum.reduceat по всем рядам сразу. first_index и last_index —
+    позиции первой и последней точки ряда во входных массивах.
+    """
+    if not len(values):
+        return {}
+    analytes = np.asarray(analytes)
+    values = np.asarray(values, dtype=float)
+    days = (np.asarray(timestamps, dtype=float) - float(np.min(timestamps))) / SECONDS_PER_DAY
+    out = np.isin(np.asarray(flags), OUT_OF_RANGE_FLAGS)
+
+    starts = np.concatenate(([0], np.flatnonzero(analytes[1:] != analytes[:-1]) + 1))
+    ends = np.concatenate((starts[1:], [len(values)])) - 1
+    counts = ends - starts + 1
+
+    # Наклон МНК по суммам: (nΣtv − ΣtΣv) / (nΣt² − (Σt)²), в единицах показателя за год
+    sum_t = np.add.reduceat(days, starts)
+    sum_v = np.add.reduceat(values, starts)
+    sum_tv = np.add.reduceat(days * values, starts)
+    sum_tt = np.add.reduceat(days * days, starts)
+    denominator = counts * sum_tt - sum_t ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = np.where(denominator > 1e-9, (counts * sum_tv - sum_t * sum_v) / denominator * DAYS_PER_YEAR, np.nan)
+        first, last = values[starts], values[ends]
+        delta_pct = np.where(first != 0, (last - first) / np.abs(first) * 100, np.nan)
+
+    minimums = np.minimum.reduceat(values, starts)
+    maximums = np.maximum.reduceat(values, starts)
+    previous = values[np.maximum(ends - 1, starts)]
+    streaks = _streaks(out, starts)
+    longest = np.maximum.reduceat(streaks, starts)
+
+    def number(value, digits=3):
+        return None if np.isnan(value) else round(float(value), digits)
+
+    trends = {}
+    for i, start in enumerate(starts):
+        end = ends[i]
+        trends[str(analytes[start])] = {
+            'count': int(counts[i]),
+            'first': number(first[i]),
+            'last': number(last[i]),
+            'min': number(minimums[i]),
+            'max': number(maximums[i]),
+            'mean': number(sum_v[i] / counts[i]),
+            'delta': number(last[i] - first[i]),
+            'delta_pct': number(delta_pct[i], 1),
+            'last_change': number(last[i] - previous[i]) if counts[i] > 1 else None,
+            'slope_per_year': number(slopes[i]),
+            'out_of_range_streak': int(streaks[end]),
+            'longest_out_of_range_streak': int(longest[i]),
+            'first_index': int(start),
+            'last_index': int(end),
+        }
+    return trends
+
+
+def get_trends(user, analytes=None, since=None, until=None):
+    """Динамика показателей пациента: ряды читаются одним запросом по индексу (user, analyte, measured_at)."""
+    measurements = LabMeasurement.objects.filter(user=user)
+    if analytes:
+        measurements = measurements.filter(analyte__in=analytes)
+    if since:
+        measurements = measurements.filter(measured_at__gte=since)
+    if until:
+        measurements = measurements.filter(measured_at__lte=until)
+    rows = list(measurements.order_by('analyte', 'measured_at').values_list(
+        'analyte', 'measured_at', 'value', 'flag', 'unit', 'reference_low', 'reference_high'
+    ))
+    if not rows:
+        return {}
+
+    codes, moments, values, flags, units, lows, highs = zip(*rows)
+    trends = compute_trends(codes, [moment.timestamp() for moment in moments], values, flags)
+    for code, trend in trends.items():
+        first, last = trend.pop('first_index'), trend.pop('last_index')
+        analyte = lab_rules.ANALYTES.get(code)
+        trend.update({
+            'name': analyte['name'] if analyte else code,
+            'unit': units[last],
+            'first_date': moments[first],
+            'last_date': moments[last],
+            'last_flag': flags[last],
+            'reference_low': lows[last],
+            'reference_high': highs[last],
+        })
+    return trends
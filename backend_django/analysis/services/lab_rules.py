@@ -0,0 +1,437 @@
+import re
+import logging
+
+from datetime import date
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Версия правил: меняется вместе с таблицей референсов и попадает в prompt_version результата
+RULES_VERSION = 'lab-rules-1'
+MODEL_NAME = 'lab-rules'
+# Уверенность вывода правил: значение явно вне нормы, без пограничных показателей
+RULE_CONFIDENCE = 0.9
+
+SEX_ANY, SEX_MALE, SEX_FEMALE = 0, 1, 2
+SEX_CODES = {'male': SEX_MALE, 'female': SEX_FEMALE}
+DOCUMENT_SEX_RE = re.compile(r'\bпол\s*[:|]?\s*(м|ж|муж|жен)', re.IGNORECASE)
+# Дата взятия материала в шапке бланка: «Дата взятия: 01.02.2026», «Дата забора | 01.02.26»
+DOCUMENT_DATE_RE = re.compile(
+    r'\bдата(?:\s+(?:взятия|забора|сдачи|исследования|анализа))?(?:\s+\w+)?\s*[:|]?\s*'
+    r'(\d{1,2})[./](\d{1,2})[./](\d{2,4})', re.IGNORECASE
+)
+NUMBER_RE = re.compile(r'^([<>≤≥]?)\s*(\d+(?:[.,]\d+)?)\s*(.*)$')
+RANGE_RE = re.compile(r'^\s*\d+(?:[.,]\d+)?\s*[-–—]\s*\d+(?:[.,]\d+)?\s*$|^\s*[<>≤≥]\s*\d')
+ABBREVIATION_RE = re.compile(r'\(([^)]+)\)')
+UNIT_CELL_RE = re.compile(r'[^\W\d_]|%')
+SUPERSCRIPTS = str.maketrans('⁰¹²³⁴⁵⁶⁷⁸⁹', '0123456789')
+UNIT_NOISE = str.maketrans('', '', ' ×*^xх')
+
+# Отклонение от границы нормы (в долях границы), с которого тяжесть выше
+SEVERITY_STEPS = ((0.1, 'low'), (0.3, 'medium'))
+SEVERITY_RANK = {'low': 0, 'medium': 1, 'high': 2}
+
+# Единицы измерения: нормализованная запись → множитель к единице таблицы референсов
+MMOL_L = {'ммоль/л': 1, 'mmol/l': 1}
+UMOL_L = {'мкмоль/л': 1, 'мкм/л': 1, 'umol/l': 1, 'µmol/l': 1}
+UNITS = {
+    'g/l': {'г/л': 1, 'g/l': 1, 'г/дл': 10, 'g/dl': 10},
+    '10^9/l': {'109/л': 1, '109/l': 1, 'тыс/мкл': 1, '103/мкл': 1, '103/ul': 1, '103/µl': 1},
+    '10^12/l': {'1012/л': 1, '1012/l': 1, 'млн/мкл': 1, '106/мкл': 1, '106/ul': 1, '106/µl': 1},
+    'mm/h': {'мм/ч': 1, 'мм/час': 1, 'mm/h': 1, 'mm/hr': 1},
+    '%': {'%': 1},
+    'mmol/l': MMOL_L,
+    'glucose': {**MMOL_L, 'мг/дл': 0.0555, 'mg/dl': 0.0555},
+    'cholesterol': {**MMOL_L, 'мг/дл': 0.02586, 'mg/dl': 0.02586},
+    'umol/l': UMOL_L,
+    'creatinine': {**UMOL_L, 'мг/дл': 88.4, 'mg/dl': 88.4},
+    'u/l': {'ед/л': 1, 'ме/л': 1, 'u/l': 1, 'iu/l': 1},
+    'ug/l': {'мкг/л': 1, 'нг/мл': 1, 'ug/l': 1, 'µg/l': 1, 'ng/ml': 1},
+    'miu/l': {'мед/л': 1, 'мме/л': 1, 'мкме/мл': 1, 'mu/l': 1, 'miu/l': 1, 'uiu/ml': 1, 'µiu/ml': 1},
+    'mg/l': {'мг/л': 1, 'mg/l': 1, 'мг/дл': 10, 'mg/dl': 10},
+}
+# Единица таблицы референсов в том виде, как она показывается пользователю
+UNIT_LABELS = {
+    'g/l': 'г/л', '10^9/l': '×10⁹/л', '10^12/l': '×10¹²/л', 'mm/h': 'мм/ч', '%': '%',
+    'mmol/l': 'ммоль/л', 'glucose': 'ммоль/л', 'cholesterol': 'ммоль/л', 'umol/l': 'мкмоль/л',
+    'creatinine': 'мкмоль/л', 'u/l': 'Ед/л', 'ug/l': 'мкг/л', 'miu/l': 'мЕд/л', 'mg/l': 'мг/л',
+}
+
+# Показатели: название, синонимы (в нижнем регистре), единицы и состояние при отклонении вниз/вверх
+ANALYTES = {
+    'HGB': {'name': 'Гемоглобин', 'aliases': ('гемоглобин', 'hgb', 'hb'), 'units': 'g/l',
+            'low': ('Анемия', 'D64.9'), 'high': ('Эритроцитоз', 'D75.1')},
+    'RBC': {'name': 'Эритроциты', 'aliases': ('эритроциты', 'rbc'), 'units': '10^12/l',
+            'low': ('Анемия', 'D64.9'), 'high': ('Эритроцитоз', 'D75.1')},
+    'HCT': {'name': 'Гематокрит', 'aliases': ('гематокрит', 'hct'), 'units': '%',
+            'low': ('Анемия', 'D64.9'), 'high': ('Эритроцитоз', 'D75.1')},
+    'WBC': {'name': 'Лейкоциты', 'aliases': ('лейкоциты', 'wbc'), 'units': '10^9/l',
+            'low': ('Лейкопения', 'D72.8'), 'high': ('Лейкоцитоз', 'D72.8')},
+    'PLT': {'name': 'Тромбоциты', 'aliases': ('тромбоциты', 'plt'), 'units': '10^9/l',
+            'low': ('Тромбоцитопения', 'D69.6'), 'high': ('Тромбоцитоз', 'D75.8')},
+    'ESR': {'name': 'СОЭ', 'aliases': ('соэ', 'скорость оседания эритроцитов', 'esr'), 'units': 'mm/h',
+            'low': None, 'high': ('Ускоренное СОЭ', 'R70.0')},
+    'GLU': {'name': 'Глюкоза', 'aliases': ('глюкоза', 'glu', 'glucose'), 'units': 'glucose',
+            'low': ('Гипогликемия', 'E16.2'), 'high': ('Гипергликемия', 'R73.9')},
+    'HBA1C': {'name': 'Гликированный гемоглобин', 'aliases': ('гликированный гемоглобин', 'hba1c'), 'units': '%',
+              'low': None, 'high': ('Гипергликемия', 'R73.9')},
+    'CHOL': {'name': 'Холестерин общий', 'aliases': ('холестерин общий', 'холестерин', 'chol'),
+             'units': 'cholesterol', 'low': None, 'high': ('Гиперхолестеринемия', 'E78.0')},
+    'CREA': {'name': 'Креатинин', 'aliases': ('креатинин', 'crea'), 'units': 'creatinine',
+             'low': None, 'high': ('Отклонение биохимических показателей крови', 'R79.8')},
+    'UREA': {'name': 'Мочевина', 'aliases': ('мочевина', 'urea'), 'units': 'mmol/l',
+             'low': None, 'high': ('Отклонение биохимических показателей крови', 'R79.8')},
+    'CRP': {'name': 'С-реактивный белок', 'aliases': ('с-реактивный белок', 'срб', 'crp'), 'units': 'mg/l',
+            'low': None, 'high': ('Отклонение биохимических показателей крови', 'R79.8')},
+    'ALT': {'name': 'АЛТ', 'aliases': ('алт', 'аланинаминотрансфераза', 'alt'), 'units': 'u/l',
+            'low': None, 'high': ('Повышение активности трансаминаз', 'R74.0')},
+    'AST': {'name': 'АСТ', 'aliases': ('аст', 'аспартатаминотрансфераза', 'ast'), 'units': 'u/l',
+            'low': None, 'high': ('Повышение активности трансаминаз', 'R74.0')},
+    'TBIL': {'name': 'Билирубин общий', 'aliases': ('билирубин общий', 'билирубин', 'tbil'), 'units': 'umol/l',
+             'low': None, 'high': ('Гипербилирубинемия', 'R17')},
+    'FER': {'name': 'Ферритин', 'aliases': ('ферритин', 'ferritin'), 'units': 'ug/l',
+            'low': ('Дефицит железа', 'E61.1'), 'high': None},
+    'TSH': {'name': 'ТТГ', 'aliases': ('ттг', 'тиреотропный гормон', 'tsh'), 'units': 'miu/l',
+            'low': ('Тиреотоксикоз', 'E05.9'), 'high': ('Гипотиреоз', 'E03.9')},
+    'K': {'name': 'Калий', 'aliases': ('калий', 'k+', 'k'), 'units': 'mmol/l',
+          'low': ('Гипокалиемия', 'E87.6'), 'high': ('Гиперкалиемия', 'E87.5')},
+    'NA': {'name': 'Натрий', 'aliases': ('натрий', 'na+', 'na'), 'units': 'mmol/l',
+           'low': ('Гипонатриемия', 'E87.1'), 'high': ('Гипернатриемия', 'E87.0')},
+}
+
+# Референсные интервалы взрослых: (показатель, пол, возраст от, возраст до, нижняя граница, верхняя граница)
+REFERENCE_RANGES = (
+    ('HGB', SEX_MALE, 18, 150, 130, 170),
+    ('HGB', SEX_FEMALE, 18, 150, 120, 150),
+    ('RBC', SEX_MALE, 18, 150, 4.3, 5.7),
+    ('RBC', SEX_FEMALE, 18, 150, 3.8, 5.1),
+    ('HCT', SEX_MALE, 18, 150, 40, 50),
+    ('HCT', SEX_FEMALE, 18, 150, 36, 46),
+    ('WBC', SEX_ANY, 18, 150, 4.0, 9.0),
+    ('PLT', SEX_ANY, 18, 150, 150, 400),
+    ('ESR', SEX_MALE, 18, 50, 2, 15),
+    ('ESR', SEX_MALE, 50, 150, 2, 20),
+    ('ESR', SEX_FEMALE, 18, 50, 2, 20),
+    ('ESR', SEX_FEMALE, 50, 150, 2, 30),
+    ('GLU', SEX_ANY, 18, 60, 3.9, 6.1),
+    ('GLU', SEX_ANY, 60, 150, 4.6, 6.4),
+    ('HBA1C', SEX_ANY, 18, 150, 4.0, 6.0),
+    ('CHOL', SEX_ANY, 18, 150, 0, 5.2),
+    ('CREA', SEX_MALE, 18, 150, 62, 106),
+    ('CREA', SEX_FEMALE, 18, 150, 44, 80),
+    ('UREA', SEX_ANY, 18, 60, 2.5, 8.3),
+    ('UREA', SEX_ANY, 60, 150, 2.9, 8.9),
+    ('CRP', SEX_ANY, 18, 150, 0, 5),
+    ('ALT', SEX_MALE, 18, 150, 0, 41),
+    ('ALT', SEX_FEMALE, 18, 150, 0, 33),
+    ('AST', SEX_MALE, 18, 150, 0, 40),
+    ('AST', SEX_FEMALE, 18, 150, 0, 32),
+    ('TBIL', SEX_ANY, 18, 150, 3.4, 20.5),
+    ('FER', SEX_MALE, 18, 150, 30, 400),
+    ('FER', SEX_FEMALE, 18, 150, 13, 150),
+    ('TSH', SEX_ANY, 18, 150, 0.4, 4.0),
+    ('K', SEX_ANY, 18, 150, 3.5, 5.1),
+    ('NA', SEX_ANY, 18, 150, 136, 145),
+)
+
+ANALYTE_CODES = list(ANALYTES)
+ANALYTE_INDEX = {code: index for index, code in enumerate(ANALYTE_CODES)}
+# Синонимы от длинных к коротким: «гликированный гемоглобин» раньше «гемоглобин»
+ALIASES = sorted(
+    ((alias, code) for code, analyte in ANALYTES.items() for alias in analyte['aliases']),
+    key=lambda item: len(item[0]), reverse=True
+)
+ALIAS_INDEX = dict(ALIASES)
+
+# Таблица референсов в виде столбцов для векторной проверки панели
+_RANGE_ANALYTE = np.array([ANALYTE_INDEX[row[0]] for row in REFERENCE_RANGES])
+_RANGE_SEX = np.array([row[1] for row in REFERENCE_RANGES])
+_RANGE_AGE_FROM = np.array([row[2] for row in REFERENCE_RANGES], dtype=float)
+_RANGE_AGE_TO = np.array([row[3] for row in REFERENCE_RANGES], dtype=float)
+_RANGE_LOW = np.array([row[4] for row in REFERENCE_RANGES], dtype=float)
+_RANGE_HIGH = np.array([row[5] for row in REFERENCE_RANGES], dtype=float)
+
+
+def _normalize_name(cell):
+    return ' '.join(cell.lower().replace('ё', 'е').split())
+
+
+def _normalize_unit(unit):
+    return unit.lower().translate(SUPERSCRIPTS).translate(UNIT_NOISE).replace('ё', 'е').strip('.,;')
+
+
+def match_analyte(cell):
+    """Код показателя по названию ячейки («Гемоглобин (HGB)», «HGB», «Глюкоза крови») или None."""
+    name = _normalize_name(cell)
+    if not name:
+        return None
+    if name in ALIAS_INDEX:
+        return ALIAS_INDEX[name]
+    for abbreviation in ABBREVIATION_RE.findall(name):
+        code = ALIAS_INDEX.get(abbreviation.strip())
+        if code:
+            return code
+    for alias, code in ALIASES:
+        # Короткие латинские синонимы (k, na, hb) — только целиком, иначе ложные совпадения
+        if len(alias) > 3 and name.startswith(alias):
+            return code
+    return None
+
+
+def _parse_number(text):
+    return float(text.replace(',', '.'))
+
+
+def parse_lab_rows(text):
+    """
+    Строки таблиц анализа (ячейки через « | », как их собирает извлечение из PDF)
+    в показатели: {'analyte', 'name', 'value', 'unit', 'raw_value', 'raw_unit', 'problem'}.
+    value приведено к единице таблицы референсов; problem — почему строку нельзя
+    проверить правилами (нет числа, неизвестная единица), иначе None.
+    """
+    measurements, seen = [], set()
+    for line in text.splitlines():
+        if '|' not in line:
+            continue
+        cells = [cell.strip() for cell in line.split('|')]
+        name_index = next((i for i, cell in enumerate(cells) if cell), None)
+        if name_index is None:
+            continue
+        code = match_analyte(cells[name_index])
+        if code is None:
+            continue
+
+        raw_value, raw_unit, qualifier = None, '', ''
+        rest = cells[name_index + 1:]
+        for i, cell in enumerate(rest):
+            if not cell or RANGE_RE.match(cell):
+                continue
+            match = NUMBER_RE.match(cell)
+            if match:
+                qualifier, raw_value, raw_unit = match.group(1), match.group(2), match.group(3).strip()
+                if not raw_unit:
+                    # Единица в соседней ячейке: первая с буквами или «%», кроме интервала нормы
+                    raw_unit = next(
+                        (c for c in rest[i + 1:] if UNIT_CELL_RE.search(c) and not RANGE_RE.match(c)), ''
+                    )
+                break
+
+        # Таблица, повторённая на нескольких страницах, — один и тот же показатель
+        if (code, raw_value, raw_unit) in seen:
+            continue
+        seen.add((code, raw_value, raw_unit))
+
+        analyte = ANALYTES[code]
+        measurement = {
+            'analyte': code, 'name': analyte['name'], 'value': None, 'unit': UNIT_LABELS[analyte['units']],
+            'raw_value': raw_value, 'raw_unit': raw_unit, 'problem': None,
+        }
+        # Стрелки и звёздочки лабораторий («↓», «*») к единице не относятся
+        unit_key = _normalize_unit(raw_unit.rstrip('↑↓*!HL '))
+        factor = UNITS[analyte['units']].get(unit_key, 1 if not unit_key else None)
+        if raw_value is None or qualifier:
+            measurement['problem'] = 'нет числового значения'
+        elif factor is None:
+            measurement['problem'] = f'неизвестная единица «{raw_unit}»'
+        else:
+            measurement['value'] = round(_parse_number(raw_value) * factor, 4)
+        measurements.append(measurement)
+    return measurements
+
+
+def document_sex(text):
+    """Пол пациента из шапки бланка («Пол: Ж») или None."""
+    match = DOCUMENT_SEX_RE.search(text)
+    if not match:
+        return None
+    return 'male' if match.group(1).lower().startswith('м') else 'female'
+
+
+def document_date(text):
+    """Дата анализа из шапки бланка в ISO-формате или None."""
+    match = DOCUMENT_DATE_RE.search(text)
+    if not match:
+        return None
+    day, month, year = (int(part) for part in match.groups())
+    if year < 100:
+        year += 2000
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+def narrative_words(text):
+    """Слова в строках связного текста (заключения, описания) вне таблиц."""
+    words = 0
+    for line in text.splitlines():
+        if '|' in line:
+            continue
+        line_words = len(line.split())
+        if line_words >= 8:
+            words += line_words
+    return words
+
+
+def check_ranges(measurements, sex=None, age=None, margin=None):
+    """
+    Сверяет показатели с таблицей референсов одной векторной операцией над
+    матрицей «показатель × строка таблицы». Если пол или возраст неизвестны,
+    подходят все строки показателя: значение вне объединения их интервалов —
+    явное отклонение, между строгой и широкой границей — пограничное.
+    Возвращает для каждого показателя (flag, low, high, deviation), где flag —
+    'normal', 'low', 'high' или 'borderline'.
+    """
+    if margin is None:
+        margin = settings.ANALYSIS_LAB_BORDERLINE_MARGIN
+    if not measurements:
+        return []
+
+    analytes = np.array([ANALYTE_INDEX[m['analyte']] for m in measurements])
+    values = np.array([np.nan if m['value'] is None else m['value'] for m in measurements], dtype=float)
+
+    matches = _RANGE_ANALYTE[None, :] == analytes[:, None]
+    if sex in SEX_CODES:
+        matches &= (_RANGE_SEX == SEX_ANY) | (_RANGE_SEX == SEX_CODES[sex])
+    if age is not None:
+        matches &= (_RANGE_AGE_FROM <= age) & (age < _RANGE_AGE_TO)
+    known = matches.any(axis=1)
+
+    # Широкий интервал — объединение подходящих строк, строгий — их пересечение
+    loose_low = np.where(matches, _RANGE_LOW, np.inf).min(axis=1)
+    loose_high = np.where(matches, _RANGE_HIGH, -np.inf).max(axis=1)
+    strict_low = np.where(matches, _RANGE_LOW, -np.inf).max(axis=1)
+    strict_high = np.where(matches, _RANGE_HIGH, np.inf).min(axis=1)
+
+    with np.errstate(invalid='ignore'):
+        below = values < loose_low * (1 - margin)
+        above = values > loose_high * (1 + margin)
+        inside = (values >= strict_low * (1 + margin)) & (values <= strict_high * (1 - margin))
+        deviation = np.where(
+            below, (loose_low - values) / np.where(loose_low > 0, loose_low, 1),
+            np.where(above, (values - loose_high) / np.where(loose_high > 0, loose_high, 1), 0.0)
+        )
+
+    flags = np.where(below, 'low', np.where(above, 'high', np.where(inside, 'normal', 'borderline')))
+    flags = np.where(known & ~np.isnan(values), flags, 'borderline')
+    return [
+        (str(flag), float(low) if k else None, float(high) if k else None, round(float(dev), 3))
+        for flag, low, high, dev, k in zip(flags, loose_low, loose_high, deviation, known)
+    ]
+
+
+def _severity(deviation):
+    for step, severity in SEVERITY_STEPS:
+        if deviation < step:
+            return severity
+    return 'high'
+
+
+def _format_value(value):
+    return f'{value:.4g}'
+
+
+def _lab_value(measurement, check):
+    flag, low, high, _ = check
+    return {
+        'analyte': measurement['analyte'],
+        'name': measurement['name'],
+        'value': measurement['value'],
+        'unit': measurement['unit'],
+        'reference_low': low,
+        'reference_high': high,
+        'flag': flag,
+    }
+
+
+def extract_lab_values(text, sex=None, age=None):
+    """
+    Показатели бланка с отметкой относительно нормы — для хранения рядов пациента,
+    в том числе когда сам анализ выполнил GigaChat. Строки без числа или с
+    неизвестной единицей пропускаются.
+    """
+    measurements = [m for m in parse_lab_rows(text) if not m['problem']]
+    checks = check_ranges(measurements, sex=document_sex(text) or sex, age=age)
+    return [_lab_value(measurement, check) for measurement, check in zip(measurements, checks)]
+
+
+def recheck_lab_values(lab_values, sex=None, age=None):
+    """Сохранённые показатели с отметками по нормам другого пациента, когда текста бланка нет."""
+    checks = check_ranges(lab_values, sex=sex, age=age)
+    return [_lab_value(item, check) for item, check in zip(lab_values, checks)]
+
+
+def analyze_lab_text(text, sex=None, age=None):
+    """
+    Проверяет текст бланка анализа правилами. Возвращает результат в формате
+    ответа модели (с lab_values и source='lab_rules'), если бланк — таблица
+    распознанных показателей без пограничных значений; иначе None, и документ
+    уходит в GigaChat: связный текст, мало показателей, пограничные или
+    непроверяемые значения.
+    """
+    measurements = parse_lab_rows(text)
+    if len(measurements) < settings.ANALYSIS_LAB_MIN_ANALYTES:
+        logger.info(f"🧪 Правила: распознано показателей {len(measurements)} — нужен GigaChat")
+        return None
+    words = narrative_words(text)
+    if words > settings.ANALYSIS_LAB_NARRATIVE_WORDS:
+        logger.info(f"🧪 Правила: в документе связный текст ({words} слов) — нужен GigaChat")
+        return None
+
+    sex = document_sex(text) or sex
+    checks = check_ranges(measurements, sex=sex, age=age)
+    unclear = [m['name'] for m, (flag, *_) in zip(measurements, checks) if flag == 'borderline' or m['problem']]
+    if unclear:
+        logger.info(f"🧪 Правила: пограничные или непроверяемые показатели {unclear} — нужен GigaChat")
+        return None
+
+    lab_values, conditions, deviations = [], {}, []
+    for measurement, check in zip(measurements, checks):
+        flag, low, high, deviation = check
+        analyte = ANALYTES[measurement['analyte']]
+        lab_values.append(_lab_value(measurement, check))
+        if flag == 'normal':
+            continue
+        note = (
+            f"{analyte['name']} {_format_value(measurement['value'])} {measurement['unit']} "
+            f"({'ниже' if flag == 'low' else 'выше'} нормы {_format_value(low)}–{_format_value(high)})"
+        )
+        deviations.append(note)
+        if not analyte[flag]:
+            continue
+        condition_name, code = analyte[flag]
+        severity = _severity(deviation)
+        known = conditions.get((code, condition_name))
+        if known is None:
+            conditions[(code, condition_name)] = known = {
+                'condition_name': condition_name, 'code': code, 'confidence': RULE_CONFIDENCE,
+                'severity': severity, 'description': note,
+            }
+        else:
+            known['description'] = f"{known['description']}; {note}"
+            if SEVERITY_RANK[severity] > SEVERITY_RANK[known['severity']]:
+                known['severity'] = severity
+
+    if deviations:
+        summary = (
+            f"Проверено показателей: {len(measurements)}, вне референсных значений: {len(deviations)}. "
+            + '; '.join(deviations) + '.'
+        )
+        recommendations = 'Обсудите отклонения с лечащим врачом; повторите анализ для контроля динамики.'
+    else:
+        summary = f"Проверено показателей: {len(measurements)}, все в пределах референсных значений."
+        recommendations = 'Показатели в норме. Плановый контроль по рекомендации врача.'
+
+    logger.info(f"🧪 Правила: {len(measurements)} показателей, отклонений {len(deviations)} — без GigaChat")
+    return {
+        'summary': summary,
+        'detected_conditions': list(conditions.values()),
+        'recommendations': recommendations,
+        'confidence': RULE_CONFIDENCE,
+        'source': 'lab_rules',
+        'lab_values': lab_values,
+        'lab_date': document_date(text),
+    }
+
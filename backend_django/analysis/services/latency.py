@@ -0,0 +1,189 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Верхние границы корзин гистограммы в секундах; последняя — всё, что дольше
+BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, float('inf'))
+
+KEY_PREFIX = 'analysis:latency'
+
+# Подписчики на сырые замеры этого процесса (нагрузочный прогон)
+_listeners = []
+_listeners_lock = threading.Lock()
+
+# Замеры копятся в памяти процесса и переносятся в кеш фоновым потоком
+_pending = defaultdict(int)
+_pending_lock = threading.Lock()
+_flusher_pid = None
+
+# Этапы конвейера анализа и вызова GigaChat
+STAGES = (
+    'extraction',
+    'lab_rules',
+    'semantic_cache',
+    'llm',
+    'save',
+    'gigachat_admission',
+    'gigachat_token',
+    'gigachat_request',
+)
+
+
+def _bucket_label(bound):
+    return 'inf' if bound == float('inf') else str(bound)
+
+
+def _incr(key, delta=1):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, timeout=None)
+
+
+def flush():
+    """Переносит накопленные в процессе замеры в общий кеш."""
+    global _pending
+    with _pending_lock:
+        pending, _pending = _pending, defaultdict(int)
+    for key, delta in pending.items():
+        _incr(key, delta)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(settings.ANALYSIS_LATENCY_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            logger.warning(f"⚠️ Замеры длительности не сохранены: {e}")
+
+
+def _ensure_flusher():
+    # Поток сброса запускается в каждом процессе; замеры, унаследованные
+    # после fork, сбросит родитель
+    global _flusher_pid, _pending
+    pid = os.getpid()
+    if _flusher_pid == pid:
+        return
+    with _pending_lock:
+        if _flusher_pid == pid:
+            return
+        _flusher_pid = pid
+        _pending = defaultdict(int)
+    threading.Thread(target=_flush_loop, name='latency-flush', daemon=True).start()
+
+
+def observe(stage, seconds):
+    """
+    Учитывает длительность этапа в общей для всех процессов гистограмме. Вызывается
+    и из цикла событий GigaChat, поэтому только увеличивает счётчики в памяти:
+    в кеш они попадают не позже чем через ANALYSIS_LATENCY_FLUSH_INTERVAL.
+    """
+    _ensure_flusher()
+    bound = next(b for b in BUCKETS if seconds <= b)
+    with _pending_lock:
+        _pending[f"{KEY_PREFIX}:{stage}:{_bucket_label(bound)}"] += 1
+        _pending[f"{KEY_PREFIX}:{stage}:count"] += 1
+        _pending[f"{KEY_PREFIX}:{stage}:sum_ms"] += int(seconds * 1000)
+    for listener in _listeners:
+        listener(stage, seconds)
+
+
+# Остаток замеров при штатном завершении процесса
+atexit.register(flush)
+
+
+@contextmanager
+def listening(listener):
+    """Передаёт listener(stage, seconds) каждый замер этого процесса, пока открыт контекст."""
+    global _listeners
+    # Список заменяется целиком, чтобы observe() перебирал его без блокировки
+    with _listeners_lock:
+        _listeners = _listeners + [listener]
+    try:
+        yield
+    finally:
+        with _listeners_lock:
+            _listeners = [item for item in _listeners if item is not listener]
+
+
+@contextmanager
+def timed(stage):
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(stage, time.monotonic() - started)
+
+
+def _quantile(buckets, count, q):
+    threshold, seen = q * count, 0
+    for label, value in buckets.items():
+        seen += value
+        if seen >= threshold:
+            return label
+    return 'inf'
+
+
+def _stage_stats(buckets, count, sum_ms):
+    return {
+        'count': count,
+        'avg': round(sum_ms / count / 1000, 3),
+        'p50': _quantile(buckets, count, 0.5),
+        'p95': _quantile(buckets, count, 0.95),
+        'p99': _quantile(buckets, count, 0.99),
+        'buckets': buckets,
+    }
+
+
+def get_stats():
+    """
+    Гистограммы по этапам: число замеров, среднее и оценка p50/p95/p99 по корзинам.
+    Замеры текущего процесса сбрасываются сразу, других — с задержкой до интервала сброса.
+    """
+    flush()
+    keys = [
+        f"{KEY_PREFIX}:{stage}:{suffix}"
+        for stage in STAGES
+        for suffix in [*map(_bucket_label, BUCKETS), 'count', 'sum_ms']
+    ]
+    values = cache.get_many(keys)
+
+    stats = {}
+    for stage in STAGES:
+        count = values.get(f"{KEY_PREFIX}:{stage}:count", 0)
+        if not count:
+            continue
+        buckets = {
+            _bucket_label(bound): values.get(f"{KEY_PREFIX}:{stage}:{_bucket_label(bound)}", 0)
+            for bound in BUCKETS
+        }
+        stats[stage] = _stage_stats(buckets, count, values.get(f"{KEY_PREFIX}:{stage}:sum_ms", 0))
+    return stats
+
+
+def diff_stats(before, after):
+    """Гистограммы замеров, сделанных между двумя вызовами get_stats() (во всех процессах)."""
+    stats = {}
+    for stage, current in after.items():
+        previous = before.get(stage, {'count': 0, 'avg': 0, 'buckets': {}})
+        count = current['count'] - previous['count']
+        if count <= 0:
+            continue
+        buckets = {
+            label: value - previous['buckets'].get(label, 0)
+            for label, value in current['buckets'].items()
+        }
+        sum_ms = current['avg'] * current['count'] * 1000 - previous['avg'] * previous['count'] * 1000
+        stats[stage] = _stage_stats(buckets, count, max(sum_ms, 0))
+    return stats
@@ -0,0 +1,199 @@
+import gc
+import logging
+import os
+import resource
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'analysis:nlp_models'
+PROCESSES_KEY = f'{KEY_PREFIX}:processes'
+# Снимок процесса хранится сутки: завершившиеся воркеры пропадают из диагностики сами
+SNAPSHOT_TTL = 24 * 60 * 60
+SMAPS_ROLLUP = '/proc/self/smaps_rollup'
+SMAPS_FIELDS = {
+    'Rss': 'rss', 'Pss': 'pss', 'Shared_Clean': 'shared_clean',
+    'Shared_Dirty': 'shared_dirty', 'Private_Clean': 'private_clean', 'Private_Dirty': 'private_dirty',
+}
+
+_registry = {}
+_lock = threading.Lock()
+
+
+class ModelEntry:
+    """
+    Загрузчик модели и сведения о загрузке. fork_safe — модель, загруженная в главном
+    процессе воркера до fork, используется дочерними процессами без повторной загрузки
+    (страницы памяти общие, копирование при записи). Остальные загружаются в каждом процессе.
+    """
+
+    def __init__(self, name, loader, fork_safe):
+        self.name = name
+        self.loader = loader
+        self.fork_safe = fork_safe
+        self.model = None
+        self.pid = None
+        self.load_seconds = None
+        self.rss_delta = None
+        self.loaded_at = None
+        self.error = None
+        self.lock = threading.Lock()
+
+    def usable(self):
+        return self.model is not None and (self.fork_safe or self.pid == os.getpid())
+
+    def info(self):
+        return {
+            'loaded': self.usable(),
+            'fork_safe': self.fork_safe,
+            'shared': self.usable() and self.pid != os.getpid(),
+            'loaded_in_pid': self.pid,
+            'load_seconds': self.load_seconds,
+            'rss_delta_bytes': self.rss_delta,
+            'loaded_at': self.loaded_at,
+            'error': self.error,
+        }
+
+
+def register(name, fork_safe=True):
+    """Декоратор загрузчика: функция без аргументов, возвращающая готовую модель."""
+    def decorator(loader):
+        with _lock:
+            _registry[name] = ModelEntry(name, loader, fork_safe)
+        return loader
+    return decorator
+
+
+def memory_usage():
+    """
+    Память процесса в байтах. На Linux — из smaps_rollup: shared_* — страницы,
+    общие с другими процессами (модели главного процесса после fork), pss — доля процесса.
+    """
+    usage = {}
+    try:
+        with open(SMAPS_ROLLUP) as smaps:
+            for line in smaps:
+                field, _, value = line.partition(':')
+                if field in SMAPS_FIELDS:
+                    usage[SMAPS_FIELDS[field]] = int(value.split()[0]) * 1024
+    except OSError:
+        # ru_maxrss — пиковое значение (в КиБ на Linux)
+        usage['rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return usage
+
+
+def get(name):
+    """Модель по имени; загружается при первом обращении в процессе (или берётся из главного)."""
+    entry = _registry[name]
+    if entry.usable():
+        return entry.model
+    with entry.lock:
+        if entry.usable():
+            return entry.model
+        rss_before = memory_usage().get('rss', 0)
+        started = time.monotonic()
+        try:
+            model = entry.loader()
+        except Exception as e:
+            entry.error = str(e)[:200]
+            raise
+        entry.model, entry.pid, entry.error = model, os.getpid(), None
+        entry.load_seconds = round(time.monotonic() - started, 3)
+        entry.rss_delta = memory_usage().get('rss', 0) - rss_before
+        entry.loaded_at = time.time()
+    logger.info(f"🧠 Модель {name} загружена за {entry.load_seconds} сек, +{entry.rss_delta // (1024 * 1024)} МБ")
+    publish()
+    return model
+
+
+def warmup(names=None, fork_safe=None):
+    """
+    Загружает модели заранее: names (по умолчанию NLP_WARMUP_MODELS), при fork_safe=True/False —
+    только подходящие. Ошибка загрузки одной модели не мешает остальным. Возвращает {имя: секунды или ошибка}.
+    """
+    loaded = {}
+    for name in names if names is not None else settings.NLP_WARMUP_MODELS:
+        entry = _registry.get(name)
+        if entry is None:
+            logger.warning(f"⚠️ Неизвестная модель для прогрева: {name}")
+            continue
+        if fork_safe is not None and entry.fork_safe != fork_safe:
+            continue
+        try:
+            get(name)
+            loaded[name] = entry.load_seconds
+        except Exception as e:
+            logger.error(f"❌ Не удалось прогреть модель {name}: {e}")
+            loaded[name] = f'error: {e}'
+    return loaded
+
+
+def warmup_before_fork():
+    """
+    Прогрев в главном процессе воркера до запуска дочерних. gc.freeze() переносит
+    загруженные объекты в постоянное поколение: сборщик мусора дочерних процессов
+    их не обходит и не копирует общие страницы памяти.
+    """
+    loaded = warmup(fork_safe=True)
+    gc.freeze()
+    return loaded
+
+
+def snapshot():
+    return {
+        'host': socket.gethostname(),
+        'pid': os.getpid(),
+        'parent_pid': os.getppid(),
+        'memory': memory_usage(),
+        'models': {name: entry.info() for name, entry in _registry.items()},
+        'updated_at': time.time(),
+    }
+
+
+def publish():
+    """Сохраняет снимок процесса в общий кеш, чтобы диагностика видела и воркеры."""
+    data = snapshot()
+    key = f"{KEY_PREFIX}:process:{data['host']}:{data['pid']}"
+    cache.set(key, data, timeout=SNAPSHOT_TTL)
+    processes = cache.get(PROCESSES_KEY) or []
+    if key not in processes:
+        cache.set(PROCESSES_KEY, [*processes, key], timeout=SNAPSHOT_TTL)
+
+
+def get_stats():
+    """Текущий процесс и последние снимки остальных процессов (загрузки моделей и память)."""
+    current = snapshot()
+    keys = cache.get(PROCESSES_KEY) or []
+    snapshots = cache.get_many(keys)
+    alive = [key for key in keys if key in snapshots]
+    if len(alive) != len(keys):
+        cache.set(PROCESSES_KEY, alive, timeout=SNAPSHOT_TTL)
+    own_key = f"{KEY_PREFIX}:process:{current['host']}:{current['pid']}"
+    return {
+        'current': current,
+        'processes': [snapshots[key] for key in alive if key != own_key],
+    }
+
+
+@register('morph')
+def _load_morph():
+    import pymorphy3
+    return pymorphy3.MorphAnalyzer()
+
+
+@register('spacy_ru')
+def _load_spacy():
+    import spacy
+    return spacy.load(settings.NLP_SPACY_MODEL)
+
+
+# Пул потоков torch, созданный до fork, в дочерних процессах может зависнуть
+@register('sentence_embeddings', fork_safe=False)
+def _load_sentence_embeddings():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(settings.ANALYSIS_SEMANTIC_MODEL, device='cpu')
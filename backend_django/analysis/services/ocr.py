@@ -0,0 +1,176 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from PIL import Image, ImageOps, ImageSequence
+
+logger = logging.getLogger(__name__)
+
+OCR_LANG = 'rus+eng'
+
+# Наклон ищется перебором малых углов по профилю строк на уменьшенной копии
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_STEP = 0.5
+DESKEW_PREVIEW_SIDE = 800
+
+# Регион режется по пустой строке не дальше этого расстояния от желаемой границы
+REGION_CUT_SEARCH = 120
+
+_executor = None
+_executor_pid = None
+
+
+def _get_executor():
+    # Tesseract работает во внешнем процессе, поэтому потоков достаточно,
+    # чтобы занять все ядра
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        _executor = ThreadPoolExecutor(max_workers=settings.OCR_WORKERS, thread_name_prefix='ocr')
+        _executor_pid = pid
+    return _executor
+
+
+def _configure_tesseract():
+    import pytesseract
+    # Параллельность даём регионами; внутренние потоки OpenMP каждого
+    # процесса tesseract только конкурировали бы за те же ядра
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+    cmd = settings.TESSERACT_CMD
+    if cmd and os.path.exists(cmd):
+        pytesseract.pytesseract.tesseract_cmd = cmd
+    return pytesseract
+
+
+def _scale_for_ocr(image):
+    """Уменьшает изображение до оптимального для Tesseract разрешения."""
+    dpi = image.info.get('dpi')
+    scale = 1.0
+    if dpi and dpi[0] and dpi[0] > settings.OCR_TARGET_DPI:
+        scale = settings.OCR_TARGET_DPI / float(dpi[0])
+    longest = max(image.size)
+    if longest * scale > settings.OCR_MAX_SIDE:
+        scale = settings.OCR_MAX_SIDE / float(longest)
+    if scale >= 1.0:
+        return image
+    size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+def otsu_threshold(pixels):
+    """Порог Оцу по гистограмме 8-битного изображения."""
+    hist = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+    weights = np.cumsum(hist)
+    means = np.cumsum(hist * np.arange(256))
+    total_weight, total_mean = weights[-1], means[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (total_mean * weights / total_weight - means) ** 2 / (weights * (total_weight - weights))
+    between = np.nan_to_num(between)
+    return int(np.argmax(between))
+
+
+def estimate_skew(gray):
+    """Угол наклона строк в градусах (максимум дисперсии горизонтального профиля)."""
+    preview = gray.copy()
+    preview.thumbnail((DESKEW_PREVIEW_SIDE, DESKEW_PREVIEW_SIDE))
+    pixels = np.asarray(preview)
+    ink = Image.fromarray(((pixels < otsu_threshold(pixels)) * 255).astype(np.uint8))
+
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + DESKEW_STEP / 2, DESKEW_STEP):
+        profile = np.asarray(ink.rotate(float(angle), resample=Image.NEAREST)).sum(axis=1, dtype=np.float64)
+        score = float(np.var(profile))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def _binarize(gray):
+    pixels = np.asarray(gray)
+    threshold = otsu_threshold(pixels)
+    return Image.fromarray(np.where(pixels > threshold, 255, 0).astype(np.uint8)), pixels <= threshold
+
+
+def split_regions(image, ink):
+    """
+    Режет высокое изображение на горизонтальные полосы по пустым строкам,
+    чтобы распознавать их параллельно, не разрезая строки текста.
+    """
+    height = image.height
+    region_height = settings.OCR_REGION_HEIGHT
+    if height <= region_height * 1.5:
+        return [image]
+
+    row_ink = ink.sum(axis=1)
+    cuts = [0]
+    target = region_height
+    while target < height - region_height // 2:
+        low = max(cuts[-1] + 1, target - REGION_CUT_SEARCH)
+        high = min(height - 1, target + REGION_CUT_SEARCH)
+        cut = low + int(np.argmin(row_ink[low:high]))
+        cuts.append(cut)
+        target = cut + region_height
+    cuts.append(height)
+    return [image.crop((0, top, image.width, bottom)) for top, bottom in zip(cuts, cuts[1:]) if bottom > top]
+
+
+def _preprocess(frame, timings):
+    started = time.monotonic()
+    gray = ImageOps.exif_transpose(frame).convert('L')
+    gray = _scale_for_ocr(gray)
+    timings['scale'] += time.monotonic() - started
+
+    started = time.monotonic()
+    angle = estimate_skew(gray)
+    if angle:
+        gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    timings['deskew'] += time.monotonic() - started
+
+    started = time.monotonic()
+    binary, ink = _binarize(gray)
+    timings['binarize'] += time.monotonic() - started
+    return binary, ink, angle
+
+
+def _recognize(region):
+    pytesseract = _configure_tesseract()
+    return pytesseract.image_to_string(region, lang=OCR_LANG)
+
+
+def recognize_image(file_path):
+    """
+    Распознаёт текст изображения (включая многостраничные TIFF).
+    Возвращает (текст, подробности) с временем каждого этапа в секундах.
+    """
+    timings = {'load': 0.0, 'scale': 0.0, 'deskew': 0.0, 'binarize': 0.0, 'split': 0.0, 'ocr': 0.0}
+    total_started = time.monotonic()
+
+    started = time.monotonic()
+    image = Image.open(file_path)
+    frames = [frame.copy() for frame in ImageSequence.Iterator(image)]
+    timings['load'] = time.monotonic() - started
+
+    regions, angles = [], []
+    for frame in frames:
+        binary, ink, angle = _preprocess(frame, timings)
+        angles.append(angle)
+        started = time.monotonic()
+        regions.extend(split_regions(binary, ink))
+        timings['split'] += time.monotonic() - started
+
+    started = time.monotonic()
+    texts = list(_get_executor().map(_recognize, regions))
+    timings['ocr'] = time.monotonic() - started
+
+    details = {
+        'frames': len(frames),
+        'regions': len(regions),
+        'skew_angles': angles,
+        'timings': {stage: round(value, 4) for stage, value in timings.items()},
+        'total': round(time.monotonic() - total_started, 4),
+    }
+    logger.info(f"🖼️ OCR: кадров {len(frames)}, регионов {len(regions)}, этапы {details['timings']}")
+    return "\n".join(text.strip() for text in texts if text.strip()), details
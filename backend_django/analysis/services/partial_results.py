@@ -0,0 +1,242 @@
+import json
+import os
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+
+from diseases.services import normalize_code
+
+from .response_parser import normalize_condition
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'analysis:partial'
+# Потоки, в которых частичные результаты сводятся и пишутся в кеш вне цикла событий GigaChat
+PUBLISH_WORKERS = 4
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+# Ключи ответа модели, которые показываются пользователю до завершения анализа
+SUMMARY_KEY = 'summary'
+CONDITION_KEYS = ('detected_conditions', 'conditions')
+
+
+class PartialJSONParser:
+    """
+    Потоковый разбор JSON-ответа модели по мере прихода фрагментов.
+    Каждый символ просматривается один раз; наружу отдаются уже полученная
+    часть строки summary и полностью закрытые объекты detected_conditions.
+    Текст до первой «{» (```json и т. п.) пропускается.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.summary = ''
+        self.conditions = []
+        self._pos = 0
+        # Кадр контейнера: [тип, ключ, ожидается ключ, индекс элемента]
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._summary_start = None
+        self._condition_start = None
+        self._done = False
+
+    def _path(self):
+        return [frame[1] if frame[0] == '{' else frame[3] for frame in self._stack]
+
+    def _in_conditions_array(self):
+        return (
+            len(self._stack) == 2 and self._stack[1][0] == '['
+            and self._stack[0][1] in CONDITION_KEYS
+        )
+
+    def feed(self, delta):
+        """Добавляет фрагмент ответа; True, если видимая часть результата изменилась."""
+        self.buffer += delta
+        changed = False
+        buffer = self.buffer
+        while self._pos < len(buffer) and not self._done:
+            char = buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    changed |= self._close_string(self._pos)
+            elif not self._stack and char != '{':
+                pass
+            elif char == '"':
+                self._in_string = True
+                self._string_start = self._pos
+                frame = self._stack[-1]
+                if frame[0] == '{' and not frame[2] and self._path() == [SUMMARY_KEY]:
+                    self._summary_start = self._pos + 1
+            elif char in '{[':
+                if char == '{' and self._in_conditions_array():
+                    self._condition_start = self._pos
+                self._stack.append([char, None, char == '{', 0])
+            elif char in '}]':
+                self._stack.pop()
+                if char == '}' and self._condition_start is not None and self._in_conditions_array():
+                    changed |= self._close_condition(self._pos)
+                if not self._stack:
+                    self._done = True
+            elif char == ',':
+                frame = self._stack[-1]
+                if frame[0] == '{':
+                    frame[2] = True
+                else:
+                    frame[3] += 1
+            self._pos += 1
+
+        if self._in_string and self._summary_start is not None:
+            changed |= self._update_summary(buffer[self._summary_start:self._pos])
+        return changed
+
+    def _close_string(self, end):
+        frame = self._stack[-1]
+        if frame[0] == '{' and frame[2]:
+            frame[1] = self._decode(self.buffer[self._string_start + 1:end])
+            frame[2] = False
+            return False
+        if self._summary_start is not None:
+            start, self._summary_start = self._summary_start, None
+            return self._update_summary(self.buffer[start:end])
+        return False
+
+    def _close_condition(self, end):
+        start, self._condition_start = self._condition_start, None
+        try:
+            condition = normalize_condition(json.loads(self.buffer[start:end + 1]))
+        except ValueError:
+            return False
+        if condition is None:
+            return False
+        self.conditions.append(condition)
+        return True
+
+    def _update_summary(self, raw):
+        # Оборванная на конце escape-последовательность («\», «\u04…») дочитается со следующим фрагментом
+        for trim in range(7):
+            summary = self._decode(raw[:len(raw) - trim])
+            if summary is not None:
+                break
+        if summary is None or summary == self.summary:
+            return False
+        self.summary = summary
+        return True
+
+    @staticmethod
+    def _decode(raw):
+        try:
+            return json.loads(f'"{raw}"')
+        except ValueError:
+            return None
+
+    def snapshot(self):
+        return {'summary': self.summary, 'detected_conditions': list(self.conditions)}
+
+
+def cache_key(session_id):
+    return f"{KEY_PREFIX}:{session_id}"
+
+
+def get_partial(session_id):
+    """Последний опубликованный частичный результат сессии или None."""
+    return cache.get(cache_key(session_id))
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=PUBLISH_WORKERS, thread_name_prefix='partial')
+                _executor_pid = pid
+    return _executor
+
+
+class PartialResultPublisher:
+    """
+    Публикует частичный результат анализа в общий кеш, откуда его читает
+    SSE-представление. Части длинного документа сводятся в одну картину.
+    Запись не чаще ANALYSIS_PARTIAL_INTERVAL, кроме появления нового состояния.
+    Вызывается в цикле событий на каждый фрагмент ответа, поэтому здесь только
+    запоминается снимок; сведение состояний (нормализация кодов) и запись в кеш
+    идут в пуле потоков, у публикатора — не больше одной записи одновременно.
+    """
+
+    def __init__(self, session_id):
+        self.key = cache_key(session_id)
+        self.parts = {}
+        # Повтор сессии продолжает нумерацию: клиент с Last-Event-ID прошлого запуска
+        # не пропустит первые события нового
+        previous = cache.get(self.key)
+        self.seq = previous['seq'] if previous else 0
+        self._published_at = 0.0
+        self._conditions_count = 0
+        self._dirty = False
+        self._pending = None
+        cache.delete(self.key)
+
+    def __call__(self, partial, part=0):
+        self.parts[part] = partial
+        self._dirty = True
+        conditions_count = sum(len(item['detected_conditions']) for item in self.parts.values())
+        now = time.monotonic()
+        if conditions_count == self._conditions_count and now - self._published_at < settings.ANALYSIS_PARTIAL_INTERVAL:
+            return
+        if self._pending is not None and not self._pending.done():
+            # Предыдущая запись ещё идёт; этот снимок уйдёт со следующим фрагментом или в flush()
+            return
+        self._submit(conditions_count, now)
+
+    def flush(self):
+        """Публикует то, что осталось придержанным интервалом, и ждёт записи."""
+        if self._pending is not None:
+            self._pending.result()
+        if self._dirty:
+            self._submit(self._conditions_count, time.monotonic())
+            self._pending.result()
+
+    def _submit(self, conditions_count, now):
+        self.seq += 1
+        self._dirty = False
+        self._published_at = now
+        self._conditions_count = conditions_count
+        self._pending = _get_executor().submit(self._publish, dict(self.parts), self.seq)
+
+    @staticmethod
+    def _merged_conditions(parts):
+        merged = {}
+        for part in sorted(parts):
+            for condition in parts[part]['detected_conditions']:
+                key = normalize_code(condition.get('code'), condition.get('condition_name'))
+                known = merged.get(key)
+                if known is None or condition['confidence'] > known['confidence']:
+                    merged[key] = condition
+        return list(merged.values())
+
+    def _publish(self, parts, seq):
+        summary = ' '.join(parts[part]['summary'] for part in sorted(parts) if parts[part]['summary'])
+        try:
+            cache.set(self.key, {
+                'seq': seq,
+                'summary': summary,
+                'detected_conditions': self._merged_conditions(parts),
+                'parts': len(parts),
+            }, timeout=settings.ANALYSIS_PARTIAL_TTL)
+        except Exception as e:
+            # Частичный результат — подсказка для интерфейса, анализ из-за него не падает
+            logger.warning(f"⚠️ Частичный результат не опубликован: {e}")
@@ -0,0 +1,162 @@
+import hashlib
+import logging
+import os
+import string
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+
+from analysis.ai_prompts.base_prompt import BASE_PROMPT_TEMPLATE
+
+logger = logging.getLogger(__name__)
+
+# Версия встроенного промта; входит в ключ кеша результатов анализа
+BUILTIN_PROMPT_VERSION = 'builtin-2'
+
+# Предел символов текста в одном промте; длинный документ заранее
+# делится на части меньше этого предела (chunked_analysis)
+PROMPT_TEXT_LIMIT = 4000
+
+PROMPT_VARIABLES = ('text_data', 'file_type', 'file_name')
+
+# Общий для всех процессов счётчик изменений промтов
+GENERATION_CACHE_KEY = 'analysis:prompt_registry:generation'
+
+_prompts = None
+_generation = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+class PromptTemplateError(ValueError):
+    pass
+
+
+class CompiledPrompt:
+    """Промт, заранее разобранный на литералы и подстановки."""
+
+    def __init__(self, template, version, prompt_id=None, name='builtin'):
+        self.version = version
+        self.prompt_id = prompt_id
+        self.name = name
+        self._parts = compile_template(template)
+
+    def render(self, text_data, file_type='', file_name=''):
+        values = {
+            'text_data': text_data[:PROMPT_TEXT_LIMIT],
+            'file_type': file_type or '',
+            'file_name': file_name or '',
+        }
+        return ''.join(part if field is None else values[field] for part, field in self._parts)
+
+    def __repr__(self):
+        return f"<CompiledPrompt {self.name} {self.version}>"
+
+
+def compile_template(template):
+    """
+    Разбирает шаблон в синтаксисе str.format в список (литерал, None) и
+    (None, переменная). Допускаются только переменные PROMPT_VARIABLES
+    без спецификаторов формата; {{ и }} — экранированные скобки.
+    """
+    parts = []
+    try:
+        parsed = list(string.Formatter().parse(template))
+    except ValueError as e:
+        raise PromptTemplateError(f"Некорректный шаблон промта: {e}") from e
+
+    for literal, field, format_spec, conversion in parsed:
+        if literal:
+            parts.append((literal, None))
+        if field is None:
+            continue
+        if field not in PROMPT_VARIABLES or format_spec or conversion:
+            raise PromptTemplateError(
+                f"Недопустимая подстановка {{{field}}}: доступны только {', '.join(PROMPT_VARIABLES)}"
+            )
+        parts.append((None, field))
+    return parts
+
+
+BUILTIN_PROMPT = CompiledPrompt(BASE_PROMPT_TEMPLATE, BUILTIN_PROMPT_VERSION)
+
+
+def file_type_for(mime_type, file_name=None):
+    """Тип файла в терминах AIPrompt.FILE_TYPE_CHOICES."""
+    mime_type = mime_type or ''
+    ext = os.path.splitext(file_name or '')[1].lower()
+    if mime_type == 'application/dicom' or ext == '.dcm':
+        return 'dicom'
+    if mime_type == 'application/pdf' or ext == '.pdf':
+        return 'pdf'
+    if mime_type.startswith('image/'):
+        return 'image'
+    if 'wordprocessingml' in mime_type or mime_type == 'application/msword' or ext in ('.docx', '.doc'):
+        return 'docx'
+    if mime_type.startswith('text/') or ext in ('.txt', '.html', '.htm'):
+        return 'text'
+    return 'all'
+
+
+def _prompt_version(prompt):
+    # Текст и предел подстановки входят в версию: правка через API не создаёт
+    # AIPromptVersion, а от предела зависит, что именно увидит модель
+    digest = hashlib.sha256(f"{PROMPT_TEXT_LIMIT}:{prompt.prompt_text}".encode('utf-8')).hexdigest()[:8]
+    return f"{prompt.pk}:v{prompt.latest_version or 0}:{digest}"
+
+
+def _load_prompts():
+    """Компилирует самый свежий активный промт для каждого типа файла."""
+    from analysis.models import AIPrompt
+
+    prompts = {}
+    active = AIPrompt.objects.filter(is_active=True).annotate(
+        latest_version=Max('versions__version')
+    ).order_by('-updated_at')
+    for prompt in active:
+        if prompt.file_type in prompts:
+            continue
+        try:
+            prompts[prompt.file_type] = CompiledPrompt(
+                prompt.prompt_text, _prompt_version(prompt), prompt_id=prompt.pk, name=prompt.name
+            )
+        except PromptTemplateError as e:
+            logger.error(f"❌ Промт «{prompt.name}» пропущен: {e}")
+    logger.info(f"📝 Реестр промтов загружен: {sorted(prompts) or 'только встроенный'}")
+    return prompts
+
+
+def _get_prompts():
+    global _prompts, _generation, _checked_at
+    now = time.monotonic()
+    if _prompts is not None and now - _checked_at < settings.PROMPT_REGISTRY_CHECK_INTERVAL:
+        return _prompts
+
+    with _lock:
+        # Изменения из других процессов подхватываются не позже чем через интервал проверки
+        generation = cache.get(GENERATION_CACHE_KEY, 0)
+        if _prompts is None or generation != _generation:
+            _prompts = _load_prompts()
+            _generation = generation
+        _checked_at = now
+        return _prompts
+
+
+def get_prompt(file_type):
+    """Активный промт для типа файла, затем общий ('all'), затем встроенный."""
+    prompts = _get_prompts()
+    return prompts.get(file_type) or prompts.get('all') or BUILTIN_PROMPT
+
+
+def invalidate():
+    """Сбрасывает скомпилированные промты в этом процессе и во всех остальных."""
+    global _prompts
+    with _lock:
+        _prompts = None
+    try:
+        cache.incr(GENERATION_CACHE_KEY)
+    except ValueError:
+        cache.set(GENERATION_CACHE_KEY, 1, timeout=None)
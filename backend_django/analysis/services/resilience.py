@@ -0,0 +1,263 @@
+import asyncio
+import os
+import random
+import time
+import logging
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+
+import httpx
+from django.conf import settings
+from django.core.cache import cache
+
+from . import latency
+
+logger = logging.getLogger(__name__)
+
+# Ответы, после которых запрос имеет смысл повторить
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+CIRCUIT_STATE_KEY = 'gigachat:circuit'
+CIRCUIT_PROBE_KEY = 'gigachat:circuit:probe'
+
+
+class GigaChatUnavailable(Exception):
+    """GigaChat перегружен или недоступен; анализ нужно повторить позже."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Retry-After в секундах или в виде HTTP-даты; None, если заголовка нет."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Пауза перед повтором: Retry-After сервера или экспонента с полным джиттером."""
+    if retry_after is not None:
+        return min(retry_after, settings.GIGACHAT_RETRY_MAX_DELAY)
+    ceiling = min(settings.GIGACHAT_RETRY_MAX_DELAY, settings.GIGACHAT_RETRY_BASE_DELAY * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+class AdaptiveLimiter:
+    """
+    Предел одновременных запросов процесса к GigaChat по схеме AIMD:
+    быстрый ответ добавляет 1/limit, медленный ответ, таймаут или 429
+    уменьшают предел вдвое (не чаще раза за целевое время ответа).
+    Все запросы процесса идут через один цикл событий, поэтому
+    ожидание слота — asyncio.Condition.
+    """
+
+    def __init__(self, min_limit, max_limit, latency_target):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.limit = float(max(min_limit, max_limit // 2))
+        self.inflight = 0
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    def _has_room(self):
+        return self.inflight < int(self.limit)
+
+    @asynccontextmanager
+    async def slot(self, timeout):
+        started = time.monotonic()
+        async with self._cond:
+            try:
+                await asyncio.wait_for(self._cond.wait_for(self._has_room), timeout)
+            except asyncio.TimeoutError:
+                latency.observe('gigachat_admission', time.monotonic() - started)
+                raise GigaChatUnavailable(
+                    f'Очередь к GigaChat переполнена (предел {int(self.limit)})',
+                    retry_after=self.latency_target
+                )
+            self.inflight += 1
+        latency.observe('gigachat_admission', time.monotonic() - started)
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.inflight -= 1
+                self._cond.notify()
+
+    async def on_success(self, elapsed):
+        async with self._cond:
+            if elapsed <= self.latency_target:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                self._cond.notify_all()
+            else:
+                self._decrease()
+
+    async def on_overload(self):
+        async with self._cond:
+            self._decrease()
+
+    def _decrease(self):
+        # Пачка одновременно замедлившихся ответов — один сигнал, а не несколько
+        now = time.monotonic()
+        if now - self._last_decrease < self.latency_target:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit / 2)
+        logger.warning(f"🐢 GigaChat замедлился, предел параллельности снижен до {int(self.limit)}")
+
+
+class CircuitBreaker:
+    """
+    Размыкается после GIGACHAT_BREAKER_FAILURES неудачных вызовов подряд в процессе.
+    Состояние хранится в общем кеше, поэтому разомкнутая цепь останавливает
+    все воркеры; по истечении паузы один пробный вызов решает, замкнуть ли её.
+    Вызовы идут из цикла событий, поэтому проверяется копия состояния в процессе:
+    кеш перечитывается не чаще sync_interval и в отдельном потоке, а пишется
+    только при размыкании и замыкании цепи.
+    """
+
+    def __init__(self, failure_threshold, cooldown, sync_interval):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.sync_interval = sync_interval
+        self.failures = 0
+        self.open_until = 0.0
+        self._synced_at = None
+
+    async def _sync(self):
+        now = time.monotonic()
+        if self._synced_at is not None and now - self._synced_at < self.sync_interval:
+            return
+        # Отметка ставится до чтения: остальные запросы не ждут его и берут прежнюю копию
+        self._synced_at = now
+        state = await asyncio.to_thread(cache.get, CIRCUIT_STATE_KEY)
+        self.open_until = state['open_until'] if state else 0.0
+
+    async def before_call(self):
+        await self._sync()
+        if not self.open_until:
+            return
+        remaining = self.open_until - time.time()
+        if remaining > 0:
+            raise GigaChatUnavailable('GigaChat временно недоступен', retry_after=remaining)
+        if not await asyncio.to_thread(cache.add, CIRCUIT_PROBE_KEY, os.getpid(), self.cooldown):
+            raise GigaChatUnavailable('GigaChat проверяется пробным запросом', retry_after=self.cooldown)
+        logger.info("🔌 Пробный запрос к GigaChat после паузы")
+
+    async def record_success(self):
+        self.failures = 0
+        if self.open_until:
+            self.open_until = 0.0
+            await asyncio.to_thread(cache.delete_many, [CIRCUIT_STATE_KEY, CIRCUIT_PROBE_KEY])
+            logger.info("✅ GigaChat снова доступен, цепь замкнута")
+
+    async def record_failure(self):
+        self.failures += 1
+        # Неудачный пробный запрос размыкает цепь снова, не дожидаясь порога
+        if self.failures < self.failure_threshold and not self.open_until:
+            return
+        self.open_until = time.time() + self.cooldown
+        self._synced_at = time.monotonic()
+        await asyncio.to_thread(self._publish_open, self.open_until)
+        logger.error(
+            f"⛔ GigaChat недоступен ({self.failures} ошибок подряд), запросы приостановлены на {self.cooldown} сек"
+        )
+
+    def _publish_open(self, open_until):
+        cache.set(CIRCUIT_STATE_KEY, {'open_until': open_until}, timeout=self.cooldown * 10)
+        cache.delete(CIRCUIT_PROBE_KEY)
+
+
+class GigaChatGuard:
+    """Допуск запросов к GigaChat: предел параллельности, повторы и размыкатель цепи."""
+
+    def __init__(self):
+        self.limiter = AdaptiveLimiter(
+            settings.GIGACHAT_MIN_CONCURRENCY,
+            settings.GIGACHAT_MAX_CONCURRENCY,
+            settings.GIGACHAT_LATENCY_TARGET
+        )
+        self.breaker = CircuitBreaker(
+            settings.GIGACHAT_BREAKER_FAILURES,
+            settings.GIGACHAT_BREAKER_COOLDOWN,
+            settings.GIGACHAT_BREAKER_SYNC_INTERVAL
+        )
+
+    async def call(self, send, read=None):
+        """
+        Выполняет await send() (HTTP-запрос, возвращающий response) с повторами.
+        read — чтение тела потокового ответа 2xx (await read(response)): оно идёт под тем же
+        слотом предела, поэтому предел ограничивает и одновременные потоки, а время ответа
+        считается до конца тела. Таймаут или обрыв чтения — неудача без повтора.
+        Размыкатель засчитывает успех только ответу 2xx. Возвращает (ответ, результат read),
+        который повторять бессмысленно, или бросает GigaChatUnavailable.
+        """
+        await self.breaker.before_call()
+        reason, retry_after = 'нет ответа', None
+        for attempt in range(settings.GIGACHAT_MAX_RETRIES + 1):
+            if attempt:
+                delay = backoff_delay(attempt - 1, retry_after)
+                logger.warning(f"🔁 Повтор запроса к GigaChat через {delay:.1f} сек: {reason}")
+                await asyncio.sleep(delay)
+
+            async with self.limiter.slot(settings.GIGACHAT_ADMISSION_TIMEOUT):
+                started = time.monotonic()
+                try:
+                    response = await send()
+                except httpx.TransportError as e:
+                    # Таймауты и сетевые ошибки
+                    latency.observe('gigachat_request', time.monotonic() - started)
+                    await self.limiter.on_overload()
+                    reason, retry_after = f'{type(e).__name__}', None
+                    continue
+                body = None
+                if read is not None and response.is_success:
+                    try:
+                        body = await read(response)
+                    except (asyncio.TimeoutError, httpx.TransportError) as e:
+                        latency.observe('gigachat_request', time.monotonic() - started)
+                        await response.aclose()
+                        reason = 'поток не завершён вовремя' if isinstance(e, asyncio.TimeoutError) else (
+                            f'поток оборван, {type(e).__name__}'
+                        )
+                        raise await self.fail(reason)
+                    except BaseException:
+                        await response.aclose()
+                        raise
+                elapsed = time.monotonic() - started
+                latency.observe('gigachat_request', elapsed)
+
+            if response.status_code in RETRYABLE_STATUSES:
+                # Потоковый ответ держит соединение, пока его не закрыть
+                await response.aclose()
+                await self.limiter.on_overload()
+                reason = f'HTTP {response.status_code}'
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                continue
+
+            await self.limiter.on_success(elapsed)
+            if response.is_success:
+                await self.breaker.record_success()
+            return response, body
+
+        await self.breaker.record_failure()
+        raise GigaChatUnavailable(f'GigaChat не ответил: {reason}', retry_after=retry_after)
+
+    async def fail(self, reason, retry_after=None):
+        """
+        Неудача вне повторов call(): ошибка авторизации, 401 после обновления токена,
+        оборванный или не завершённый вовремя поток. Снижает предел и считается размыкателем;
+        возвращает исключение, которое вызывающий бросает (raise await guard.fail(...)).
+        """
+        await self.limiter.on_overload()
+        await self.breaker.record_failure()
+        return GigaChatUnavailable(f'GigaChat не ответил: {reason}', retry_after=retry_after)
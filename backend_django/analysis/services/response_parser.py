@@ -0,0 +1,335 @@
+import json
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Версия формата сохранённого result_json; результаты этой версии читаются без нормализации
+RESULT_SCHEMA_VERSION = 1
+
+SEVERITIES = ('low', 'medium', 'high')
+SEVERITY_ALIASES = {
+    'mild': 'low', 'minor': 'low', 'низкая': 'low', 'лёгкая': 'low', 'легкая': 'low',
+    'moderate': 'medium', 'средняя': 'medium', 'умеренная': 'medium',
+    'severe': 'high', 'critical': 'high', 'высокая': 'high', 'тяжёлая': 'high', 'тяжелая': 'high',
+}
+
+# Литералы Python, которые модель иногда пишет вместо JSON
+BARE_WORDS = {'True': 'true', 'False': 'false', 'None': 'null', 'true': 'true', 'false': 'false', 'null': 'null'}
+NUMBER_CHARS = frozenset('0123456789+-.eE')
+# Служебные поля конвейера, которые сохраняются вместе с ответом модели
+PIPELINE_FIELDS = ('error', 'chunks', 'failed_chunks', 'source', 'lab_values', 'lab_date')
+
+CONDITION_SCHEMA = {
+    'condition_name': {'type': 'string', 'aliases': ('name', 'condition', 'diagnosis'), 'required': True,
+                       'max_length': 255},
+    'code': {'type': 'string', 'aliases': ('icd10', 'icd_code', 'mkb'), 'default': 'UNKNOWN', 'max_length': 50},
+    'confidence': {'type': 'probability', 'default': 0.0},
+    'severity': {'type': 'choice', 'choices': SEVERITIES, 'value_aliases': SEVERITY_ALIASES, 'default': 'medium'},
+    'description': {'type': 'string', 'default': '', 'max_length': 500, 'optional': True},
+}
+
+RESULT_SCHEMA = {
+    'summary': {'type': 'string', 'default': 'Анализ выполнен', 'max_length': 2000},
+    'detected_conditions': {'type': 'list', 'items': CONDITION_SCHEMA, 'aliases': ('conditions', 'diagnoses')},
+    'recommendations': {'type': 'text', 'default': 'Рекомендуется консультация врача', 'max_length': 4000},
+    'confidence': {'type': 'probability', 'default': 0.0},
+}
+
+
+# ---------- Извлечение JSON ----------
+
+def _skip_spaces(text, i):
+    n = len(text)
+    while i < n and text[i].isspace():
+        i += 1
+    return i
+
+
+def _read_string(text, i, quote):
+    """
+    Строка с позиции после открывающей кавычки. Возвращает (JSON-строка, позиция после неё).
+    Чинит одинарные кавычки, сырые переводы строк и неэкранированные кавычки внутри текста.
+    """
+    n = len(text)
+    out = ['"']
+    while i < n:
+        char = text[i]
+        if char == '\\':
+            following = text[i + 1] if i + 1 < n else ''
+            if following in '"\\/bfnrtu' and following:
+                out.append(char + following)
+            elif following == "'":
+                out.append("'")
+            else:
+                # Недопустимая escape-последовательность: обратная косая черта — обычный символ
+                out.append('\\\\')
+                i += 1
+                continue
+            i += 2
+            continue
+        if char == quote:
+            # Кавычка закрывает строку, только если за ней идёт синтаксис JSON
+            after = _skip_spaces(text, i + 1)
+            if after >= n or text[after] in ',:}]':
+                return ''.join(out) + '"', i + 1
+            out.append('\\"')
+        elif char == '"':
+            out.append('\\"')
+        elif char < ' ':
+            out.append({'\n': '\\n', '\r': '\\r', '\t': '\\t'}.get(char, f'\\u{ord(char):04x}'))
+        else:
+            out.append(char)
+        i += 1
+    # Ответ оборван посреди строки
+    return ''.join(out) + '"', n
+
+
+def _drop_trailing(out, tokens):
+    while out and (out[-1].isspace() or out[-1] in tokens):
+        out.pop()
+
+
+def repair_json(text):
+    """
+    Вырезает из ответа модели первый JSON-объект за один проход и чинит типичные
+    ошибки: текст и ```-ограждения вокруг, одинарные кавычки, ключи без кавычек,
+    True/False/None, висячие запятые, комментарии, оборванный конец.
+    Возвращает строку для json.loads или None, если объекта нет.
+    """
+    fence = text.find('```')
+    start = text.find('{', fence if fence != -1 else 0)
+    if start == -1:
+        start = text.find('{')
+    if start == -1:
+        return None
+
+    out, stack = [], []
+    i, n = start, len(text)
+    while i < n:
+        char = text[i]
+        if char == '"' or char == "'":
+            token, i = _read_string(text, i + 1, char)
+            out.append(token)
+            continue
+        if char in '{[':
+            stack.append('}' if char == '{' else ']')
+            out.append(char)
+        elif char in '}]':
+            if not stack:
+                break
+            _drop_trailing(out, ',')
+            out.append(stack.pop())
+            if not stack:
+                break
+        elif char in ',:':
+            out.append(char)
+        elif char == '/' and text.startswith('//', i):
+            end = text.find('\n', i)
+            i = n if end == -1 else end
+            continue
+        elif char == '/' and text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        elif char in NUMBER_CHARS:
+            end = i
+            while end < n and text[end] in NUMBER_CHARS:
+                end += 1
+            out.append(text[i:end])
+            i = end
+            continue
+        elif char.isalpha() or char == '_':
+            end = i
+            while end < n and (text[end].isalnum() or text[end] in '_-'):
+                end += 1
+            word = text[i:end]
+            after = _skip_spaces(text, end)
+            if after < n and text[after] == ':':
+                out.append(json.dumps(word, ensure_ascii=False))
+            else:
+                out.append(BARE_WORDS.get(word) or json.dumps(word, ensure_ascii=False))
+            i = end
+            continue
+        elif char.isspace():
+            out.append(char)
+        # Прочие символы вне строк (%, «», остатки разметки) пропускаются
+        i += 1
+
+    if stack:
+        # Оборванный ответ: недописанная пара «ключ: значение» отбрасывается, скобки закрываются
+        _drop_trailing(out, ',:')
+        if out and out[-1].startswith('"') and stack[-1] == '}':
+            before = len(out) - 2
+            while before >= 0 and out[before].isspace():
+                before -= 1
+            if before >= 0 and out[before] in '{,':
+                # Последняя строка в объекте — ключ без значения
+                del out[before + 1:]
+                _drop_trailing(out, ',')
+        out.extend(reversed(stack))
+    return ''.join(out)
+
+
+def extract_json(text):
+    """Первый JSON-объект из ответа модели (с починкой) или None."""
+    if not text:
+        return None
+    stripped = text.strip()
+    if stripped.startswith('{') and stripped.endswith('}'):
+        try:
+            data = json.loads(stripped)
+            if isinstance(data, dict):
+                return data
+        except ValueError:
+            pass
+
+    repaired = repair_json(text)
+    if repaired is None:
+        return None
+    try:
+        data = json.loads(repaired)
+    except ValueError as e:
+        logger.warning(f"⚠️ JSON ответа не удалось починить: {e}")
+        return None
+    return data if isinstance(data, dict) else None
+
+
+# ---------- Схема результата ----------
+
+def _coerce_string(rule):
+    default, max_length = rule.get('default'), rule.get('max_length')
+
+    def coerce(value):
+        if isinstance(value, (list, tuple)):
+            value = ', '.join(str(item) for item in value if item not in (None, ''))
+        elif value is None or isinstance(value, dict):
+            return default
+        value = str(value).strip()
+        if not value:
+            return default
+        return value[:max_length] if max_length else value
+    return coerce
+
+
+def _coerce_text(rule):
+    to_string = _coerce_string(rule)
+
+    def coerce(value):
+        if isinstance(value, (list, tuple)):
+            value = '\n'.join(str(item).strip() for item in value if item not in (None, ''))
+        return to_string(value)
+    return coerce
+
+
+def _coerce_probability(rule):
+    default = rule.get('default')
+
+    def coerce(value):
+        if isinstance(value, bool) or value is None:
+            return default
+        if isinstance(value, str):
+            value = value.strip().rstrip('%').replace(',', '.')
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return default
+        if math.isnan(value) or value < 0:
+            return default
+        # Проценты вместо доли: 80 → 0.8
+        if 1 < value <= 100:
+            value /= 100
+        return min(value, 1.0)
+    return coerce
+
+
+def _coerce_choice(rule):
+    choices, aliases, default = rule['choices'], rule.get('value_aliases', {}), rule.get('default')
+
+    def coerce(value):
+        value = str(value or '').strip().lower()
+        value = aliases.get(value, value)
+        return value if value in choices else default
+    return coerce
+
+
+def _coerce_list(rule):
+    normalize_item = compile_schema(rule['items'])
+
+    def coerce(value):
+        if isinstance(value, dict):
+            value = [value]
+        if not isinstance(value, (list, tuple)):
+            return []
+        items = (normalize_item(item) for item in value)
+        return [item for item in items if item is not None]
+    return coerce
+
+
+COERCERS = {
+    'string': _coerce_string,
+    'text': _coerce_text,
+    'probability': _coerce_probability,
+    'choice': _coerce_choice,
+    'list': _coerce_list,
+}
+
+
+def compile_schema(schema):
+    """
+    Превращает описание схемы в функцию нормализации объекта: для каждого поля
+    заранее собраны имена (с синонимами) и приведение типа. Функция возвращает
+    новый словарь только с полями схемы или None, если нет обязательного поля.
+    """
+    fields = []
+    for name, rule in schema.items():
+        fields.append((
+            name,
+            (name, *rule.get('aliases', ())),
+            COERCERS[rule['type']](rule),
+            rule.get('required', False),
+            rule.get('optional', False),
+        ))
+
+    def normalize(data):
+        if not isinstance(data, dict):
+            return None
+        result = {}
+        for name, keys, coerce, required, optional in fields:
+            raw = next((data[key] for key in keys if data.get(key) not in (None, '', [])), None)
+            if raw is None and optional:
+                continue
+            value = coerce(raw)
+            if value is None and required:
+                return None
+            result[name] = value
+        return result
+    return normalize
+
+
+normalize_condition = compile_schema(CONDITION_SCHEMA)
+_normalize_result_fields = compile_schema(RESULT_SCHEMA)
+
+
+def normalize_result(data):
+    """Результат анализа в формате RESULT_SCHEMA; уже нормализованный возвращается как есть."""
+    if isinstance(data, dict) and data.get('schema_version') == RESULT_SCHEMA_VERSION:
+        return data
+    result = _normalize_result_fields(data if isinstance(data, dict) else {})
+    for field in PIPELINE_FIELDS:
+        if isinstance(data, dict) and field in data:
+            result[field] = data[field]
+    result['schema_version'] = RESULT_SCHEMA_VERSION
+    return result
+
+
+def parse_response(content):
+    """Ответ модели → нормализованный результат; без JSON — резюме из текста ответа."""
+    data = extract_json(content)
+    if data is None:
+        return normalize_result({
+            'summary': (content or '')[:200] or 'Анализ выполнен',
+            'recommendations': 'Требуется консультация врача',
+            'confidence': 0.3,
+        })
+    return normalize_result(data)
@@ -0,0 +1,84 @@
+import hashlib
+import logging
+
+from django.core.cache import cache
+
+from analysis.models import AnalysisResult
+
+logger = logging.getLogger(__name__)
+
+HITS_KEY = 'analysis:result_cache:hits'
+MISSES_KEY = 'analysis:result_cache:misses'
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _cached_results(prompt_version, model_name):
+    return AnalysisResult.objects.filter(
+        is_cacheable=True,
+        prompt_version=prompt_version,
+        model_name=model_name,
+    ).order_by('-created_at')
+
+
+def find_by_content(content_hash, prompt_version, model_name):
+    """Ищет готовый результат для того же файла (по SHA-256 содержимого)."""
+    if not content_hash:
+        return None
+    return _cached_results(prompt_version, model_name).filter(content_hash=content_hash).first()
+
+
+def find_by_text(text_digest, prompt_version, model_name):
+    """Ищет готовый результат для того же извлечённого текста."""
+    if not text_digest:
+        return None
+    return _cached_results(prompt_version, model_name).filter(text_hash=text_digest).first()
+
+
+def find_by_id(result_id, prompt_version, model_name):
+    """Результат, найденный по похожему тексту, если его ещё можно переиспользовать."""
+    return _cached_results(prompt_version, model_name).filter(id=result_id).first()
+
+
+def _incr(key):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def record_hit():
+    _incr(HITS_KEY)
+
+
+def record_miss():
+    _incr(MISSES_KEY)
+
+
+def get_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 3) if total else 0.0,
+    }
+
+
+def invalidate(prompt_version=None, model_name=None):
+    """
+    Исключает сохранённые результаты из переиспользования.
+    Без аргументов сбрасывает весь кеш; иначе — только для указанной версии промта и/или модели.
+    """
+    queryset = AnalysisResult.objects.filter(is_cacheable=True)
+    if prompt_version is not None:
+        queryset = queryset.filter(prompt_version=prompt_version)
+    if model_name is not None:
+        queryset = queryset.filter(model_name=model_name)
+    updated = queryset.update(is_cacheable=False)
+    logger.info(f"Кеш результатов сброшен: {updated} записей")
+    return updated
@@ -0,0 +1,223 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+
+from . import nlp_models, result_cache
+
+logger = logging.getLogger(__name__)
+
+NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)?')
+ID_DTYPE = 'U36'
+FINGERPRINT_DTYPE = 'U16'
+# Предыдущее заключение, которое модель получает вместе с похожим документом
+CONTEXT_SUMMARY_LIMIT = 600
+
+Probe = namedtuple('Probe', 'vector fingerprint result score reusable')
+
+_index = None
+_index_mtime = None
+_lock = threading.Lock()
+
+
+def fingerprint(text):
+    """
+    Отпечаток чисел документа по порядку. Тот же бланк с другими значениями
+    семантически почти неотличим, поэтому результат переиспользуется только
+    при совпадении отпечатка.
+    """
+    numbers = ' '.join(number.replace(',', '.') for number in NUMBER_RE.findall(text))
+    return hashlib.sha256(numbers.encode('utf-8')).hexdigest()[:16]
+
+
+class VectorIndex:
+    """
+    Нормированные эмбеддинги результатов в массивах NumPy: поиск — одно матричное
+    умножение по записям пользователя. Записи сверх max_bytes вытесняются по
+    давности последнего использования (LRU).
+    """
+
+    def __init__(self, dim, max_bytes):
+        self.dim = dim
+        self.capacity = max(1, max_bytes // self.entry_bytes(dim))
+        self.size = 0
+        self._clock = 0
+        self.vectors = self.result_ids = self.user_ids = self.fingerprints = self.used = None
+        self._allocate(min(self.capacity, 1024))
+
+    @staticmethod
+    def entry_bytes(dim):
+        return (
+            dim * np.dtype(np.float32).itemsize
+            + 2 * np.dtype(ID_DTYPE).itemsize
+            + np.dtype(FINGERPRINT_DTYPE).itemsize
+            + np.dtype(np.int64).itemsize
+        )
+
+    def _allocate(self, rows):
+        def grow(array, shape, dtype):
+            grown = np.zeros(shape, dtype=dtype)
+            if array is not None:
+                grown[:self.size] = array[:self.size]
+            return grown
+
+        self.vectors = grow(self.vectors, (rows, self.dim), np.float32)
+        self.result_ids = grow(self.result_ids, rows, ID_DTYPE)
+        self.user_ids = grow(self.user_ids, rows, ID_DTYPE)
+        self.fingerprints = grow(self.fingerprints, rows, FINGERPRINT_DTYPE)
+        self.used = grow(self.used, rows, np.int64)
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def add(self, result_id, user_id, fingerprint, vector):
+        if self.size == self.capacity:
+            slot = int(np.argmin(self.used[:self.size]))
+        else:
+            if self.size == len(self.vectors):
+                self._allocate(min(self.capacity, 2 * len(self.vectors)))
+            slot = self.size
+            self.size += 1
+        self.vectors[slot] = vector
+        self.result_ids[slot] = result_id
+        self.user_ids[slot] = user_id
+        self.fingerprints[slot] = fingerprint
+        self.used[slot] = self._tick()
+
+    def search(self, vector, user_id):
+        """Ближайшая запись пользователя: (result_id, косинусная близость, отпечаток) или None."""
+        rows = np.flatnonzero(self.user_ids[:self.size] == user_id)
+        if not len(rows):
+            return None
+        scores = self.vectors[rows] @ vector
+        best = rows[int(np.argmax(scores))]
+        self.used[best] = self._tick()
+        return str(self.result_ids[best]), float(scores.max()), str(self.fingerprints[best])
+
+    def discard(self, result_id):
+        """Удаляет запись, результат которой больше нельзя переиспользовать."""
+        slots = np.flatnonzero(self.result_ids[:self.size] == result_id)
+        for slot in slots[::-1]:
+            last = self.size - 1
+            for array in (self.vectors, self.result_ids, self.user_ids, self.fingerprints, self.used):
+                array[slot] = array[last]
+            self.size -= 1
+
+    def save(self, path):
+        """Атомарная запись .npz: соседний процесс не прочитает файл наполовину."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as tmp:
+            np.savez(
+                tmp,
+                vectors=self.vectors[:self.size],
+                result_ids=self.result_ids[:self.size],
+                user_ids=self.user_ids[:self.size],
+                fingerprints=self.fingerprints[:self.size],
+                used=self.used[:self.size],
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, dim, max_bytes):
+        index = cls(dim, max_bytes)
+        with np.load(path) as data:
+            if data['vectors'].shape[1:] != (dim,):
+                logger.warning(f"⚠️ Индекс {path} построен другой моделью эмбеддингов, начинаем заново")
+                return index
+            # При уменьшенном бюджете остаются самые недавно использованные записи
+            keep = np.argsort(data['used'])[-index.capacity:]
+            index._allocate(max(len(keep), 1))
+            index.size = len(keep)
+            index.vectors[:index.size] = data['vectors'][keep]
+            index.result_ids[:index.size] = data['result_ids'][keep]
+            index.user_ids[:index.size] = data['user_ids'][keep]
+            index.fingerprints[:index.size] = data['fingerprints'][keep]
+            index.used[:index.size] = np.arange(1, index.size + 1)
+            index._clock = index.size
+        return index
+
+
+def embed(text):
+    """Нормированный эмбеддинг текста (float32): косинус равен скалярному произведению."""
+    return nlp_models.get('sentence_embeddings').encode(text, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+def _get_index(dim):
+    # Индекс общий для процессов через файл: сохранённый соседом файл перечитывается
+    global _index, _index_mtime
+    path = settings.ANALYSIS_SEMANTIC_INDEX_PATH
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    if _index is None or (mtime is not None and mtime != _index_mtime):
+        if mtime is not None:
+            _index = VectorIndex.load(path, dim, settings.ANALYSIS_SEMANTIC_INDEX_MAX_BYTES)
+            logger.info(f"🧠 Семантический индекс загружен: {_index.size} записей")
+        else:
+            _index = VectorIndex(dim, settings.ANALYSIS_SEMANTIC_INDEX_MAX_BYTES)
+        _index_mtime = mtime
+    return _index
+
+
+def probe(text, user_id, prompt_version, model_name):
+    """
+    Ищет среди результатов пользователя похожий документ. reusable — близость не ниже
+    ANALYSIS_SEMANTIC_REUSE_THRESHOLD и те же числа; иначе результат с близостью не ниже
+    ANALYSIS_SEMANTIC_CONTEXT_THRESHOLD годится только как контекст для модели.
+    Без sentence-transformers возвращает None.
+    """
+    try:
+        vector = embed(text)
+    except ImportError:
+        logger.warning("⚠️ sentence-transformers не установлен, семантический кеш пропущен")
+        return None
+
+    digest = fingerprint(text)
+    with _lock:
+        index = _get_index(len(vector))
+        found = index.search(vector, str(user_id))
+    if found is None or found[1] < settings.ANALYSIS_SEMANTIC_CONTEXT_THRESHOLD:
+        return Probe(vector, digest, None, found[1] if found else 0.0, False)
+
+    result_id, score, matched_digest = found
+    result = result_cache.find_by_id(result_id, prompt_version, model_name)
+    if result is None:
+        with _lock:
+            index.discard(result_id)
+        return Probe(vector, digest, None, score, False)
+    reusable = score >= settings.ANALYSIS_SEMANTIC_REUSE_THRESHOLD and matched_digest == digest
+    return Probe(vector, digest, result, score, reusable)
+
+
+def remember(probe_result, user_id, result_id):
+    """Добавляет эмбеддинг сохранённого результата в индекс и сохраняет индекс на диск."""
+    if probe_result is None:
+        return
+    global _index_mtime
+    path = settings.ANALYSIS_SEMANTIC_INDEX_PATH
+    with _lock:
+        index = _get_index(len(probe_result.vector))
+        index.add(str(result_id), str(user_id), probe_result.fingerprint, probe_result.vector)
+        try:
+            index.save(path)
+            _index_mtime = os.path.getmtime(path)
+        except OSError as e:
+            logger.warning(f"⚠️ Не удалось сохранить семантический индекс: {e}")
+
+
+def with_context(text, result):
+    """Текст документа с предыдущим заключением по похожему документу пациента."""
+    data = result.result_json or {}
+    conditions = ', '.join(
+        condition['condition_name'] for condition in data.get('detected_conditions', [])
+    ) or 'не выявлены'
+    summary = str(data.get('summary') or '')[:CONTEXT_SUMMARY_LIMIT]
+    return (
+        "Предыдущее заключение по похожему документу этого пациента (значения могли измениться, "
+        f"оцените документ заново):\n{summary}\nСостояния: {conditions}\n\n{text}"
+    )
@@ -0,0 +1,228 @@
+import os
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Длинный текст анализируется частями (chunked_analysis), поэтому бюджет
+# ограничивает только объём одного документа
+MAX_TEXT_LENGTH = 24000
+
+PDF_MAX_PAGES = 40
+
+_pdf_pool = None
+_pdf_pool_pid = None
+_pdf_pool_lock = threading.Lock()
+
+DOCX_MIME_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Версии экстракторов: при изменении логики извлечения версию нужно поднять,
+# тогда сохранённый текст будет извлечён заново
+EXTRACTOR_VERSIONS = {
+    'pdfplumber': '2',
+    'python-docx': '2',
+    'plaintext': '2',
+    'tesseract': '3',
+    'pydicom': '1',
+    'unsupported': '1',
+}
+
+
+class ExtractionError(Exception):
+    pass
+
+
+def select_extractor(file_path, mime_type):
+    """Определяет экстрактор по MIME-типу, а если он неизвестен — по расширению."""
+    mime_type = mime_type or ''
+    if mime_type == 'application/pdf':
+        return 'pdfplumber'
+    if mime_type == DOCX_MIME_TYPE:
+        return 'python-docx'
+    if mime_type in ['text/plain', 'text/html']:
+        return 'plaintext'
+    if mime_type == 'application/dicom':
+        return 'pydicom'
+    if mime_type.startswith('image/'):
+        return 'tesseract'
+
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.pdf':
+        return 'pdfplumber'
+    if ext in ['.docx', '.doc']:
+        return 'python-docx'
+    if ext in ['.txt', '.html', '.htm']:
+        return 'plaintext'
+    if ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']:
+        return 'tesseract'
+    if ext == '.dcm':
+        return 'pydicom'
+    return 'unsupported'
+
+
+def extract_text(file_path, mime_type):
+    """
+    Извлекает текст из файла. Возвращает (текст, имя экстрактора, подробности),
+    где подробности — словарь с метриками экстрактора (например, время этапов OCR);
+    при ошибке разбора бросает ExtractionError.
+    """
+    logger.info(f"📖 Извлечение текста из файла: {file_path}, тип: {mime_type}")
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Файл не найден: {file_path}")
+
+    extractor = select_extractor(file_path, mime_type)
+    if extractor == 'unsupported':
+        return f"Файл формата {mime_type}. Не удалось извлечь текст.", extractor, {}
+
+    try:
+        result = EXTRACTORS[extractor](file_path)
+    except Exception as e:
+        logger.error(f"❌ Ошибка извлечения текста ({extractor}): {e}")
+        raise ExtractionError(f"Ошибка {extractor}: {e}") from e
+
+    text, details = result if isinstance(result, tuple) else (result, {})
+    return text, extractor, details
+
+
+def _get_pdf_pool():
+    """Общий для процесса пул процессов для постраничного разбора PDF."""
+    global _pdf_pool, _pdf_pool_pid
+    pid = os.getpid()
+    if _pdf_pool is None or _pdf_pool_pid != pid:
+        with _pdf_pool_lock:
+            if _pdf_pool is None or _pdf_pool_pid != pid:
+                _pdf_pool = ProcessPoolExecutor(
+                    max_workers=settings.PDF_EXTRACTION_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                _pdf_pool_pid = pid
+    return _pdf_pool
+
+
+def _page_has_ruling_lines(page):
+    # Стратегия поиска таблиц по умолчанию опирается только на линии и рамки:
+    # на странице без них extract_tables() гарантированно ничего не найдёт
+    return bool(page.lines or page.rects or page.curves)
+
+
+def _extract_pdf_page(file_path, page_index, pdf=None):
+    """Текст одной страницы: строки таблиц через « | », затем обычный текст."""
+    import pdfplumber
+    if pdf is None:
+        with pdfplumber.open(file_path) as opened:
+            return _extract_pdf_page(file_path, page_index, opened)
+
+    page = pdf.pages[page_index]
+    parts = []
+    if _page_has_ruling_lines(page):
+        for table in page.extract_tables():
+            for row in table:
+                if row and any(cell for cell in row if cell):
+                    parts.append(" | ".join(str(cell) if cell else "" for cell in row))
+    page_text = page.extract_text()
+    if page_text:
+        parts.append(page_text)
+    return "".join(part + "\n" for part in parts)
+
+
+def _extract_pdf_pages_sequential(file_path, page_count, pdf):
+    parts, length = [], 0
+    for index in range(page_count):
+        page_text = _extract_pdf_page(file_path, index, pdf)
+        parts.append(page_text)
+        length += len(page_text)
+        if length >= MAX_TEXT_LENGTH:
+            break
+    return parts
+
+
+def _extract_pdf_pages_parallel(file_path, page_count):
+    pool = _get_pdf_pool()
+    futures = [pool.submit(_extract_pdf_page, file_path, index) for index in range(page_count)]
+    parts, length = [], 0
+    try:
+        # Страницы собираются по порядку; как только бюджет символов набран,
+        # ещё не начатые страницы отменяются
+        for future in futures:
+            page_text = future.result()
+            parts.append(page_text)
+            length += len(page_text)
+            if length >= MAX_TEXT_LENGTH:
+                break
+    finally:
+        for future in futures:
+            future.cancel()
+    return parts
+
+
+def _extract_from_pdf(file_path):
+    import pdfplumber
+    with pdfplumber.open(file_path) as pdf:
+        page_count = min(len(pdf.pages), PDF_MAX_PAGES)
+        if page_count < 2 or settings.PDF_EXTRACTION_WORKERS < 2:
+            parts = _extract_pdf_pages_sequential(file_path, page_count, pdf)
+        else:
+            parts = None
+
+    if parts is None:
+        try:
+            parts = _extract_pdf_pages_parallel(file_path, page_count)
+        except (OSError, BrokenProcessPool) as e:
+            logger.warning(f"⚠️ Параллельный разбор PDF недоступен, читаем последовательно: {e}")
+            with pdfplumber.open(file_path) as pdf:
+                parts = _extract_pdf_pages_sequential(file_path, page_count, pdf)
+
+    text = "".join(parts)
+    return text[:MAX_TEXT_LENGTH] or "PDF не содержит данных"
+
+
+def _extract_from_docx(file_path):
+    import docx
+    doc = docx.Document(file_path)
+    text = "\n".join(para.text for para in doc.paragraphs if para.text.strip())
+    return text[:MAX_TEXT_LENGTH] or "DOCX без текста"
+
+
+def _extract_from_text(file_path):
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()[:MAX_TEXT_LENGTH]
+    except UnicodeDecodeError:
+        with open(file_path, 'r', encoding='cp1251') as f:
+            return f.read()[:MAX_TEXT_LENGTH]
+
+
+def _extract_from_image(file_path):
+    """Извлечение текста из изображения с помощью Tesseract OCR"""
+    logger.info(f"🖼️ Распознавание текста на изображении: {file_path}")
+    from .ocr import recognize_image
+
+    text, details = recognize_image(file_path)
+
+    if text.strip():
+        logger.info("✅ Текст успешно распознан")
+        return text[:MAX_TEXT_LENGTH], details
+    logger.warning("⚠️ Текст на изображении не распознан")
+    return "Изображение не содержит распознаваемого текста", details
+
+
+def _extract_from_dicom(file_path):
+    """Текст DICOM из заголовка и структурированного отчёта; пиксельные данные не читаются."""
+    from .dicom import extract
+
+    text, details = extract(file_path)
+    return (text[:MAX_TEXT_LENGTH] or "DICOM без описания исследования"), details
+
+
+EXTRACTORS = {
+    'pdfplumber': _extract_from_pdf,
+    'python-docx': _extract_from_docx,
+    'plaintext': _extract_from_text,
+    'tesseract': _extract_from_image,
+    'pydicom': _extract_from_dicom,
+}
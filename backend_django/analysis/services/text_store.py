@@ -0,0 +1,49 @@
+import logging
+import time
+
+from analysis.models import ExtractedText
+from . import text_extraction
+from .result_cache import text_hash
+
+logger = logging.getLogger(__name__)
+
+
+def get_extracted_text(medical_file, force=False):
+    """
+    Возвращает ExtractedText для файла, извлекая текст только если его ещё нет
+    или экстрактор с тех пор обновился. Ошибки извлечения не сохраняются,
+    чтобы следующая попытка могла пройти заново.
+    """
+    extractor = text_extraction.select_extractor(medical_file.storage_path, medical_file.mime_type)
+    version = text_extraction.EXTRACTOR_VERSIONS[extractor]
+
+    if not force:
+        stored = ExtractedText.objects.filter(file=medical_file).first()
+        if stored and stored.extractor == extractor and stored.extractor_version == version:
+            logger.info(f"📄 Используем сохранённый текст ({stored.extractor} v{stored.extractor_version})")
+            return stored
+
+    started = time.monotonic()
+    text, extractor, details = text_extraction.extract_text(medical_file.storage_path, medical_file.mime_type)
+    duration = time.monotonic() - started
+    logger.info(f"⏱️ Текст извлечён за {duration:.2f} сек ({extractor})")
+
+    stored, _ = ExtractedText.objects.update_or_create(
+        file=medical_file,
+        defaults={
+            'text': text,
+            'text_hash': text_hash(text),
+            'extractor': extractor,
+            'extractor_version': text_extraction.EXTRACTOR_VERSIONS[extractor],
+            'duration': duration,
+            'details': details,
+        }
+    )
+    return stored
+
+
+def find_text(text_digest):
+    """Сохранённый текст с этим хешем (любого файла) или None — без повторного извлечения."""
+    if not text_digest:
+        return None
+    return ExtractedText.objects.filter(text_hash=text_digest).values_list('text', flat=True).first()
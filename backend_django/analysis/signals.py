@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import AIPrompt, AIPromptVersion, LabMeasurement
+from .services import charts, prompt_registry
+
+
+@receiver(post_save, sender=AIPrompt)
+@receiver(post_delete, sender=AIPrompt)
+@receiver(post_save, sender=AIPromptVersion)
+@receiver(post_delete, sender=AIPromptVersion)
+def invalidate_prompt_registry(sender, **kwargs):
+    """Сбрасывает скомпилированные промты после фиксации изменений."""
+    transaction.on_commit(prompt_registry.invalidate)
+
+
+@receiver(post_delete, sender=LabMeasurement)
+def invalidate_lab_charts(sender, instance, **kwargs):
+    """Удаление показателя (в том числе каскадом вместе с файлом) сбрасывает графики пользователя."""
+    transaction.on_commit(lambda: charts.invalidate(instance.user_id))
@@ -0,0 +1,65 @@
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+
+from .models import AnalysisSession
+from .services import dicom_series
+from .services.analysis_service import run_analysis, set_progress
+from .services.resilience import GigaChatUnavailable
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=settings.ANALYSIS_MAX_REQUEUES)
+def analyze_file_task(self, session_id):
+    """
+    Фоновый анализ файла для сессии, созданной при загрузке или повторном анализе.
+    Пока GigaChat недоступен, сессия возвращается в очередь с паузой.
+    """
+    try:
+        session = AnalysisSession.objects.select_related('file', 'file__user').get(id=session_id)
+    except AnalysisSession.DoesNotExist:
+        logger.warning(f"Сессия {session_id} не найдена, задача пропущена")
+        return
+
+    if session.status not in ('pending', 'in_progress'):
+        logger.info(f"Сессия {session_id} уже в статусе {session.status}, задача пропущена")
+        return
+
+    try:
+        run_analysis(session)
+    except GigaChatUnavailable as e:
+        # Без брокера (CELERY_TASK_ALWAYS_EAGER) вернуть сессию в очередь некуда
+        if self.request.is_eager or self.request.retries >= self.max_retries:
+            set_progress(
+                session, 0,
+                status='failed',
+                end_time=timezone.now(),
+                error_message=f'Сервис анализа недоступен: {e}'[:500]
+            )
+            # Снимки серии, ждавшие этот файл, не должны остаться в очереди без представителя
+            dicom_series.hand_over_file(session.file)
+            return
+        countdown = e.retry_after or settings.GIGACHAT_BREAKER_COOLDOWN
+        raise self.retry(exc=e, countdown=countdown)
+
+
+@shared_task(ignore_result=True)
+def cleanup_stuck_sessions():
+    """Помечает как ошибочные сессии, которые слишком долго висят в очереди или в работе."""
+    threshold = timezone.now() - timedelta(seconds=settings.ANALYSIS_STUCK_SESSION_TIMEOUT)
+    updated = AnalysisSession.objects.filter(
+        status__in=['pending', 'in_progress'],
+        start_time__lt=threshold
+    ).update(
+        status='failed',
+        progress=0,
+        end_time=timezone.now(),
+        error_message='Превышено время ожидания анализа'
+    )
+    if updated:
+        logger.warning(f"Помечено зависших сессий: {updated}")
+    return updated
@@ -0,0 +1,27 @@
+import numpy as np
+import pydicom
+from django.test import SimpleTestCase
+from pydicom.data import get_testdata_file
+
+from analysis.services import dicom
+
+
+class PixelDataTests(SimpleTestCase):
+    """pixel_data отдаёт те же пиксели, что pydicom, и для memmap, и для декодируемых синтаксисов."""
+
+    def assert_matches_pydicom(self, name):
+        path = get_testdata_file(name)
+        expected = pydicom.dcmread(path).pixel_array
+        frames = dicom.pixel_data(path)
+        self.assertEqual(frames.shape, (1, *expected.shape))
+        np.testing.assert_array_equal(frames[0], expected)
+        return frames
+
+    def test_uncompressed_is_memory_mapped(self):
+        frames = self.assert_matches_pydicom('CT_small.dcm')
+        self.assertIsInstance(frames, np.memmap)
+
+    def test_deflated_is_decoded(self):
+        frames = self.assert_matches_pydicom('image_dfl.dcm')
+        self.assertNotIsInstance(frames, np.memmap)
+        self.assertEqual(frames.shape, (1, 512, 512))
@@ -0,0 +1,42 @@
+from django.test import TestCase
+
+from analysis.models import AnalysisSession, DetectedCondition
+from analysis.services import analysis_service, response_parser
+from files.models import MedicalFile
+from users.models import User
+
+
+class ConditionDescriptionTests(TestCase):
+    """Описание состояния не бывает None: поле DetectedCondition.description NOT NULL."""
+
+    def test_blank_and_non_string_descriptions_normalize_to_empty(self):
+        result = response_parser.normalize_result({'detected_conditions': [
+            {'condition_name': 'Анемия', 'description': '   '},
+            {'condition_name': 'Гастрит', 'description': {'text': 'x'}},
+            {'condition_name': 'Гипертония', 'description': ['', None]},
+            {'condition_name': 'Мигрень'},
+        ]})
+        descriptions = [condition.get('description') for condition in result['detected_conditions']]
+        self.assertEqual(descriptions, ['', '', '', None])
+        self.assertNotIn('description', result['detected_conditions'][3])
+
+    def test_save_result_with_blank_description(self):
+        user = User.objects.create(email='parser@example.com', full_name='Тест')
+        medical_file = MedicalFile.objects.create(
+            user=user, filename='a.txt', filesize=1, mime_type='text/plain', storage_path='/nonexistent/a.txt'
+        )
+        session = AnalysisSession.objects.create(file=medical_file, model_ml_version='test')
+        saved = analysis_service._save_result(
+            session,
+            {'summary': 'ok', 'detected_conditions': [
+                {'condition_name': 'Анемия', 'confidence': 0.8, 'description': ' '},
+                {'condition_name': 'Гастрит', 'confidence': 0.8, 'description': {'text': 'x'}},
+            ]},
+            text_digest='',
+            cache_key={'prompt_version': 'test', 'model_name': 'test'},
+        )
+        self.assertTrue(saved['success'])
+        self.assertEqual(
+            list(DetectedCondition.objects.filter(result_id=saved['result_id']).values_list('description', flat=True)),
+            ['', '']
+        )
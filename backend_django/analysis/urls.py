@@ -6,7 +6,12 @@ print("✅ ЗАГРУЖЕН analysis/urls.py")
 urlpatterns = [
     path('file/<uuid:file_id>/', views.get_analysis_result, name='analysis-result'),
     path('session/<uuid:session_id>/', views.check_analysis_status, name='analysis-status'),
+    path('session/<uuid:session_id>/stream/', views.stream_analysis_status, name='analysis-stream'),
     path('retry/<uuid:file_id>/', views.retry_analysis, name='analysis-retry'),
     path('history/', views.analysis_history, name='analysis-history'),
+    path('labs/trends/', views.lab_trends, name='lab-trends'),
+    path('labs/<str:analyte>/chart/', views.lab_chart, name='lab-chart'),
     path('upload/', views.upload_file, name='upload_file'),
+    path('batch/', views.upload_batch, name='analysis-batch-upload'),
+    path('batch/<uuid:batch_id>/', views.check_batch_status, name='analysis-batch-status'),
 ]
\ No newline at end of file
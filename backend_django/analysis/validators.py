@@ -42,13 +42,13 @@ class FileValidator:
             
         allowed_mime_types = [
             'image/jpeg', 'image/jpg', 'image/png', 
-            'image/dicom', 'application/pdf',
+            'image/dicom', 'application/dicom', 'application/pdf',
             'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
             'application/msword', 'text/plain'
         ]
         
         if not any(allowed in content_type for allowed in [
-            'image/', 'application/pdf', 'application/msword',
+            'image/', 'application/dicom', 'application/pdf', 'application/msword',
             'application/vnd.openxmlformats', 'text/plain'
         ]):
             raise ValidationError('Недопустимый тип файла')
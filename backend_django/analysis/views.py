@@ -1,162 +1,71 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes, renderer_classes
+from rest_framework.parsers import FormParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework import status
-import os
-import uuid
 import logging
 import json
+import threading
+import time
+from datetime import datetime, time as day_time
+from celery import group
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 
 from files.models import MedicalFile
-from .models import AnalysisSession, AnalysisResult, DetectedCondition
-from diseases.models import DiseaseRecord
+from files.storage import discard_request_files, save_uploaded_file
+from files.tasks import schedule_derivatives
+from files.upload_handlers import MedicalBatchUploadParser, MedicalFileUploadParser
+from .models import AnalysisBatch, AnalysisSession, LabMeasurement
+from .renderers import EventStreamRenderer, format_event
 from .validators import validate_file
-from .services.gigachat_service import GigaChatService
+from .services import charts, lab_measurements, lab_rules
+from .services.analysis_service import PROGRESS_QUEUED
+from .services.partial_results import get_partial
+from .tasks import analyze_file_task
 
 logger = logging.getLogger(__name__)
 
 
-def _analyze_with_gigachat(medical_file, session):
-    logger.critical("🔥 _analyze_with_gigachat ВЫЗВАНА!")
-    try:
-        logger.info(f"Начинаем анализ файла: {medical_file.filename}")
-        session.status = 'in_progress'
-        session.save(update_fields=['status'])
-
-        gigachat = GigaChatService()
-
-        try:
-            extracted_text = gigachat.extract_text_from_file(
-                medical_file.storage_path,
-                medical_file.mime_type
-            )
-            if not extracted_text or len(extracted_text.strip()) < 50:
-                logger.warning("⚠️ Мало текста извлечено")
-                extracted_text = f"Файл: {medical_file.filename}\nТип: {medical_file.mime_type}\nТекст не извлечён"
-        except Exception as e:
-            logger.error(f"❌ Ошибка извлечения текста: {e}")
-            extracted_text = f"Ошибка извлечения: {str(e)[:200]}"
-
-        analysis_result = gigachat.analyze_medical_data(
-            extracted_text,
-            medical_file.mime_type,
-            medical_file.filename,
-            timeout=20
-        )
+def _enqueue_analysis(session):
+    """Ставит анализ сессии в очередь после фиксации транзакции."""
+    session_id = str(session.id)
+    transaction.on_commit(lambda: analyze_file_task.delay(session_id))
 
-        logger.info("🟢 Начинаем сохранение результата в БД")
-
-        raw_conditions = analysis_result.get('detected_conditions') or analysis_result.get('conditions') or []
-        logger.info(f"📋 Найдено условий: {len(raw_conditions)}")
-
-        overall_confidence = float(analysis_result.get('confidence', 0.0))
-        if not overall_confidence and raw_conditions:
-            confidences = [float(c.get('confidence', 0.0)) for c in raw_conditions]
-            overall_confidence = max(confidences) if confidences else 0.0
-
-        result_obj = AnalysisResult.objects.create(
-            session=session,
-            confidence=overall_confidence,
-            result_json=analysis_result,
-            recommendations=analysis_result.get('recommendations', 'Рекомендуется консультация врача.')
-        )
-        logger.info(f"✅ AnalysisResult сохранён: {result_obj.id}")
-
-        saved_conditions = 0
-        for cond in raw_conditions:
-            confidence = float(cond.get('confidence', 0.0))
-            if confidence <= 0.1:
-                continue
-
-            name = str(cond.get('condition_name') or cond.get('name') or 'Неизвестное состояние')[:255]
-            code = str(cond.get('code', 'UNKNOWN') or 'UNKNOWN')[:50]
-            severity = cond.get('severity', 'medium')
-            if severity not in ['low', 'medium', 'high']:
-                severity = 'medium'
-            description = str(cond.get('description', ''))[:500]
-
-            DetectedCondition.objects.create(
-                result=result_obj,
-                condition_code=code,
-                condition_name=name,
-                confidence=confidence,
-                severity=severity,
-                description=description
-            )
-            saved_conditions += 1
-            logger.info(f"✅ Условие сохранено: {name}")
 
-        session.status = 'completed'
-        session.end_time = timezone.now()
-        session.save(update_fields=['status', 'end_time'])
-        logger.info(f"✅ Сессия завершена: end_time={session.end_time}")
-
-        _update_disease_history(medical_file.user, analysis_result, str(session.id))
-
-        logger.info("🎉 Анализ успешно сохранён в БД")
-        return {
-            'success': True,
-            'session_id': str(session.id),
-            'result_id': str(result_obj.id),
-            'conditions_count': saved_conditions
-        }
-
-    except Exception as e:
-        logger.error(f"💥 Ошибка в _analyze_with_gigachat: {e}", exc_info=True)
-        session.status = 'failed'
-        session.end_time = timezone.now()
-        session.error_message = str(e)[:500]
-        session.save(update_fields=['status', 'end_time', 'error_message'])
-        return {'success': False, 'error': str(e), 'session_id': str(session.id)}
-
-
-def _update_disease_history(user, analysis_result, session_id):
-    conditions = analysis_result.get('detected_conditions') or []
-    
-    for condition in conditions:
-        confidence = condition.get('confidence', 0.0)
-        if confidence < 0.3:
-            continue
+def _enqueue_batch(sessions):
+    """Ставит анализы пакета в очередь одной группой задач."""
+    session_ids = [str(session.id) for session in sessions]
+    transaction.on_commit(
+        lambda: group(analyze_file_task.s(session_id) for session_id in session_ids).apply_async()
+    )
 
-        condition_name = condition.get('condition_name') or condition.get('name', 'Неизвестное состояние')
-        condition_code = condition.get('code') or f"NAME_{condition_name.replace(' ', '_')}"
-        condition_code = condition_code[:50] 
-
-        DiseaseRecord.objects.update_or_create(
-            user=user,
-            disease_code=condition_code, 
-            defaults={
-                'disease_name': condition_name[:255],
-                'last_analysis_id': session_id,
-                'last_detected': timezone.now(),
-                'is_active': True,
-            }
-        )
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@parser_classes([MedicalFileUploadParser, FormParser])
 def upload_file(request):
     file = request.FILES.get('file')
+    rejected = getattr(request, 'upload_rejected', None)
+    if rejected:
+        discard_request_files(request)
+        return Response({'error': str(rejected)}, status=rejected.status_code)
     if not file:
         return Response({'error': 'Файл не загружен'}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
         validate_file(file)
     except ValidationError as e:
+        discard_request_files(request)
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    ext = file.name.split('.')[-1].lower()
-    filename = f"{uuid.uuid4()}.{ext}"
-    user_upload_dir = os.path.join(settings.MEDIA_ROOT, 'uploads', str(request.user.id))
-    os.makedirs(user_upload_dir, exist_ok=True)
-    full_path = os.path.join(user_upload_dir, filename)
-
-    with open(full_path, 'wb+') as f:
-        for chunk in file.chunks():
-            f.write(chunk)
+    full_path, content_hash = save_uploaded_file(file, request.user)
 
     medical_file = MedicalFile.objects.create(
         user=request.user,
@@ -164,31 +73,145 @@ def upload_file(request):
         filesize=file.size,
         mime_type=file.content_type,
         storage_path=full_path,
+        content_hash=content_hash,
         upload_date=timezone.now()
     )
 
     session = AnalysisSession.objects.create(
         file=medical_file,
         model_ml_version='GigaChat-v1.0',
-        status='pending'
+        status='pending',
+        progress=PROGRESS_QUEUED
     )
+    _enqueue_analysis(session)
+    schedule_derivatives([medical_file])
 
-    result = _analyze_with_gigachat(medical_file, session)
+    return Response({
+        'id': str(medical_file.id),
+        'session_id': str(session.id),
+        'message': 'Файл загружен и поставлен в очередь на анализ',
+        'model_type': 'GigaChat AI',
+        'status': session.status,
+        'progress': session.progress
+    }, status=status.HTTP_202_ACCEPTED)
 
-    if result['success']:
-        return Response({
-            'id': str(medical_file.id),
-            'session_id': str(session.id),
-            'message': 'Файл загружен и проанализирован',
-            'model_type': 'GigaChat AI',
-            'status': 'completed',
-            'conditions_count': result['conditions_count']
-        }, status=status.HTTP_201_CREATED)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MedicalBatchUploadParser, FormParser])
+def upload_batch(request):
+    files = request.FILES.getlist('files')
+    rejected = getattr(request, 'upload_rejected', None)
+    if rejected:
+        discard_request_files(request)
+        return Response({'error': str(rejected)}, status=rejected.status_code)
+    if not files:
+        return Response({'error': 'Файлы не загружены'}, status=status.HTTP_400_BAD_REQUEST)
+
+    errors = {}
+    for file in files:
+        try:
+            validate_file(file)
+        except ValidationError as e:
+            errors[file.name] = e.messages
+    if errors:
+        discard_request_files(request)
+        return Response({'error': 'Ошибка валидации файлов', 'files': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    now = timezone.now()
+    medical_files = []
+    for file in files:
+        full_path, content_hash = save_uploaded_file(file, request.user)
+        medical_files.append(MedicalFile(
+            user=request.user,
+            filename=file.name,
+            filesize=file.size,
+            mime_type=file.content_type,
+            storage_path=full_path,
+            content_hash=content_hash,
+            upload_date=now
+        ))
+
+    with transaction.atomic():
+        batch = AnalysisBatch.objects.create(user=request.user, file_count=len(medical_files))
+        MedicalFile.objects.bulk_create(medical_files)
+        sessions = AnalysisSession.objects.bulk_create([
+            AnalysisSession(
+                file=medical_file,
+                batch=batch,
+                model_ml_version='GigaChat-v1.0',
+                status='pending',
+                progress=PROGRESS_QUEUED
+            )
+            for medical_file in medical_files
+        ])
+        _enqueue_batch(sessions)
+        schedule_derivatives(medical_files)
+
+    return Response({
+        'batch_id': str(batch.id),
+        'message': f'Загружено файлов: {len(sessions)}, анализ поставлен в очередь',
+        'files': [
+            {
+                'id': str(session.file_id),
+                'session_id': str(session.id),
+                'filename': session.file.filename,
+            }
+            for session in sessions
+        ],
+        'status': 'pending',
+        'progress': PROGRESS_QUEUED
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def check_batch_status(request, batch_id):
+    try:
+        batch = AnalysisBatch.objects.get(id=batch_id, user=request.user)
+    except AnalysisBatch.DoesNotExist:
+        return Response({'error': 'Пакет не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+    sessions = list(
+        batch.sessions.select_related('file')
+        .only('id', 'status', 'progress', 'file_id', 'file__filename')
+        .order_by('file__filename')
+    )
+    counts = {key: 0 for key, _ in AnalysisSession.STATUS_CHOICES}
+    for session in sessions:
+        counts[session.status] += 1
+    finished = counts['completed'] + counts['failed']
+
+    # Упавшие файлы тоже завершены: для общего прогресса они считаются как 100%
+    progress = 100
+    if sessions:
+        progress = round(sum(
+            100 if session.status == 'failed' else session.progress for session in sessions
+        ) / len(sessions))
+
+    if not sessions or finished == len(sessions):
+        batch_status = 'failed' if sessions and counts['completed'] == 0 else 'completed'
+    elif counts['in_progress'] or finished:
+        batch_status = 'in_progress'
     else:
-        return Response({
-            'error': 'Ошибка анализа',
-            'details': result['error']
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        batch_status = 'pending'
+
+    return Response({
+        'batch_id': str(batch.id),
+        'status': batch_status,
+        'progress': progress,
+        'counts': counts,
+        'files': [
+            {
+                'file_id': str(session.file_id),
+                'session_id': str(session.id),
+                'filename': session.file.filename,
+                'status': session.status,
+                'progress': session.progress,
+            }
+            for session in sessions
+        ]
+    })
 
 
 @api_view(['GET'])
@@ -197,17 +220,16 @@ def get_analysis_result(request, file_id):
     try:
         session = AnalysisSession.objects.select_related(
             'file', 'result'
-        ).prefetch_related(
-            'result__detected_conditions'
-        ).get(
+        ).filter(
             file_id=file_id,
             file__user=request.user
-        )
+        ).latest('start_time')
 
         data = {
             'session_id': str(session.id),
             'status': session.status,
             'model_version': session.model_ml_version,
+            'prompt_version': session.prompt_version,
             'start_time': session.start_time,
             'end_time': session.end_time,
             'filename': session.file.filename,
@@ -216,37 +238,14 @@ def get_analysis_result(request, file_id):
 
         if session.status == 'completed' and hasattr(session, 'result'):
             result = session.result
+            # result_json приведён к схеме при сохранении (или миграцией 0013) и отдаётся без разбора
             result_json = result.result_json or {}
-
-            summary = result_json.get('summary') or 'Анализ выполнен'
-            recommendations = result_json.get('recommendations') or result.recommendations or 'Рекомендуется консультация врача'
-            confidence = result_json.get('confidence', result.confidence)
-
-            detected_conditions = []
-            json_conditions = result_json.get('detected_conditions') or result_json.get('conditions') or []
-            if json_conditions:
-                for cond in json_conditions:
-                    detected_conditions.append({
-                        'condition_name': cond.get('condition_name') or cond.get('name', 'Неизвестное состояние'),
-                        'code': cond.get('code', 'UNKNOWN'),
-                        'confidence': float(cond.get('confidence', 0.0)),
-                        'severity': cond.get('severity', 'medium')
-                    })
-            else:
-                for cond in result.detected_conditions.all():
-                    detected_conditions.append({
-                        'condition_name': cond.condition_name,
-                        'code': cond.condition_code,
-                        'confidence': cond.confidence,
-                        'severity': cond.severity
-                    })
-
             data.update({
                 'result_id': str(result.id),
-                'summary': summary,
-                'detected_conditions': detected_conditions,
-                'recommendations': recommendations,
-                'confidence': confidence,
+                'summary': result_json.get('summary', 'Анализ выполнен'),
+                'detected_conditions': result_json.get('detected_conditions', []),
+                'recommendations': result_json.get('recommendations', result.recommendations),
+                'confidence': result_json.get('confidence', result.confidence),
             })
 
         return Response(data)
@@ -262,18 +261,179 @@ def get_analysis_result(request, file_id):
 @permission_classes([IsAuthenticated])
 def check_analysis_status(request, session_id):
     try:
-        session = AnalysisSession.objects.get(id=session_id, file__user=request.user)
-        return Response({
+        session = AnalysisSession.objects.select_related('file').get(id=session_id, file__user=request.user)
+        data = {
             'session_id': str(session.id),
             'status': session.status,
-            'progress': {'pending': 10, 'in_progress': 50, 'completed': 100, 'failed': 0}.get(session.status, 0),
+            'progress': session.progress,
             'file_id': str(session.file_id),
             'filename': session.file.filename
-        })
+        }
+        if session.status == 'failed' and session.error_message:
+            data['error'] = session.error_message
+        return Response(data)
     except AnalysisSession.DoesNotExist:
         return Response({'error': 'Сессия не найдена'}, status=status.HTTP_404_NOT_FOUND)
 
 
+# Комментарий-пинг не даёт прокси закрыть поток, пока анализ ничего не присылает
+STREAM_KEEPALIVE_INTERVAL = 15
+STREAM_USER_KEY = 'analysis:streams:user:{}'
+
+_process_streams = 0
+_process_streams_lock = threading.Lock()
+
+
+def _stream_counter_ttl():
+    # Счётчик процесса, упавшего посреди потока, истекает сам
+    return settings.ANALYSIS_STREAM_TIMEOUT * 2 + STREAM_KEEPALIVE_INTERVAL
+
+
+def _acquire_stream_slot(user_id):
+    """
+    Слот SSE-соединения: соединение занимает поток веб-сервера, поэтому их не больше
+    ANALYSIS_STREAM_MAX_PER_PROCESS в процессе и ANALYSIS_STREAM_MAX_PER_USER у пользователя
+    (счётчик в общем кеше). False — пределы исчерпаны.
+    """
+    global _process_streams
+    with _process_streams_lock:
+        if _process_streams >= settings.ANALYSIS_STREAM_MAX_PER_PROCESS:
+            return False
+        _process_streams += 1
+
+    key, ttl = STREAM_USER_KEY.format(user_id), _stream_counter_ttl()
+    cache.add(key, 0, timeout=ttl)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=ttl)
+        count = 1
+    cache.touch(key, ttl)
+    if count > settings.ANALYSIS_STREAM_MAX_PER_USER:
+        _release_stream_slot(user_id)
+        return False
+    return True
+
+
+def _release_stream_slot(user_id):
+    global _process_streams
+    with _process_streams_lock:
+        _process_streams -= 1
+    try:
+        cache.decr(STREAM_USER_KEY.format(user_id))
+    except ValueError:
+        # Счётчик уже истёк
+        pass
+
+
+class SlotEventStream:
+    """
+    События SSE, занимающие слот соединения до закрытия ответа. Django вызывает close()
+    и для потока, который так и не начал читаться, — в отличие от finally в генераторе.
+    """
+
+    def __init__(self, events, user_id):
+        self.events = events
+        self.user_id = user_id
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.events.close()
+        _release_stream_slot(self.user_id)
+
+
+def _analysis_events(session_id, file_id, resume_seq=None):
+    """
+    События анализа для SSE: status при смене статуса или прогресса,
+    partial при новом частичном результате, done по завершении сессии.
+    Соединение живёт не дольше ANALYSIS_STREAM_TIMEOUT, чтобы не занимать поток
+    веб-сервера на весь анализ; клиент переподключается с Last-Event-ID
+    (resume_seq), и уже полученные частичные результаты повторно не отправляются:
+    seq растёт и через повторы сессии.
+    """
+    deadline = time.monotonic() + settings.ANALYSIS_STREAM_TIMEOUT
+    last_state, last_partial, last_sent = None, None, time.monotonic()
+    yield 'retry: 3000\n\n'
+    while True:
+        session = AnalysisSession.objects.filter(pk=session_id).values(
+            'status', 'progress', 'error_message'
+        ).first()
+        if session is None:
+            yield format_event('error', {'error': 'Сессия не найдена'})
+            return
+
+        events = []
+        state = (session['status'], session['progress'])
+        if state != last_state:
+            last_state = state
+            events.append(format_event('status', {'status': state[0], 'progress': state[1]}))
+
+        partial = get_partial(session_id)
+        if partial and partial != last_partial:
+            last_partial = partial
+            if resume_seq is None or partial['seq'] > resume_seq:
+                events.append(format_event('partial', partial, event_id=partial['seq']))
+
+        if session['status'] in ('completed', 'failed'):
+            done = {'status': session['status'], 'file_id': str(file_id)}
+            if session['status'] == 'failed' and session['error_message']:
+                done['error'] = session['error_message']
+            events.append(format_event('done', done))
+            yield ''.join(events)
+            return
+
+        now = time.monotonic()
+        if events:
+            last_sent = now
+            yield ''.join(events)
+        elif now - last_sent >= STREAM_KEEPALIVE_INTERVAL:
+            last_sent = now
+            yield ': ping\n\n'
+        if now >= deadline:
+            # Клиент переподключится с Last-Event-ID или перейдёт на опрос статуса
+            return
+        time.sleep(settings.ANALYSIS_STREAM_POLL_INTERVAL)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([EventStreamRenderer, JSONRenderer])
+def stream_analysis_status(request, session_id):
+    """Статус и частичный результат анализа потоком Server-Sent Events."""
+    try:
+        session = AnalysisSession.objects.only('id', 'file_id').get(id=session_id, file__user=request.user)
+    except AnalysisSession.DoesNotExist:
+        return Response({'error': 'Сессия не найдена'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        resume_seq = int(request.META.get('HTTP_LAST_EVENT_ID', ''))
+    except ValueError:
+        resume_seq = None
+
+    if not _acquire_stream_slot(request.user.pk):
+        response = Response(
+            {'error': 'Слишком много открытых потоков анализа, используйте опрос статуса'},
+            status=status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        response['Retry-After'] = str(settings.ANALYSIS_STREAM_TIMEOUT)
+        return response
+
+    response = StreamingHttpResponse(
+        SlotEventStream(_analysis_events(session.id, session.file_id, resume_seq), request.user.pk),
+        content_type='text/event-stream; charset=utf-8'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Иначе nginx копит поток в буфере и события приходят пачкой в конце
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def retry_analysis(request, file_id):
@@ -282,13 +442,14 @@ def retry_analysis(request, file_id):
         session = AnalysisSession.objects.create(
             file=medical_file,
             model_ml_version='GigaChat-v1.0-retry',
-            status='pending'
+            status='pending',
+            progress=PROGRESS_QUEUED
         )
-        result = _analyze_with_gigachat(medical_file, session)
-        if result['success']:
-            return Response({'message': 'Повторный анализ завершён', 'new_session_id': str(session.id)})
-        else:
-            return Response({'error': result['error']}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        _enqueue_analysis(session)
+        return Response({
+            'message': 'Повторный анализ поставлен в очередь',
+            'new_session_id': str(session.id)
+        }, status=status.HTTP_202_ACCEPTED)
     except MedicalFile.DoesNotExist:
         return Response({'error': 'Файл не найден'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -299,4 +460,60 @@ def analysis_history(request):
     from .serializers import AnalysisSessionSerializer
     sessions = AnalysisSession.objects.filter(file__user=request.user).order_by('-start_time')[:20]
     serializer = AnalysisSessionSerializer(sessions, many=True)
-    return Response(serializer.data)
\ No newline at end of file
+    return Response(serializer.data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def lab_trends(request):
+    """
+    Динамика лабораторных показателей пациента: ?analyte=HGB&analyte=GLU (или через запятую),
+    ?since=ГГГГ-ММ-ДД и ?until=ГГГГ-ММ-ДД ограничивают ряды.
+    """
+    analytes = [
+        code.strip().upper()
+        for value in request.query_params.getlist('analyte')
+        for code in value.split(',') if code.strip()
+    ]
+    bounds = {}
+    for name in ('since', 'until'):
+        value = request.query_params.get(name)
+        if not value:
+            continue
+        day = parse_date(value)
+        if day is None:
+            return Response({'error': f'Неверная дата {name}: {value}'}, status=status.HTTP_400_BAD_REQUEST)
+        bounds[name] = timezone.make_aware(datetime.combine(day, day_time.min if name == 'since' else day_time.max))
+
+    trends = lab_measurements.get_trends(request.user, analytes=analytes, **bounds)
+    return Response({'analytes': trends})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def lab_chart(request, analyte):
+    """Прореженный до ?points точек ряд показателя для графика (?method=lttb|minmax, ?since, ?until)."""
+    analyte = analyte.upper()
+    try:
+        params = charts.parse_chart_params(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def rows():
+        measurements = LabMeasurement.objects.filter(user=request.user, analyte=analyte)
+        if 'since' in params:
+            measurements = measurements.filter(
+                measured_at__gte=timezone.make_aware(datetime.combine(params['since'], day_time.min))
+            )
+        if 'until' in params:
+            measurements = measurements.filter(
+                measured_at__lte=timezone.make_aware(datetime.combine(params['until'], day_time.max))
+            )
+        return measurements.order_by('measured_at').values_list('measured_at', 'value')
+
+    chart = charts.build_chart(request.user.pk, f'lab:{analyte}', rows, **params)
+    known = lab_rules.ANALYTES.get(analyte)
+    return Response({
+        **chart,
+        'name': known['name'] if known else analyte,
+        'unit': lab_rules.UNIT_LABELS[known['units']] if known else '',
+    })
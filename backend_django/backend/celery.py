@@ -0,0 +1,33 @@
+import os
+
+from celery import Celery
+from celery.concurrency import get_implementation
+from celery.signals import worker_init, worker_process_init
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+app = Celery('backend')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+
+
+def forks_children(worker):
+    return get_implementation(worker.pool_cls).__module__ == 'celery.concurrency.prefork'
+
+
+@worker_init.connect
+def warmup_nlp_models(sender, **kwargs):
+    # Главный процесс воркера: модели, допускающие fork, становятся общими для дочерних
+    from analysis.services import nlp_models
+    nlp_models.warmup_before_fork()
+    if not forks_children(sender):
+        # Пулы solo и threads выполняют задачи в этом процессе: worker_process_init не придёт
+        nlp_models.warmup(fork_safe=False)
+        nlp_models.publish()
+
+
+@worker_process_init.connect
+def warmup_process_nlp_models(**kwargs):
+    from analysis.services import nlp_models
+    nlp_models.warmup(fork_safe=False)
+    nlp_models.publish()
@@ -104,14 +104,37 @@ CELERY_ENABLE_UTC = True
 # Настройки для длительных задач
 CELERY_TASK_TIME_LIMIT = 300  # 5 минут максимум на задачу
 CELERY_TASK_SOFT_TIME_LIMIT = 240  # 4 минуты мягкий лимит
-CELERY_TASK_ALWAYS_EAGER = False  # Для тестов можно True
+# Синхронное выполнение задач — только для тестов и локальной отладки без брокера
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', 'False') == 'True'
+CELERY_TASK_EAGER_PROPAGATES = CELERY_TASK_ALWAYS_EAGER
 
 # Очереди
 CELERY_TASK_ROUTES = {
     'analysis.tasks.analyze_file_task': {'queue': 'analysis'},
     'analysis.tasks.cleanup_stuck_sessions': {'queue': 'maintenance'},
+    'files.tasks.generate_derivatives_task': {'queue': 'derivatives'},
 }
 
+CELERY_BEAT_SCHEDULE = {
+    'cleanup-stuck-sessions': {
+        'task': 'analysis.tasks.cleanup_stuck_sessions',
+        'schedule': 600,  # каждые 10 минут
+    },
+}
+
+# Сессия анализа считается зависшей, если не завершилась за это время (сек)
+ANALYSIS_STUCK_SESSION_TIMEOUT = int(os.environ.get('ANALYSIS_STUCK_SESSION_TIMEOUT', 15 * 60))
+
+# История заболеваний: минимальная уверенность состояния и снятие активности
+# с заболеваний, которые не подтвердил более новый анализ
+DISEASE_HISTORY_MIN_CONFIDENCE = float(os.environ.get('DISEASE_HISTORY_MIN_CONFIDENCE', 0.3))
+DISEASE_HISTORY_DEACTIVATE_MISSING = os.environ.get('DISEASE_HISTORY_DEACTIVATE_MISSING', 'False') == 'True'
+
+# Справочник МКБ-10 для кодов состояний: TSV-источник и DAWG-индекс (manage.py build_icd10_index)
+ICD10_SOURCE_PATH = os.environ.get('ICD10_SOURCE_PATH', os.path.join(BASE_DIR, 'diseases', 'data', 'icd10.tsv'))
+ICD10_INDEX_PATH = os.environ.get('ICD10_INDEX_PATH', os.path.join(BASE_DIR, 'diseases', 'data', 'icd10.dawg'))
+ICD10_LEMMA_CACHE_SIZE = 10000  # слов и названий в LRU-кешах лемматизации
+
 # Для Redis
 CELERY_BROKER_TRANSPORT_OPTIONS = {
     'visibility_timeout': 3600,  # 1 час
@@ -119,11 +142,8 @@ CELERY_BROKER_TRANSPORT_OPTIONS = {
 }
 
 
-CELERY_TASK_ALWAYS_EAGER = True  # Задачи выполняются синхронно
-CELERY_TASK_EAGER_PROPAGATES = True  # Исключения пробрасываются
-
-# Отключаем pool для Windows
-CELERY_WORKER_POOL = 'solo'  # Используем solo pool для Windows
+# prefork на Windows не работает: там по умолчанию solo (переопределяется CELERY_WORKER_POOL или --pool)
+CELERY_WORKER_POOL = os.environ.get('CELERY_WORKER_POOL', 'solo' if os.name == 'nt' else 'prefork')
 
 # Application definition
 INSTALLED_APPS = [
@@ -190,6 +210,23 @@ DATABASES = {
     }
 }
 
+# Cache (общий для всех воркеров: токен GigaChat, счётчики и т.п.)
+CACHE_URL = os.environ.get('CACHE_URL')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(BASE_DIR, '.cache'),
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -276,13 +313,100 @@ CORS_ALLOW_HEADERS = [
 
 # File upload settings
 MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50 MB
+MAX_BATCH_FILES = 50  # файлов в одной пакетной загрузке
+
+# Превью файлов (WebP) создаются в фоне один раз на содержимое: MEDIA_ROOT/<FILE_DERIVATIVES_DIR>/<sha256>/
+FILE_DERIVATIVES_DIR = 'derivatives'
+FILE_DERIVATIVE_SIZES = {'thumbnail': 256, 'preview': 1024}  # длинная сторона (px)
+FILE_DERIVATIVE_QUALITY = 80
 
 # GigaChat API settings
 GIGACHAT_AUTHORIZATION_KEY = os.environ.get('GIGACHAT_AUTHORIZATION_KEY', 'MDE5YTlhYzUtMDc4OS03ZmFhLTgwOTMtMGU0MzQ1ZmFjMjEwOmQ3ZGVjM2JjLTk4MjctNDc4MS1hMGY2LTczY2U0NGM1MjYwYw==')
-GIGACHAT_API_URL = 'https://gigachat.devices.sberbank.ru/api/v1'
+GIGACHAT_API_URL = os.environ.get('GIGACHAT_API_URL', 'https://gigachat.devices.sberbank.ru/api/v1')
+GIGACHAT_AUTH_URL = os.environ.get('GIGACHAT_AUTH_URL', 'https://ngw.devices.sberbank.ru:9443/api/v2/oauth')
+GIGACHAT_MODEL = os.environ.get('GIGACHAT_MODEL', 'GigaChat')
+# Как часто процесс сверяется с общим счётчиком изменений промтов (сек)
+PROMPT_REGISTRY_CHECK_INTERVAL = 5
+# Все запросы процесса к GigaChat идут через один цикл событий и один пул соединений
+GIGACHAT_POOL_SIZE = int(os.environ.get('GIGACHAT_POOL_SIZE', 256))  # соединений на процесс
+
+# Повторное использование результатов для того же файла или текста
+# (выключается, чтобы нагрузочный прогон каждый раз доходил до GigaChat)
+ANALYSIS_RESULT_CACHE = os.environ.get('ANALYSIS_RESULT_CACHE', 'True') == 'True'
+
+# Семантический кеш (нужен sentence-transformers): похожий документ того же пациента
+# с теми же числами переиспользует результат, просто похожий — передаётся GigaChat как контекст
+ANALYSIS_SEMANTIC_CACHE = os.environ.get('ANALYSIS_SEMANTIC_CACHE', 'False') == 'True'
+ANALYSIS_SEMANTIC_MODEL = os.environ.get(
+    'ANALYSIS_SEMANTIC_MODEL', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+)
+ANALYSIS_SEMANTIC_REUSE_THRESHOLD = 0.97  # косинусная близость для переиспользования результата
+ANALYSIS_SEMANTIC_CONTEXT_THRESHOLD = 0.85  # близость, с которой прошлое заключение идёт в контекст
+ANALYSIS_SEMANTIC_INDEX_PATH = os.path.join(BASE_DIR, '.cache', 'semantic_index.npz')
+ANALYSIS_SEMANTIC_INDEX_MAX_BYTES = 64 * 1024 * 1024  # сверх этого вытесняются давно не использованные
+
+# NLP-модели (analysis/services/nlp_models.py) загружаются при первом обращении; перечисленные
+# прогреваются при старте воркера Celery — до fork, если модель это допускает
+NLP_WARMUP_MODELS = [
+    name for name in os.environ.get(
+        'NLP_WARMUP_MODELS', 'morph,sentence_embeddings' if ANALYSIS_SEMANTIC_CACHE else 'morph'
+    ).split(',') if name
+]
+NLP_SPACY_MODEL = os.environ.get('NLP_SPACY_MODEL', 'ru_core_news_md')
+
+# Длинные документы анализируются частями параллельно, результаты сливаются
+ANALYSIS_CHUNK_TOKENS = int(os.environ.get('ANALYSIS_CHUNK_TOKENS', 700))  # бюджет текста одной части
+ANALYSIS_MAX_CHUNKS = 12
+ANALYSIS_CHUNK_WORKERS = int(os.environ.get('ANALYSIS_CHUNK_WORKERS', 4))  # одновременных запросов на документ
+
+# Защита от перегрузки GigaChat: адаптивный предел параллельности процесса,
+# повторы с экспоненциальной паузой и размыкатель цепи
+GIGACHAT_MIN_CONCURRENCY = 1
+GIGACHAT_MAX_CONCURRENCY = GIGACHAT_POOL_SIZE
+GIGACHAT_LATENCY_TARGET = float(os.environ.get('GIGACHAT_LATENCY_TARGET', 8))  # сек; медленнее — предел снижается
+GIGACHAT_ADMISSION_TIMEOUT = 30  # сколько запрос ждёт свободного слота (сек)
+GIGACHAT_MAX_RETRIES = 3
+GIGACHAT_RETRY_BASE_DELAY = 1.0
+GIGACHAT_RETRY_MAX_DELAY = 30
+GIGACHAT_BREAKER_FAILURES = 5  # неудачных вызовов подряд до размыкания
+GIGACHAT_BREAKER_COOLDOWN = 30  # пауза перед пробным запросом (сек)
+GIGACHAT_BREAKER_SYNC_INTERVAL = 1  # как часто процесс перечитывает общее состояние цепи (сек)
+ANALYSIS_LATENCY_FLUSH_INTERVAL = 2  # как часто замеры длительности процесса переносятся в кеш (сек)
+ANALYSIS_MAX_REQUEUES = 5  # сколько раз сессия возвращается в очередь, пока GigaChat недоступен
+
+# Потоковые ответы GigaChat: частичный результат виден клиенту через SSE до конца анализа
+GIGACHAT_STREAMING = os.environ.get('GIGACHAT_STREAMING', 'True') == 'True'
+ANALYSIS_PARTIAL_INTERVAL = 0.3  # не чаще этого публикуется частичный результат (сек)
+ANALYSIS_PARTIAL_TTL = 10 * 60
+ANALYSIS_STREAM_POLL_INTERVAL = 0.5  # как часто SSE-поток проверяет сессию (сек)
+# Предел жизни SSE-соединения (сек): оно занимает поток веб-сервера, поэтому короткое,
+# а клиент переподключается с Last-Event-ID до события done
+ANALYSIS_STREAM_TIMEOUT = int(os.environ.get('ANALYSIS_STREAM_TIMEOUT', 25))
+# Сверх этих пределов SSE-соединение не открывается (429), клиент переходит на опрос статуса
+ANALYSIS_STREAM_MAX_PER_USER = int(os.environ.get('ANALYSIS_STREAM_MAX_PER_USER', 3))
+ANALYSIS_STREAM_MAX_PER_PROCESS = int(os.environ.get('ANALYSIS_STREAM_MAX_PER_PROCESS', 50))
+
+# Бланки анализов с таблицей показателей проверяются по референсам без GigaChat
+ANALYSIS_LAB_RULES = os.environ.get('ANALYSIS_LAB_RULES', 'True') == 'True'
+ANALYSIS_LAB_MIN_ANALYTES = 3  # меньше распознанных показателей — документ уходит в GigaChat
+ANALYSIS_LAB_BORDERLINE_MARGIN = 0.05  # доля границы нормы, в пределах которой значение пограничное
+ANALYSIS_LAB_NARRATIVE_WORDS = 40  # больше слов связного текста (заключения) — нужен GigaChat
+
+# Графики: ряд прореживается на сервере до запрошенного числа точек и кешируется до записи
+CHART_DEFAULT_POINTS = 300
+CHART_MIN_POINTS = 10
+CHART_MAX_POINTS = 2000
+CHART_CACHE_TTL = 60 * 60
+
+# Число процессов для постраничного разбора PDF (1 — последовательно)
+PDF_EXTRACTION_WORKERS = int(os.environ.get('PDF_EXTRACTION_WORKERS', min(4, os.cpu_count() or 1)))
 
 # Для Tesseract OCR (опционально)
 TESSERACT_CMD = os.environ.get('TESSERACT_CMD', '/usr/bin/tesseract')
+OCR_TARGET_DPI = 300  # изображения с большим DPI уменьшаются до этого значения
+OCR_MAX_SIDE = int(os.environ.get('OCR_MAX_SIDE', 3000))  # предел длинной стороны, если DPI неизвестен
+OCR_REGION_HEIGHT = 1000  # высота полосы для параллельного распознавания (px)
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', os.cpu_count() or 1))
 
 # Настройки SSL (для локальной разработки)
 import ssl
@@ -3,7 +3,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
-from analysis.admin_api import AIPromptViewSet, UserViewSet, AdminDashboardView
+from analysis.admin_api import AIPromptViewSet, UserViewSet, AdminDashboardView, NlpModelsDiagnosticsView
 
 router = DefaultRouter()
 router.register(r'admin/prompts', AIPromptViewSet, basename='admin-prompt')
@@ -18,6 +18,7 @@ urlpatterns = [
     path('api/diseases/', include('diseases.urls')),
     
     path('api/admin/dashboard/', AdminDashboardView.as_view(), name='admin-dashboard'),
+    path('api/admin/diagnostics/nlp/', NlpModelsDiagnosticsView.as_view(), name='admin-nlp-diagnostics'),
     path('api/admin/', include(router.urls)),
     
     path('api/journal/', include('journal.urls')),
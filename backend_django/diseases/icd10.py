@@ -0,0 +1,199 @@
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+
+from analysis.services import nlp_models
+
+logger = logging.getLogger(__name__)
+
+ICD10_CODE_RE = re.compile(r'^[A-Z]\d{2}(\.\d{1,2})?$')
+UNDOTTED_CODE_RE = re.compile(r'^[A-Z]\d{3,4}$')
+MISSING_CODES = {'', 'UNKNOWN', 'NONE', 'NULL', 'N/A'}
+WORD_RE = re.compile(r'[a-zа-яё0-9]+')
+
+# Пространства ключей в одном индексе: код -> название, набор лемм -> код, лемма словаря
+CODE_PREFIX = 'c:'
+NAME_PREFIX = 'n:'
+WORD_PREFIX = 'w:'
+
+# Уточнения, не меняющие код: «анемия легкой степени» — та же анемия
+STOP_LEMMAS = {
+    'и', 'в', 'на', 'по', 'неуточнённый', 'неуточненный', 'степень', 'лёгкий', 'легкий',
+    'умеренный', 'выраженный', 'незначительный', 'тяжёлый', 'тяжелый', 'признак',
+}
+
+_index = None
+_lock = threading.Lock()
+
+
+def canonical_code(code):
+    """Код в каноническом виде («d 649» -> «D64.9») или '' для отсутствующего и некорректного."""
+    code = str(code or '').strip().upper().replace(' ', '').replace(',', '.')
+    if code in MISSING_CODES:
+        return ''
+    if UNDOTTED_CODE_RE.match(code):
+        code = f"{code[:3]}.{code[3:]}"
+    return code if ICD10_CODE_RE.match(code) else ''
+
+
+@lru_cache(maxsize=settings.ICD10_LEMMA_CACHE_SIZE)
+def lemmatize(word):
+    """Нормальная форма слова; ё приводится к е, как в названиях из разных источников."""
+    return nlp_models.get('morph').parse(word)[0].normal_form.replace('ё', 'е')
+
+
+def lemmas(name):
+    """Множество лемм названия без уточнений из STOP_LEMMAS."""
+    return {lemmatize(word) for word in WORD_RE.findall(str(name or '').lower())} - STOP_LEMMAS
+
+
+def name_key(words):
+    """Ключ названия не зависит от порядка слов: «анемия железодефицитная» == «железодефицитная анемия»."""
+    return ' '.join(sorted(words))
+
+
+def read_source(path):
+    """Строки справочника: код, название и синонимы через «;» (TSV, # — комментарий)."""
+    with open(path, encoding='utf-8') as source:
+        for line in source:
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            code, name, *rest = line.split('\t')
+            synonyms = [synonym.strip() for synonym in (rest[0] if rest else '').split(';') if synonym.strip()]
+            yield canonical_code(code), name.strip(), synonyms
+
+
+def index_items(rows):
+    """
+    Пары (ключ, значение) индекса. Если одно название встречается у нескольких
+    кодов, остаётся первый по порядку справочника.
+    """
+    items = {}
+    for code, name, synonyms in rows:
+        if not code:
+            continue
+        items.setdefault(CODE_PREFIX + code, name.encode())
+        for title in (name, *synonyms):
+            words = lemmas(title)
+            if not words:
+                continue
+            items.setdefault(NAME_PREFIX + name_key(words), code.encode())
+            for word in words:
+                items.setdefault(WORD_PREFIX + word, b'')
+    return list(items.items())
+
+
+def build_index(source_path=None, index_path=None):
+    """Собирает DAWG-файл индекса из справочника; нужен пакет DAWG2. Возвращает число ключей."""
+    import dawg
+
+    source_path = source_path or settings.ICD10_SOURCE_PATH
+    index_path = index_path or settings.ICD10_INDEX_PATH
+    items = index_items(read_source(source_path))
+    # Файл, отображённый в память работающими процессами, не перезаписывается на месте, а заменяется
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    dawg.BytesDAWG(items).save(tmp_path)
+    os.replace(tmp_path, index_path)
+    return len(items)
+
+
+def map_index(index_path):
+    """
+    BytesDAWG поверх mmap файла индекса. DAWG2-Python умеет только читать массивы
+    переходов в память (array.fromfile), поэтому те же массивы подставляются как
+    memoryview над отображённым файлом: страницы читаются по первому обращению
+    и общие у всех процессов. Раскладка файла — словарь, затем guide (версия пакета закреплена).
+    """
+    import dawg_python
+    from dawg_python import wrapper
+
+    with open(index_path, 'rb') as source:
+        mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    dct_size, = struct.unpack_from('=I', mapped, 0)
+    guide_start = 4 + dct_size * 4
+    guide_size, = struct.unpack_from('=I', mapped, guide_start)
+    guide_end = guide_start + 4 + guide_size * 2
+    if guide_end > len(mapped):
+        raise ValueError(f'Индекс МКБ-10 {index_path} повреждён')
+
+    view = memoryview(mapped)
+    index = dawg_python.BytesDAWG()
+    index.dct, index.guide = wrapper.Dictionary(), wrapper.Guide()
+    index.dct._units = view[4:guide_start].cast('I')
+    index.guide._units = view[guide_start + 4:guide_end]
+    return index
+
+
+def load_index(index_path=None, source_path=None):
+    """
+    Индекс для поиска: собранный DAWG-файл отображается в память (map_index).
+    Без файла индекс строится в памяти из справочника — медленнее на старте, тот же результат.
+    """
+    index_path = index_path or settings.ICD10_INDEX_PATH
+    if os.path.exists(index_path):
+        return map_index(str(index_path))
+
+    logger.warning(f"⚠️ Индекс МКБ-10 {index_path} не собран, справочник загружается в память")
+    index = {}
+    for key, value in index_items(read_source(source_path or settings.ICD10_SOURCE_PATH)):
+        index[key] = [value]
+    return index
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = load_index()
+    return _index
+
+
+def reload_index():
+    """Перечитывает индекс после пересборки и сбрасывает кеш разрешённых названий."""
+    global _index
+    with _lock:
+        _index = None
+    resolve_name.cache_clear()
+
+
+@lru_cache(maxsize=settings.ICD10_LEMMA_CACHE_SIZE)
+def resolve_name(name):
+    """
+    Код по названию: сначала по всем леммам, затем только по словам из словаря
+    справочника («анемия неясного генеза» -> «анемия»). None, если не найдено.
+    """
+    index = get_index()
+    words = lemmas(name)
+    if not words:
+        return None
+    values = index.get(NAME_PREFIX + name_key(words))
+    if not values:
+        known = {word for word in words if WORD_PREFIX + word in index}
+        if not known or known == words:
+            return None
+        values = index.get(NAME_PREFIX + name_key(known))
+    return values[0].decode() if values else None
+
+
+def resolve_code(code, name):
+    """
+    Канонический код МКБ-10 состояния или None. Код модели принимается, если он есть
+    в справочнике; рубрика без подрубрики («D64») дополняется «.9», если такой код есть.
+    Неизвестный справочнику код уступает коду по названию, но без него остаётся как есть.
+    """
+    code = canonical_code(code)
+    index = get_index()
+    if code:
+        if CODE_PREFIX + code in index:
+            return code
+        if '.' not in code and CODE_PREFIX + code + '.9' in index:
+            return code + '.9'
+    return resolve_name(str(name or '')) or code or None
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from diseases import icd10
+
+
+class Command(BaseCommand):
+    help = 'Собирает DAWG-индекс справочника МКБ-10 для разрешения кодов по названиям состояний'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', help='TSV-справочник (по умолчанию ICD10_SOURCE_PATH)')
+        parser.add_argument('--output', help='Файл индекса (по умолчанию ICD10_INDEX_PATH)')
+
+    def handle(self, *args, **options):
+        try:
+            keys = icd10.build_index(options['source'], options['output'])
+        except ImportError:
+            raise CommandError('Для сборки индекса нужен пакет DAWG2: pip install DAWG2')
+        self.stdout.write(self.style.SUCCESS(f'Ключей в индексе МКБ-10: {keys}'))
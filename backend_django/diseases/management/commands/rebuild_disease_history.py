@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from diseases.services import rebuild_disease_history
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает историю заболеваний из сохранённых результатов анализа'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Строк DetectedCondition в одной пачке')
+        parser.add_argument('--user', action='append', dest='users', help='Пересобрать только для этого пользователя (UUID)')
+        parser.add_argument(
+            '--deactivate-missing', action='store_true', default=None,
+            help='Пометить неактивными заболевания, не подтверждённые последним анализом'
+        )
+
+    def handle(self, *args, **options):
+        upserted = rebuild_disease_history(
+            batch_size=options['batch_size'],
+            deactivate=options['deactivate_missing'],
+            user_ids=options['users'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Записей истории обновлено: {upserted}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from diseases.services import rekey_disease_records
+
+
+class Command(BaseCommand):
+    help = 'Переводит записи истории заболеваний с ключей NAME_ на коды МКБ-10 из справочника'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Записей истории в одной пачке')
+        parser.add_argument('--user', action='append', dest='users', help='Только для этого пользователя (UUID)')
+        parser.add_argument(
+            '--all', action='store_true', dest='all_records',
+            help='Проверить все записи, а не только с ключом NAME_'
+        )
+
+    def handle(self, *args, **options):
+        rekeyed, merged = rekey_disease_records(
+            batch_size=options['batch_size'],
+            user_ids=options['users'],
+            all_records=options['all_records'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Записей перенесено на коды МКБ-10: {rekeyed}, слито: {merged}'))
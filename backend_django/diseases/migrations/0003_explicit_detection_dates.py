@@ -0,0 +1,24 @@
+# Generated by Django 4.2.13 on 2026-10-18 18:51
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("diseases", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="diseaserecord",
+            name="first_detected",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name="diseaserecord",
+            name="last_detected",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
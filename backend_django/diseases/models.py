@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 import uuid
 from users.models import User
 from analysis.models import AnalysisSession
@@ -18,8 +19,9 @@ class DiseaseRecord(models.Model):
     disease_code = models.CharField(max_length=50)
     disease_name = models.CharField(max_length=255)
     
-    first_detected = models.DateTimeField(auto_now_add=True)
-    last_detected = models.DateTimeField(auto_now=True)
+    # Время задаётся явно: пересборка истории восстанавливает исторические даты
+    first_detected = models.DateTimeField(default=timezone.now)
+    last_detected = models.DateTimeField(default=timezone.now)
     
     is_active = models.BooleanField(default=True)
 
@@ -1,22 +1,235 @@
-from .models import DiseaseRecord
-from django.utils import timezone
+from django.conf import settings
 from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from analysis.models import AnalysisResult, DetectedCondition
+from . import icd10
+from .models import DiseaseRecord
+
+UPSERT_FIELDS = ['disease_name', 'last_analysis', 'last_detected', 'is_active']
+
+
+def normalize_code(code, name):
+    """
+    Ключ записи истории: код МКБ-10 в каноническом виде — от модели или найденный
+    по названию в справочнике (icd10), а если не найден — NAME_<название в нижнем регистре>.
+    """
+    resolved = icd10.resolve_code(code, name)
+    if resolved:
+        return resolved
+    name_key = '_'.join(str(name or '').lower().split()) or 'unknown'
+    return f"NAME_{name_key}"[:50]
+
+
+def resolve_conditions(conditions, min_confidence=None):
+    """
+    Приводит состояния одного анализа к {код: (уверенность, название)} за один проход:
+    отбрасывает неуверенные и схлопывает повторы кода до самого уверенного.
+    Принимает как ответы модели, так и строки DetectedCondition в виде словарей.
+    """
+    if min_confidence is None:
+        min_confidence = settings.DISEASE_HISTORY_MIN_CONFIDENCE
+
+    resolved = {}
+    for condition in conditions:
+        confidence = float(condition.get('confidence') or 0.0)
+        if confidence < min_confidence:
+            continue
+        name = condition.get('condition_name') or condition.get('name') or 'Неизвестное состояние'
+        code = normalize_code(condition.get('code') or condition.get('condition_code'), name)
+        if code in resolved and resolved[code][0] >= confidence:
+            continue
+        resolved[code] = (confidence, str(name)[:255])
+    return resolved
+
+
+def upsert_records(records):
+    """Один INSERT ... ON CONFLICT (user, disease_code) DO UPDATE для списка DiseaseRecord."""
+    if not records:
+        return 0
+    DiseaseRecord.objects.bulk_create(
+        records,
+        update_conflicts=True,
+        unique_fields=['user', 'disease_code'],
+        update_fields=UPSERT_FIELDS,
+    )
+    return len(records)
+
+
+def deactivate_missing(user_id, codes, detected_at):
+    """Снимает активность с заболеваний, которых нет в более новом анализе."""
+    return DiseaseRecord.objects.filter(
+        user_id=user_id,
+        is_active=True,
+        last_detected__lt=detected_at,
+    ).exclude(disease_code__in=codes).update(is_active=False)
+
+
+def update_disease_history(user, conditions, session=None, detected_at=None, deactivate=None):
+    """
+    Обновляет историю заболеваний пользователя по всем состояниям одного анализа.
+    При deactivate (по умолчанию DISEASE_HISTORY_DEACTIVATE_MISSING) заболевания,
+    не подтверждённые этим анализом, помечаются неактивными.
+    """
+    detected_at = detected_at or timezone.now()
+    if deactivate is None:
+        deactivate = settings.DISEASE_HISTORY_DEACTIVATE_MISSING
+
+    resolved = resolve_conditions(conditions)
+    records = [
+        DiseaseRecord(
+            user=user,
+            disease_code=code,
+            disease_name=name,
+            last_analysis=session,
+            first_detected=detected_at,
+            last_detected=detected_at,
+            is_active=True,
+        )
+        for code, (_, name) in resolved.items()
+    ]
 
-def update_disease_history(user_id, detected_conditions):
+    # Внутри транзакции сохранения результата лишняя точка сохранения не нужна
+    with transaction.atomic(savepoint=False):
+        upsert_records(records)
+        if deactivate:
+            deactivate_missing(user.pk, list(resolved), detected_at)
+    return len(records)
+
+
+def _flush_rebuild_batch(rows):
+    """
+    Сводит пачку строк DetectedCondition (в хронологическом порядке) к записям
+    истории: внутри анализа — самое уверенное состояние по коду, между анализами —
+    самое позднее. first_detected при конфликте не обновляется и остаётся от
+    первого анализа, в котором заболевание встретилось.
+    """
+    sessions = {}
+    for row in rows:
+        sessions.setdefault(row['result__session_id'], []).append(row)
+
+    records = {}
+    for session_id, session_rows in sessions.items():
+        user_id = session_rows[0]['result__session__file__user_id']
+        detected_at = max(row['detected_at'] for row in session_rows)
+        for code, (_, name) in resolve_conditions(session_rows).items():
+            key = user_id, code
+            first_detected = records[key].first_detected if key in records else detected_at
+            records[key] = DiseaseRecord(
+                user_id=user_id,
+                disease_code=code,
+                disease_name=name,
+                last_analysis_id=session_id,
+                first_detected=first_detected,
+                last_detected=detected_at,
+                is_active=True,
+            )
+    return upsert_records(list(records.values()))
+
+
+def rebuild_disease_history(batch_size=1000, deactivate=None, user_ids=None):
+    """
+    Пересобирает DiseaseRecord из истории DetectedCondition пачками по batch_size строк.
+    Ручные отметки неактивности при этом сбрасываются. Возвращает число upsert-строк.
+    """
+    if deactivate is None:
+        deactivate = settings.DISEASE_HISTORY_DEACTIVATE_MISSING
+
+    conditions = DetectedCondition.objects.filter(
+        confidence__gte=settings.DISEASE_HISTORY_MIN_CONFIDENCE
+    )
+    records = DiseaseRecord.objects.all()
+    if user_ids:
+        conditions = conditions.filter(result__session__file__user_id__in=user_ids)
+        records = records.filter(user_id__in=user_ids)
+
+    rows = conditions.order_by('detected_at', 'result__session_id').values(
+        'result__session_id', 'result__session__file__user_id',
+        'condition_code', 'condition_name', 'confidence', 'detected_at',
+    )
+
+    upserted = 0
     with transaction.atomic():
-        for cond in detected_conditions:
-            if cond['confidence'] > 0.5:
-                record, created = DiseaseRecord.objects.get_or_create(
-                    user_id=user_id,
-                    disease_code=cond['condition_code'],
-                    defaults={
-                        'disease_name': cond['condition_name'],
-                        'first_detected': timezone.now(),
-                        'last_detected': timezone.now(),
-                        'is_active': True
-                    }
+        records.delete()
+        batch, last_session = [], None
+        for row in rows.iterator(chunk_size=batch_size):
+            # Пачку режем только на границе анализа, чтобы не разорвать его состояния
+            if len(batch) >= batch_size and row['result__session_id'] != last_session:
+                upserted += _flush_rebuild_batch(batch)
+                batch = []
+            batch.append(row)
+            last_session = row['result__session_id']
+        upserted += _flush_rebuild_batch(batch)
+
+        if deactivate:
+            latest_result = AnalysisResult.objects.filter(
+                session__file__user_id=OuterRef('user_id')
+            ).order_by('-created_at').values('created_at')[:1]
+            records.filter(last_detected__lt=Subquery(latest_result)).update(is_active=False)
+    return upserted
+
+
+def _merge_records(target, source):
+    """Сливает запись source в target: ранняя дата первого выявления, поздний анализ, активность любой."""
+    target.first_detected = min(target.first_detected, source.first_detected)
+    if source.last_detected > target.last_detected:
+        target.last_detected = source.last_detected
+        target.last_analysis_id = source.last_analysis_id
+        target.disease_name = source.disease_name
+    target.is_active = target.is_active or source.is_active
+
+
+def rekey_disease_records(batch_size=1000, user_ids=None, all_records=False):
+    """
+    Переводит записи истории на коды МКБ-10 из справочника: записи с ключом NAME_
+    (при all_records — все) разрешаются заново по коду и названию. Если у пользователя
+    уже есть запись с новым кодом, записи сливаются в одну. Возвращает (перенесено, слито).
+    """
+    records = DiseaseRecord.objects.all()
+    if not all_records:
+        records = records.filter(disease_code__startswith='NAME_')
+    if user_ids:
+        records = records.filter(user_id__in=user_ids)
+    ids = list(records.order_by('user_id', 'last_detected').values_list('id', flat=True))
+
+    rekeyed = merged = 0
+    with transaction.atomic():
+        for start in range(0, len(ids), batch_size):
+            batch = list(DiseaseRecord.objects.filter(id__in=ids[start:start + batch_size]).order_by('last_detected'))
+            codes = {
+                record.pk: normalize_code('' if record.disease_code.startswith('NAME_') else record.disease_code,
+                                          record.disease_name)
+                for record in batch
+            }
+            targets = {
+                (record.user_id, record.disease_code): record
+                for record in DiseaseRecord.objects.filter(
+                    user_id__in={record.user_id for record in batch},
+                    disease_code__in=set(codes.values()),
                 )
-                if not created:
-                    record.last_detected = timezone.now()
-                    record.is_active = True
-                    record.save()
\ No newline at end of file
+            }
+
+            changed, removed = {}, []
+            for record in batch:
+                code = codes[record.pk]
+                if code == record.disease_code:
+                    continue
+                key = record.user_id, code
+                if key in targets:
+                    _merge_records(targets[key], record)
+                    changed[targets[key].pk] = targets[key]
+                    removed.append(record.pk)
+                else:
+                    record.disease_code = code
+                    targets[key] = changed[record.pk] = record
+                    rekeyed += 1
+
+            # Сначала удаление: освобождает (user, disease_code) до переименования
+            DiseaseRecord.objects.filter(id__in=removed).delete()
+            DiseaseRecord.objects.bulk_update(
+                list(changed.values()),
+                ['disease_code', 'disease_name', 'first_detected', 'last_detected', 'last_analysis', 'is_active'],
+            )
+            merged += len(removed)
+    return rekeyed, merged
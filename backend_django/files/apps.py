@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class FilesConfig(AppConfig):
+    name = 'files'
+
+    def ready(self):
+        from . import signals  # noqa: F401
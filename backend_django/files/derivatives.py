@@ -0,0 +1,139 @@
+import hashlib
+import logging
+import os
+import shutil
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from analysis.services.prompt_registry import file_type_for
+
+logger = logging.getLogger(__name__)
+
+# Меняется вместе с отрисовкой: производные старой версии не переиспользуются
+DERIVATIVES_VERSION = 1
+RENDERED_TYPES = ('image', 'pdf', 'dicom')
+
+
+def ensure_content_hash(medical_file):
+    """SHA-256 содержимого; у файлов, загруженных до его появления, считается и сохраняется."""
+    if not medical_file.content_hash:
+        digest = hashlib.sha256()
+        with open(medical_file.storage_path, 'rb') as source:
+            for chunk in iter(lambda: source.read(1024 * 1024), b''):
+                digest.update(chunk)
+        medical_file.content_hash = digest.hexdigest()
+        type(medical_file).objects.filter(pk=medical_file.pk).update(content_hash=medical_file.content_hash)
+    return medical_file.content_hash
+
+
+def derivative_dir(content_hash):
+    return os.path.join(settings.MEDIA_ROOT, settings.FILE_DERIVATIVES_DIR, content_hash[:2], content_hash)
+
+
+def derivative_name(kind):
+    return f"{kind}-{settings.FILE_DERIVATIVE_SIZES[kind]}-v{DERIVATIVES_VERSION}.webp"
+
+
+def derivative_path(content_hash, kind):
+    """Путь производной по содержимому файла: одинаковые файлы разных загрузок делят одно превью."""
+    return os.path.join(derivative_dir(content_hash), derivative_name(kind))
+
+
+def derivative_url(medical_file, kind):
+    """URL готовой производной или None, пока она не создана (или у файла нет превью)."""
+    content_hash = medical_file.content_hash
+    if not content_hash or not os.path.exists(derivative_path(content_hash, kind)):
+        return None
+    return (
+        f"{settings.MEDIA_URL}{settings.FILE_DERIVATIVES_DIR}/"
+        f"{content_hash[:2]}/{content_hash}/{derivative_name(kind)}"
+    )
+
+
+def _open_image(path, side):
+    image = Image.open(path)
+    # JPEG декодируется сразу уменьшенным в 2–8 раз: фото с телефона не разворачивается целиком
+    image.draft('RGB', (side, side))
+    return ImageOps.exif_transpose(image)
+
+
+def _render_pdf_page(path, side):
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(path)
+    try:
+        page = pdf[0]
+        width, height = page.get_size()
+        # Первая страница отрисовывается сразу в нужном размере, без промежуточного растра
+        return page.render(scale=side / max(width, height)).to_pil().convert('RGB')
+    finally:
+        pdf.close()
+
+
+def _render_dicom(path, side):
+    from analysis.services.dicom import NoPixelData, display_frame
+    try:
+        return Image.fromarray(display_frame(path, max_side=side))
+    except NoPixelData:
+        return None
+
+
+RENDERERS = {
+    'image': _open_image,
+    'pdf': _render_pdf_page,
+    'dicom': _render_dicom,
+}
+
+
+def render(medical_file, side):
+    """Изображение источника с длинной стороной не больше side или None для файлов без превью."""
+    file_type = file_type_for(medical_file.mime_type, medical_file.filename)
+    if file_type not in RENDERED_TYPES:
+        return None
+    image = RENDERERS[file_type](medical_file.storage_path, side)
+    if image is None:
+        return None
+    image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+    image.thumbnail((side, side), Image.LANCZOS, reducing_gap=3.0)
+    return image
+
+
+def _save(image, path):
+    # Запись во временный файл и замена: параллельная задача не увидит превью наполовину
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    image.save(tmp_path, 'WEBP', quality=settings.FILE_DERIVATIVE_QUALITY, method=4)
+    os.replace(tmp_path, path)
+
+
+def generate(medical_file, force=False):
+    """
+    Создаёт недостающие производные файла (повторный вызов ничего не делает, force —
+    пересоздать). Источник открывается один раз: превью рисуется из него,
+    миниатюра — из превью. Возвращает имена созданных производных.
+    """
+    content_hash = ensure_content_hash(medical_file)
+    kinds = sorted(settings.FILE_DERIVATIVE_SIZES, key=settings.FILE_DERIVATIVE_SIZES.get, reverse=True)
+    missing = [kind for kind in kinds if force or not os.path.exists(derivative_path(content_hash, kind))]
+    if not missing:
+        return []
+
+    image = render(medical_file, settings.FILE_DERIVATIVE_SIZES[missing[0]])
+    if image is None:
+        return []
+    os.makedirs(derivative_dir(content_hash), exist_ok=True)
+    for kind in missing:
+        image.thumbnail((settings.FILE_DERIVATIVE_SIZES[kind],) * 2, Image.LANCZOS)
+        _save(image, derivative_path(content_hash, kind))
+    logger.info(f"🖼️ Превью файла {medical_file.filename} созданы: {', '.join(missing)}")
+    return missing
+
+
+def discard(medical_file):
+    """Удаляет производные, если других файлов с тем же содержимым не осталось."""
+    content_hash = medical_file.content_hash
+    if not content_hash:
+        return
+    if type(medical_file).objects.filter(content_hash=content_hash).exclude(pk=medical_file.pk).exists():
+        return
+    shutil.rmtree(derivative_dir(content_hash), ignore_errors=True)
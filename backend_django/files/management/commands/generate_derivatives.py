@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from files import derivatives
+from files.models import MedicalFile
+
+
+class Command(BaseCommand):
+    help = 'Создаёт недостающие миниатюры и превью файлов (готовые производные не пересоздаются)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users', help='Только для этого пользователя (UUID)')
+        parser.add_argument('--force', action='store_true', help='Пересоздать и уже готовые производные')
+
+    def handle(self, *args, **options):
+        files = MedicalFile.objects.order_by('upload_date')
+        if options['users']:
+            files = files.filter(user_id__in=options['users'])
+
+        created = failed = 0
+        for medical_file in files.iterator():
+            try:
+                created += bool(derivatives.generate(medical_file, force=options['force']))
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'{medical_file.id} ({medical_file.filename}): {e}')
+        self.stdout.write(self.style.SUCCESS(f'Файлов с новыми превью: {created}, ошибок: {failed}'))
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.13 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="medicalfile",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, db_index=True, default="", max_length=64
+            ),
+        ),
+    ]
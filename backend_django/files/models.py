@@ -10,6 +10,7 @@ class MedicalFile(models.Model):
     filesize = models.IntegerField()
     mime_type = models.CharField(max_length=100)
     storage_path = models.CharField(max_length=500)
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
     
     upload_date = models.DateTimeField(auto_now_add=True)
     description = models.TextField(blank=True, null=True)
@@ -2,17 +2,21 @@ from rest_framework import serializers
 from django.core.exceptions import ValidationError
 from django.conf import settings
 import os
+from . import derivatives
 from .models import MedicalFile
 
 class MedicalFileSerializer(serializers.ModelSerializer):
     file_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+    preview_url = serializers.SerializerMethodField()
     file_size_mb = serializers.SerializerMethodField()
     
     class Meta:
         model = MedicalFile
         fields = ['id', 'filename', 'filesize', 'file_size_mb', 'mime_type', 
-                 'upload_date', 'file_url', 'is_processed', 'description']
-        read_only_fields = ['id', 'upload_date', 'file_url', 'is_processed', 'file_size_mb']
+                 'upload_date', 'file_url', 'thumbnail_url', 'preview_url', 'is_processed', 'description']
+        read_only_fields = ['id', 'upload_date', 'file_url', 'thumbnail_url', 'preview_url',
+                            'is_processed', 'file_size_mb']
     
     def get_file_url(self, obj):
         """Получение URL файла"""
@@ -20,6 +24,13 @@ class MedicalFileSerializer(serializers.ModelSerializer):
         if obj.storage_path and request:
             return f"/media/{obj.storage_path.split('media/')[-1]}" if 'media/' in obj.storage_path else obj.storage_path
         return None
+
+    def get_thumbnail_url(self, obj):
+        """Миниатюра для списков; None, пока превью не готово или для файлов без превью"""
+        return derivatives.derivative_url(obj, 'thumbnail')
+
+    def get_preview_url(self, obj):
+        return derivatives.derivative_url(obj, 'preview')
     
     def get_file_size_mb(self, obj):
         if obj.filesize:
@@ -0,0 +1,11 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from . import derivatives
+from .models import MedicalFile
+
+
+@receiver(post_delete, sender=MedicalFile)
+def discard_derivatives(sender, instance, **kwargs):
+    transaction.on_commit(lambda: derivatives.discard(instance))
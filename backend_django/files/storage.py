@@ -0,0 +1,44 @@
+import hashlib
+import os
+import uuid
+
+from django.conf import settings
+
+
+def user_upload_dir(user):
+    path = os.path.join(settings.MEDIA_ROOT, 'uploads', str(user.id))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def discard_uploaded_file(uploaded_file):
+    """Удаляет файл, записанный потоковым обработчиком, если запрос отклонён."""
+    if hasattr(uploaded_file, 'discard'):
+        uploaded_file.discard()
+
+
+def discard_request_files(request):
+    for _, files in request.FILES.lists():
+        for uploaded_file in files:
+            discard_uploaded_file(uploaded_file)
+
+
+def save_uploaded_file(uploaded_file, user):
+    """
+    Сохраняет загруженный файл в uploads/<user_id>/ и по ходу записи
+    считает SHA-256 содержимого. Возвращает (путь, хеш).
+    Файл, уже записанный потоковым обработчиком, повторно не копируется.
+    """
+    if getattr(uploaded_file, 'content_hash', None) and getattr(uploaded_file, 'storage_path', None):
+        return uploaded_file.storage_path, uploaded_file.content_hash
+
+    ext = os.path.splitext(uploaded_file.name)[1].lower()
+    full_path = os.path.join(user_upload_dir(user), f"{uuid.uuid4()}{ext}")
+
+    digest = hashlib.sha256()
+    with open(full_path, 'wb+') as destination:
+        for chunk in uploaded_file.chunks():
+            digest.update(chunk)
+            destination.write(chunk)
+
+    return full_path, digest.hexdigest()
@@ -0,0 +1,36 @@
+import logging
+
+from celery import group, shared_task
+from django.db import transaction
+
+from . import derivatives
+from .models import MedicalFile
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def generate_derivatives_task(file_id):
+    """Фоновое создание миниатюры и превью загруженного файла."""
+    try:
+        medical_file = MedicalFile.objects.get(id=file_id)
+    except MedicalFile.DoesNotExist:
+        logger.warning(f"Файл {file_id} не найден, превью не создаются")
+        return
+
+    try:
+        derivatives.generate(medical_file)
+    except Exception as e:
+        # Повтор не поможет повреждённому файлу; список покажет файл без превью
+        logger.warning(f"⚠️ Не удалось создать превью файла {medical_file.filename}: {e}")
+
+
+def schedule_derivatives(medical_files):
+    """
+    Ставит создание превью загруженных файлов в очередь после фиксации транзакции.
+    Вызывается из каждого пути загрузки: bulk_create пакета не шлёт post_save.
+    """
+    file_ids = [str(medical_file.id) for medical_file in medical_files]
+    transaction.on_commit(
+        lambda: group(generate_derivatives_task.s(file_id) for file_id in file_ids).apply_async()
+    )
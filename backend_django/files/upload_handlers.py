@@ -0,0 +1,260 @@
+import codecs
+import hashlib
+import os
+import uuid
+
+from django.conf import settings
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (
+    FileUploadHandler,
+    StopFutureHandlers,
+    StopUpload,
+)
+from rest_framework.parsers import MultiPartParser
+
+from .storage import user_upload_dir
+
+# Поля формы, файлы из которых принимаются потоковым обработчиком
+UPLOAD_FIELDS = ('file', 'files')
+
+# Сколько байт начала файла нужно для определения формата (DICOM: 128 + 'DICM')
+SNIFF_SIZE = 132
+
+# Запас на заголовки multipart и текстовые поля формы
+MULTIPART_OVERHEAD = 1024 * 1024
+
+DOCX_MIME_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Расширение -> допустимый MIME-тип, определяемый по содержимому
+EXTENSION_TYPES = {
+    'pdf': 'application/pdf',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'bmp': 'image/bmp',
+    'gif': 'image/gif',
+    'tif': 'image/tiff',
+    'tiff': 'image/tiff',
+    'docx': DOCX_MIME_TYPE,
+    'doc': 'application/msword',
+    'dcm': 'application/dicom',
+    'txt': 'text/plain',
+    'html': 'text/html',
+    'htm': 'text/html',
+}
+
+MAGIC_SIGNATURES = [
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+    (b'BM', 'image/bmp'),
+    (b'PK\x03\x04', DOCX_MIME_TYPE),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/msword'),
+]
+
+
+class UploadRejected(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _looks_like_text(head):
+    if b'\x00' in head:
+        return False
+    for encoding in ('utf-8', 'cp1251'):
+        # Инкрементальный декодер не спотыкается о символ, оборванный на границе буфера
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(head, final=False)
+            return True
+        except UnicodeDecodeError:
+            continue
+    return False
+
+
+def sniff_content_type(head, extension):
+    """Определяет MIME-тип по первым байтам файла с учётом заявленного расширения."""
+    if len(head) >= SNIFF_SIZE and head[128:132] == b'DICM':
+        return 'application/dicom'
+    if extension == 'dcm' and head[:2] in (b'\x02\x00', b'\x08\x00'):
+        # DICOM без 128-байтной преамбулы начинается сразу с тега группы 0002/0008
+        return 'application/dicom'
+    for signature, mime_type in MAGIC_SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if extension in ('txt', 'html', 'htm') and _looks_like_text(head):
+        return EXTENSION_TYPES[extension]
+    return None
+
+
+class StoredUploadedFile(UploadedFile):
+    """Файл, уже записанный потоковым обработчиком в uploads/<user_id>/."""
+
+    def __init__(self, path, name, content_type, size, charset, content_hash, content_type_extra=None):
+        super().__init__(open(path, 'rb'), name, content_type, size, charset, content_type_extra)
+        self.storage_path = path
+        self.content_hash = content_hash
+
+    def temporary_file_path(self):
+        return self.storage_path
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.storage_path):
+            os.remove(self.storage_path)
+
+
+class StreamingMedicalUploadHandler(FileUploadHandler):
+    """
+    Принимает медицинские файлы по мере поступления данных: проверяет размер
+    на лету, определяет формат по первым байтам, считает SHA-256 и пишет
+    сразу в итоговый файл без промежуточной копии.
+    """
+
+    def __init__(self, request=None, max_files=1):
+        super().__init__(request)
+        self.max_file_size = settings.MAX_UPLOAD_SIZE
+        self.max_files = max_files
+        self.files_received = 0
+        self.active = False
+        self.destination = None
+
+    def _reject(self, message, status_code=400):
+        self._cleanup()
+        self.request.upload_rejected = UploadRejected(message, status_code)
+        # Остаток тела дочитывается без записи (его размер ограничен в handle_raw_input):
+        # иначе сервер закроет соединение и клиент не получит JSON с ошибкой
+        raise StopUpload(connection_reset=False)
+
+    def _cleanup(self):
+        if self.destination is not None:
+            self.destination.close()
+            if os.path.exists(self.destination.name):
+                os.remove(self.destination.name)
+            self.destination = None
+        self.active = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        limit = self.max_file_size * self.max_files + MULTIPART_OVERHEAD
+        if content_length and content_length > limit:
+            self.request.upload_rejected = UploadRejected(
+                f'Файл слишком большой. Максимальный размер: {self.max_file_size // (1024 * 1024)} МБ',
+                status_code=413
+            )
+            # Тело запроса не читаем вовсе: возвращаем пустые POST и FILES
+            return QueryDict(encoding=encoding), MultiValueDict()
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        if field_name not in UPLOAD_FIELDS:
+            self.active = False
+            return
+
+        self.files_received += 1
+        if self.files_received > self.max_files:
+            self._reject(f'Слишком много файлов: не более {self.max_files}')
+
+        self.extension = os.path.splitext(file_name)[1].lower().lstrip('.')
+        if self.extension not in EXTENSION_TYPES:
+            self._reject(f'Неподдерживаемый тип файла: {self.extension or content_type}')
+        if len(file_name) > 255:
+            self._reject('Имя файла слишком длинное')
+
+        self.active = True
+        self.head = b''
+        self.sniffed_type = None
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.destination = None
+        raise StopFutureHandlers()
+
+    def _sniff(self):
+        self.sniffed_type = sniff_content_type(self.head, self.extension)
+        if self.sniffed_type is None:
+            self._reject('Содержимое файла не соответствует поддерживаемым форматам')
+        if self.sniffed_type != EXTENSION_TYPES[self.extension]:
+            self._reject('Содержимое файла не соответствует его расширению')
+
+        user_dir = user_upload_dir(self.request.user)
+        path = os.path.join(user_dir, f"{uuid.uuid4()}.{self.extension}")
+        self.destination = open(path, 'wb')
+        self._write(self.head)
+        self.head = b''
+
+    def _write(self, data):
+        self.digest.update(data)
+        self.destination.write(data)
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+
+        self.size += len(raw_data)
+        if self.size > self.max_file_size:
+            self._reject(
+                f'Файл слишком большой. Максимальный размер: {self.max_file_size // (1024 * 1024)} МБ',
+                status_code=413
+            )
+
+        if self.destination is None:
+            # Пока формат не определён, данные держим в памяти и на диск не пишем
+            self.head += raw_data
+            if len(self.head) >= SNIFF_SIZE:
+                self._sniff()
+        else:
+            self._write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        if file_size == 0:
+            self._reject('Файл пустой')
+        if self.destination is None:
+            self._sniff()
+
+        self.destination.close()
+        stored = StoredUploadedFile(
+            path=self.destination.name,
+            name=self.file_name,
+            content_type=self.sniffed_type,
+            size=file_size,
+            charset=self.charset,
+            content_hash=self.digest.hexdigest(),
+            content_type_extra=self.content_type_extra,
+        )
+        self.destination = None
+        self.active = False
+        return stored
+
+    def upload_interrupted(self):
+        self._cleanup()
+
+
+class MedicalFileUploadParser(MultiPartParser):
+    """MultiPartParser, принимающий файлы потоковым обработчиком."""
+
+    def get_max_files(self):
+        return 1
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        django_request = request._request
+        django_request.upload_handlers = [
+            StreamingMedicalUploadHandler(django_request, max_files=self.get_max_files()),
+            *django_request.upload_handlers,
+        ]
+        return super().parse(stream, media_type, parser_context)
+
+
+class MedicalBatchUploadParser(MedicalFileUploadParser):
+    """Парсер пакетной загрузки: до MAX_BATCH_FILES файлов в поле files."""
+
+    def get_max_files(self):
+        return settings.MAX_BATCH_FILES
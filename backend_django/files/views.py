@@ -1,23 +1,31 @@
 from rest_framework import generics, status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.parsers import MultiPartParser, FormParser
-from django.conf import settings
+from rest_framework.parsers import FormParser
 import os
-import uuid
 
 from .models import MedicalFile
+from .storage import discard_request_files, save_uploaded_file
+from .upload_handlers import MedicalFileUploadParser
 from .serializers import MedicalFileSerializer, FileUploadSerializer
+from .tasks import schedule_derivatives
 
 
 class FileUploadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
-    parser_classes = [MultiPartParser, FormParser]
+    parser_classes = [MedicalFileUploadParser, FormParser]
     
     def post(self, request, *args, **kwargs):
-        serializer = FileUploadSerializer(data=request.data)
+        data = request.data
+        rejected = getattr(request, 'upload_rejected', None)
+        if rejected:
+            discard_request_files(request)
+            return Response({'error': str(rejected)}, status=rejected.status_code)
+
+        serializer = FileUploadSerializer(data=data)
         
         if not serializer.is_valid():
+            discard_request_files(request)
             return Response(
                 serializer.errors, 
                 status=status.HTTP_400_BAD_REQUEST
@@ -26,22 +34,8 @@ class FileUploadView(APIView):
         file_obj = serializer.validated_data['file']
         description = serializer.validated_data.get('description', '')
         
-        ext = os.path.splitext(file_obj.name)[1].lower()
-        filename = f"{uuid.uuid4()}{ext}"
-        
-        user_upload_dir = os.path.join(
-            settings.MEDIA_ROOT, 
-            'uploads', 
-            str(request.user.id)
-        )
-        os.makedirs(user_upload_dir, exist_ok=True)
-        
-        full_path = os.path.join(user_upload_dir, filename)
-        
         try:
-            with open(full_path, 'wb+') as destination:
-                for chunk in file_obj.chunks():
-                    destination.write(chunk)
+            full_path, content_hash = save_uploaded_file(file_obj, request.user)
         except Exception as e:
             return Response(
                 {'error': f'Ошибка сохранения файла: {str(e)}'},
@@ -55,6 +49,7 @@ class FileUploadView(APIView):
                 filesize=file_obj.size,
                 mime_type=file_obj.content_type,
                 storage_path=full_path,
+                content_hash=content_hash,
                 description=description
             )
         except Exception as e:
@@ -64,6 +59,7 @@ class FileUploadView(APIView):
                 {'error': f'Ошибка создания записи: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+        schedule_derivatives([medical_file])
         
         return Response({
             'success': True, 
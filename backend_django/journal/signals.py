@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from analysis.services import charts
+from .models import JournalEntry
+
+
+@receiver(post_save, sender=JournalEntry)
+@receiver(post_delete, sender=JournalEntry)
+def invalidate_journal_charts(sender, instance, **kwargs):
+    """Сбрасывает графики пользователя после фиксации изменения записи дневника."""
+    transaction.on_commit(lambda: charts.invalidate(instance.user_id))
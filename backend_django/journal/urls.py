@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('', views.list_entries, name='journal_list'),
+    path('chart/', views.chart_entries, name='journal_chart'),
     path('create/', views.create_entry, name='journal_create'),
     path('<uuid:entry_id>/', views.entry_detail, name='journal_detail'),
 ]
\ No newline at end of file
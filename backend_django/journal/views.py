@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from .models import JournalEntry
 from .serializers import JournalEntrySerializer
+from analysis.services import charts
 from datetime import date
 
 @api_view(['GET'])
@@ -39,4 +40,24 @@ def entry_detail(request, entry_id):
 
     elif request.method == 'DELETE':
         entry.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def chart_entries(request):
+    """Самочувствие для графика: ряд прорежен до ?points точек (?method=lttb|minmax, ?since, ?until)."""
+    try:
+        params = charts.parse_chart_params(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def rows():
+        entries = JournalEntry.objects.filter(user=request.user)
+        if 'since' in params:
+            entries = entries.filter(date__gte=params['since'])
+        if 'until' in params:
+            entries = entries.filter(date__lte=params['until'])
+        return entries.order_by('date').values_list('date', 'well_being_score')
+
+    return Response(charts.build_chart(request.user.pk, 'journal:well_being', rows, **params))
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.13 on 2026-10-18 19:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="sex",
+            field=models.CharField(
+                blank=True,
+                choices=[("male", "Мужской"), ("female", "Женский")],
+                default="",
+                max_length=10,
+                verbose_name="Пол",
+            ),
+        ),
+    ]
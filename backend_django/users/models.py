@@ -31,11 +31,22 @@ class User(AbstractBaseUser, PermissionsMixin):
         ('doctor', 'Врач'),
         ('admin', 'Администратор'),
     ]
+    SEX_CHOICES = [
+        ('male', 'Мужской'),
+        ('female', 'Женский'),
+    ]
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     email = models.EmailField(unique=True, verbose_name='Email')
     full_name = models.CharField(max_length=255, verbose_name='Полное имя')
     date_of_birth = models.DateField(null=True, blank=True, verbose_name='Дата рождения')
+    sex = models.CharField(
+        max_length=10,
+        choices=SEX_CHOICES,
+        blank=True,
+        default='',
+        verbose_name='Пол'
+    )
     
     role = models.CharField(
         max_length=20, 
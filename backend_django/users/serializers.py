@@ -8,7 +8,7 @@ import re
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ['id', 'email', 'full_name', 'date_of_birth', 'role', 'created_at']
+        fields = ['id', 'email', 'full_name', 'date_of_birth', 'sex', 'role', 'created_at']
         read_only_fields = ['id', 'created_at']
 
 class UserRegisterSerializer(serializers.ModelSerializer):
@@ -35,7 +35,7 @@ class UserRegisterSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = User
-        fields = ['email', 'password', 'password2', 'full_name', 'date_of_birth']
+        fields = ['email', 'password', 'password2', 'full_name', 'date_of_birth', 'sex']
         extra_kwargs = {
             'email': {
                 'required': True,
@@ -131,6 +131,7 @@ class UserRegisterSerializer(serializers.ModelSerializer):
             password=validated_data['password'],
             full_name=validated_data['full_name'],
             date_of_birth=validated_data.get('date_of_birth'),
+            sex=validated_data.get('sex', ''),
             role='patient'
         )
         return user
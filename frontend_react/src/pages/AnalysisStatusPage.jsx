@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import { checkAnalysisStatus, getAnalysisResult } from '../services/analysis';
+import { checkAnalysisStatus, getAnalysisResult, streamAnalysisStatus } from '../services/analysis';
 import Card from '../components/Card';
 import Button from '../components/Button';
 
@@ -13,6 +13,9 @@ const AnalysisStatusPage = () => {
     const [fileInfo, setFileInfo] = useState(null);
     const [error, setError] = useState(null);
     const [polling, setPolling] = useState(true);
+    // Пока поток событий работает, опрос статуса не нужен
+    const [streaming, setStreaming] = useState(true);
+    const [partial, setPartial] = useState(null);
 
     const statusMessages = {
         pending: { text: 'Ожидание начала анализа', color: '#f6ad55', progress: 10 },
@@ -35,7 +38,7 @@ const AnalysisStatusPage = () => {
                     });
 
                     const statusInfo = statusMessages[response.data.status] || statusMessages.pending;
-                    setProgress(statusInfo.progress);
+                    setProgress(response.data.progress ?? statusInfo.progress);
 
                     if (response.data.status === 'completed' || response.data.status === 'failed') {
                         setPolling(false);
@@ -56,14 +59,52 @@ const AnalysisStatusPage = () => {
         checkStatus();
 
         let intervalId;
-        if (polling) {
+        if (polling && !streaming) {
             intervalId = setInterval(checkStatus, 3000);
         }
 
         return () => {
             if (intervalId) clearInterval(intervalId);
         };
-    }, [sessionId, polling, navigate]);
+    }, [sessionId, polling, streaming, navigate]);
+
+    useEffect(() => {
+        if (!sessionId || !streaming) return;
+
+        let closed = false;
+        const stream = streamAnalysisStatus(sessionId, (event, data) => {
+            if (event === 'status') {
+                setStatus(data.status);
+                setProgress(data.progress);
+            } else if (event === 'partial') {
+                setPartial(data);
+            } else if (event === 'done') {
+                closed = true;
+                setStatus(data.status);
+                setPolling(false);
+                if (data.status === 'completed') {
+                    setProgress(100);
+                    setTimeout(() => {
+                        navigate(`/results/${data.file_id}`);
+                    }, 2000);
+                } else if (data.error) {
+                    setError(data.error);
+                }
+            }
+        });
+
+        // Поток оборвался или недоступен — возвращаемся к опросу статуса
+        stream.done
+            .catch(() => {})
+            .finally(() => {
+                if (!closed) setStreaming(false);
+            });
+
+        return () => {
+            closed = true;
+            stream.close();
+        };
+    }, [sessionId, streaming, navigate]);
 
     const handleViewResults = () => {
         if (fileInfo?.fileId) {
@@ -116,6 +157,24 @@ const AnalysisStatusPage = () => {
                 </div>
             </div>
 
+            {partial && status !== 'failed' && (partial.summary || partial.detected_conditions.length > 0) && (
+                <div style={{ marginBottom: '20px', padding: '15px', background: '#ebf8ff', borderRadius: '5px' }}>
+                    <p style={{ margin: '0 0 10px 0' }}>
+                        <strong>{status === 'completed' ? 'Результат анализа' : 'Предварительный результат'}</strong>
+                    </p>
+                    {partial.summary && <p style={{ margin: '0 0 10px 0' }}>{partial.summary}</p>}
+                    {partial.detected_conditions.length > 0 && (
+                        <ul style={{ margin: 0, paddingLeft: '20px' }}>
+                            {partial.detected_conditions.map((condition) => (
+                                <li key={`${condition.code}-${condition.condition_name}`}>
+                                    {condition.condition_name} ({condition.code}) — {Math.round(condition.confidence * 100)}%
+                                </li>
+                            ))}
+                        </ul>
+                    )}
+                </div>
+            )}
+
             {error && (
                 <div style={{
                     padding: '15px',
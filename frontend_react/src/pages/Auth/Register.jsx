@@ -10,7 +10,8 @@ const Register = () => {
         password: '',
         password2: '',
         full_name: '',
-        date_of_birth: ''
+        date_of_birth: '',
+        sex: ''
     });
     const [errors, setErrors] = useState({});
     const [loading, setLoading] = useState(false);
@@ -196,6 +197,35 @@ const Register = () => {
                     <FormErrorDisplay errors={errors} fieldName="date_of_birth" />
                 </div>
 
+                <div style={{ marginBottom: '20px' }}>
+                    <label style={{
+                        display: 'block',
+                        marginBottom: '8px',
+                        fontWeight: '500',
+                        color: '#555'
+                    }}>
+                        Пол (опционально, для норм лабораторных показателей)
+                    </label>
+                    <select
+                        name="sex"
+                        value={formData.sex}
+                        onChange={handleChange}
+                        style={{
+                            width: '100%',
+                            padding: '12px',
+                            border: errors.sex ? '2px solid #dc3545' : '1px solid #ddd',
+                            borderRadius: '5px',
+                            fontSize: '16px'
+                        }}
+                        disabled={loading}
+                    >
+                        <option value="">Не указан</option>
+                        <option value="male">Мужской</option>
+                        <option value="female">Женский</option>
+                    </select>
+                    <FormErrorDisplay errors={errors} fieldName="sex" />
+                </div>
+
                 <div style={{ marginBottom: '20px' }}>
                     <label style={{
                         display: 'block',
@@ -6,6 +6,66 @@ export const getAnalysisResult = (fileId) => api.get(`/analysis/file/${fileId}/`
 // Проверка статуса анализа по ID сессии
 export const checkAnalysisStatus = (sessionId) => api.get(`/analysis/session/${sessionId}/`);
 
+// Сервер закрывает поток через ANALYSIS_STREAM_TIMEOUT; столько раз поток открывается
+// заново, прежде чем страница перейдёт на опрос статуса
+const STREAM_RECONNECTS = 20;
+
+// Поток событий анализа (SSE): status, partial, done.
+// EventSource не умеет передавать токен, поэтому поток читается через fetch.
+export const streamAnalysisStatus = (sessionId, onEvent) => {
+    const controller = new AbortController();
+    const token = localStorage.getItem('token');
+    let lastEventId = null;
+    let finished = false;
+
+    const read = async () => {
+        const response = await fetch(`${api.defaults.baseURL}/analysis/session/${sessionId}/stream/`, {
+            headers: {
+                Accept: 'text/event-stream',
+                ...(token ? { Authorization: `Bearer ${token}` } : {}),
+                ...(lastEventId ? { 'Last-Event-ID': lastEventId } : {}),
+            },
+            signal: controller.signal,
+        });
+        if (!response.ok || !response.body) {
+            throw new Error(`Поток недоступен: ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        for (;;) {
+            const { value, done: ended } = await reader.read();
+            if (ended) return;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const message = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                const data = [];
+                message.split('\n').forEach((line) => {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+                    else if (line.startsWith('id:')) lastEventId = line.slice(3).trim();
+                });
+                if (event === 'done') finished = true;
+                if (data.length) onEvent(event, JSON.parse(data.join('\n')));
+            }
+        }
+    };
+
+    const done = (async () => {
+        for (let attempt = 0; attempt < STREAM_RECONNECTS && !finished; attempt += 1) {
+            await read();
+        }
+    })();
+
+    return { close: () => controller.abort(), done };
+};
+
 // Повторный запуск анализа
 export const retryAnalysis = (fileId) => api.post(`/analysis/retry/${fileId}/`);
 
@@ -13,4 +73,22 @@ export const retryAnalysis = (fileId) => api.post(`/analysis/retry/${fileId}/`);
 export const getAnalysisHistory = () => api.get('/analysis/history/');
 
 // Получение результата анализа по ID сессии (если нужно)
-export const getResultBySessionId = (sessionId) => api.get(`/analysis/session/${sessionId}/result/`);
\ No newline at end of file
+export const getResultBySessionId = (sessionId) => api.get(`/analysis/session/${sessionId}/result/`);
+
+// Пакетная загрузка нескольких файлов с общим анализом
+export const uploadBatch = (files) => {
+    const formData = new FormData();
+    files.forEach((file) => formData.append('files', file));
+    return api.post('/analysis/batch/', formData, {
+        headers: { 'Content-Type': 'multipart/form-data' },
+    });
+};
+
+// Сводный статус пакета
+export const checkBatchStatus = (batchId) => api.get(`/analysis/batch/${batchId}/`);
+
+// Динамика лабораторных показателей: { analyte: 'HGB,GLU', since: 'ГГГГ-ММ-ДД' }
+export const getLabTrends = (params = {}) => api.get('/analysis/labs/trends/', { params });
+
+// Ряд показателя для графика, прореженный сервером до points точек
+export const getLabChart = (analyte, params = {}) => api.get(`/analysis/labs/${analyte}/chart/`, { params });
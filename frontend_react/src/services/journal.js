@@ -3,4 +3,6 @@ import api from './api';
 export const getJournalEntries = () => api.get('/journal/');
 export const createJournalEntry = (data) => api.post('/journal/create/', data);
 export const updateJournalEntry = (id, data) => api.put(`/journal/${id}/`, data);
-export const deleteJournalEntry = (id) => api.delete(`/journal/${id}/`);
\ No newline at end of file
+export const deleteJournalEntry = (id) => api.delete(`/journal/${id}/`);
+// Самочувствие для графика: сервер прореживает ряд до points точек
+export const getJournalChart = (params = {}) => api.get('/journal/chart/', { params });